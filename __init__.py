@@ -1,2 +1,12 @@
-from .zooniverse import zooniverse
 from .shopping_client import shopping_client
+
+
+def __getattr__(name):
+    # The Zooniverse connector pulls in panoptes_client; import it on first
+    # use only.
+    if name == "zooniverse":
+        from .zooniverse import zooniverse
+
+        globals()[name] = zooniverse
+        return zooniverse
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
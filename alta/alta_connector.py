@@ -1,16 +1,83 @@
-import requests
-import json
-import io
-import getpass
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from warnings import warn
+
 import pandas as pd
+import requests
 
-from typing import Union, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple, Union
+
+from shopping_client.basket_item import load_item_data
+from shopping_client.frames import records_to_frame
+from shopping_client.instrumentation import count_cache, received_bytes, span
+from shopping_client.session import DEFAULT_TIMEOUT, default_session
+
+if TYPE_CHECKING:  # metadata_cache imports sqlite3, so only import it for type checkers
+    from alta.metadata_cache import metadata_cache
 
 class alta_connector:
 
     name = "alta"
     archive = "apertif"
 
+    # `validate_basket_item(item, return_loaded=True)` returns the decoded
+    # item data, see `shopping_client.frames.basket_record`
+    loads_basket_items = True
+
+    # Typed columns of Arrow exports, see `shopping_client.arrow`
+    arrow_fields = (
+        ("PID", "string"),
+        ("name", "string"),
+        ("RA", "float64"),
+        ("dec", "float64"),
+        ("fov", "float64"),
+        ("dataProductType", "category"),
+        ("dataProductSubType", "category"),
+        ("datasetID", "string"),
+        ("url", "string"),
+        ("thumbnail", "string"),
+    )
+
+    # ALTA catalogs and the item field that identifies a record in each
+    lookup_fields = {"dataproducts": "PID", "observations": "runId"}
+
+    def __init__(
+        self,
+        host: str = "https://alta.astron.nl/",
+        session: Optional[requests.Session] = None,
+        timeout: Union[float, tuple, None] = DEFAULT_TIMEOUT,
+        cache: Union["metadata_cache", bool, None] = True,
+        batch_size: int = 50,
+        max_workers: int = 4,
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        host : str
+            URL of the ALTA server whose `altapi` is queried for metadata.
+        session : requests.Session
+            Session used for all HTTP requests; defaults to the shared
+            session.
+        timeout : Union[float, tuple, None]
+            Timeout passed to every request.
+        cache : Union[metadata_cache, bool, None]
+            Cache of metadata records. `True` uses a `metadata_cache` in the
+            default location, created on first use; `None` or `False`
+            disables caching.
+        batch_size : int
+            Number of identifiers looked up per request.
+        max_workers : int
+            Maximum number of concurrent requests to ALTA.
+
+        """
+        self.host = host
+        self.session = session if session is not None else default_session()
+        self.timeout = timeout
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+
     def basket_item_to_pandas(
             self, basket_item: Union[dict, pd.Series], validate: bool = True
     ) -> Optional[pd.Series]:
@@ -36,7 +103,7 @@ class alta_connector:
         if validate:
             item_data = self.validate_basket_item(basket_item, return_loaded=True)
         else:
-            item_data = json.loads(basket_item["item_data"])
+            item_data = load_item_data(basket_item)
         if item_data:
             return pd.Series(item_data)
         return None
@@ -67,10 +134,165 @@ class alta_connector:
             If validation fails return `None`.
 
         """
-        item_data = json.loads(basket_item["item_data"])
+        item_data = load_item_data(basket_item)
         if "archive" in item_data and item_data["archive"] == self.archive:
             if return_loaded:
                 return item_data
             else:
                 return True
-        return None
\ No newline at end of file
+        return None
+
+    def fetch_metadata(
+        self, items: Union[pd.DataFrame, Iterable[Union[dict, pd.Series]]]
+    ) -> Dict[Tuple[str, str], Optional[dict]]:
+        """Look up the ALTA metadata of all Apertif items in one pass.
+
+        Identifiers are deduplicated and served from the cache where
+        possible; the others are looked up in batches of `batch_size`, with
+        at most `max_workers` requests in flight. Batches that fail are
+        reported with a warning and left out of the result.
+
+        Parameters
+        ----------
+        items : Union[pd.DataFrame, Iterable[Union[dict, pd.Series]]]
+            Basket items, or a DataFrame such as
+            `shopping_client.get_basket(convert_to_pandas=True)["alta"]`.
+
+        Returns
+        -------
+        Dict[Tuple[str, str], Optional[dict]]
+            ALTA record by `(catalog, identifier)`, or `None` if ALTA has no
+            record for the identifier.
+
+        """
+        wanted = {}
+        for lookup in map(self.item_lookup, self._iter_items(items)):
+            if lookup is not None:
+                wanted.setdefault(lookup[0], set()).add(lookup[1])
+
+        cache = self._cache()
+        metadata, batches = {}, []
+        for catalog, keys in wanted.items():
+            cached = cache.load(self.host, catalog, keys) if cache is not None else {}
+            if cache is not None:
+                count_cache("alta", True, len(cached))
+                count_cache("alta", False, len(keys) - len(cached))
+            metadata.update(((catalog, key), record) for key, record in cached.items())
+            missing = sorted(keys - set(cached))
+            batches.extend(
+                (catalog, missing[start : start + self.batch_size])
+                for start in range(0, len(missing), self.batch_size)
+            )
+        if not batches:
+            return metadata
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                (catalog, keys, executor.submit(self._query, catalog, keys))
+                for catalog, keys in batches
+            ]
+            fetched = {}
+            for catalog, keys, future in futures:
+                try:
+                    records = future.result()
+                except requests.RequestException as e:
+                    warn(f"ALTA lookup of {len(keys)} {catalog} failed: {e}")
+                    continue
+                found = {key: records.get(key) for key in keys}
+                fetched.setdefault(catalog, {}).update(found)
+                metadata.update(((catalog, key), record) for key, record in found.items())
+        if cache is not None:
+            for catalog, records in fetched.items():
+                cache.store(self.host, catalog, records)
+        return metadata
+
+    def enrich(
+        self,
+        items: Union[pd.DataFrame, Iterable[Union[dict, pd.Series]]],
+        prefix: str = "alta.",
+    ) -> pd.DataFrame:
+        """Convert the Apertif items to a DataFrame with their ALTA metadata
+        added as columns named `<prefix><field>`.
+
+        Parameters
+        ----------
+        items : Union[pd.DataFrame, Iterable[Union[dict, pd.Series]]]
+            Basket items, or a DataFrame of Apertif items.
+        prefix : str
+            Prefix of the metadata columns.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per Apertif item; items without metadata have missing
+            values in the metadata columns.
+
+        """
+        items = list(self._iter_items(items))
+        metadata = self.fetch_metadata(items)
+        records = []
+        for item in items:
+            lookup = self.item_lookup(item)
+            if lookup is None:
+                continue
+            record = dict(self._item_data(item))
+            for field, value in (metadata.get(lookup) or {}).items():
+                record[prefix + field] = value
+            records.append(record)
+        return records_to_frame(records)
+
+    def item_lookup(self, item: Union[dict, pd.Series]) -> Optional[Tuple[str, str]]:
+        """The `(catalog, identifier)` under which ALTA holds the metadata
+        of an item, or `None` if it is not an Apertif item with a known
+        identifier."""
+        data = self._item_data(item)
+        if data.get("archive") != self.archive:
+            return None
+        catalogs = list(self.lookup_fields)
+        if data.get("catalog") in self.lookup_fields:
+            catalogs = [data["catalog"]]
+        for catalog in catalogs:
+            key = data.get(self.lookup_fields[catalog])
+            if isinstance(key, float) and key.is_integer():
+                # Integer identifiers become floats in columns with gaps
+                key = int(key)
+            if key is not None and pd.notna(key) and str(key):
+                return catalog, str(key)
+        return None
+
+    @staticmethod
+    def _item_data(item):
+        if "item_data" in item:
+            return load_item_data(item)
+        return item.dropna().to_dict() if isinstance(item, pd.Series) else item
+
+    @staticmethod
+    def _iter_items(items):
+        if isinstance(items, pd.DataFrame):
+            return (row for _, row in items.iterrows())
+        return iter(items)
+
+    def _cache(self):
+        if self.cache is True:
+            from alta.metadata_cache import metadata_cache
+
+            self.cache = metadata_cache()
+        return self.cache or None
+
+    def _query(self, catalog, keys):
+        # Records of `catalog` with the given identifiers, following the
+        # pages of the paginated response
+        field = self.lookup_fields[catalog]
+        url = urllib.parse.urljoin(self.host, f"altapi/{catalog}/")
+        params = {f"{field}__in": ",".join(keys), "page_size": len(keys)}
+        records = {}
+        while url:
+            with span("alta_query", catalog=catalog):
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                with received_bytes(response, "alta"):
+                    response.raise_for_status()
+                    payload = response.json()
+            for record in payload.get("results", []):
+                records[str(record.get(field))] = record
+            url, params = payload.get("next"), None
+        return records
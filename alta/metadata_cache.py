@@ -0,0 +1,102 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from typing import Dict, Iterable, Optional
+
+from shopping_client.cache import default_cache_dir
+
+# SQLite limits the number of parameters of a statement
+_MAX_PARAMETERS = 500
+
+
+class metadata_cache:
+    """Persistent cache of ALTA metadata records in a SQLite database.
+
+    Records are keyed by ALTA host, catalog (`dataproducts` or
+    `observations`) and identifier. Lookups that found nothing are cached as
+    well, so that repeating an enrichment makes no network requests at all
+    while the entries are fresh.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = 24 * 3600):
+        """Constructor.
+
+        Parameters
+        ----------
+        path : str
+            Path of the database file. Defaults to
+            `$XDG_CACHE_HOME/esap-userprofile-client/alta/metadata.sqlite`.
+            Use `":memory:"` for a cache that lives as long as the object.
+        ttl : float
+            Age in seconds after which an entry is no longer used. `None`
+            keeps entries forever.
+
+        """
+        self.path = path or os.path.join(default_cache_dir("alta"), "metadata.sqlite")
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._memory = None
+        if self.path == ":memory:":
+            self._memory = sqlite3.connect(":memory:", check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                " host TEXT, catalog TEXT, key TEXT, stored_at REAL, record TEXT,"
+                " PRIMARY KEY (host, catalog, key))"
+            )
+
+    def load(self, host: str, catalog: str, keys: Iterable[str]) -> Dict[str, Optional[dict]]:
+        """Return the fresh cached records for `keys`, as a `dict` mapping
+        key to record, or to `None` for identifiers that ALTA does not know.
+        Keys without a fresh entry are absent."""
+        keys = list(keys)
+        oldest = time.time() - self.ttl if self.ttl is not None else float("-inf")
+        found = {}
+        with self._connect() as db:
+            for start in range(0, len(keys), _MAX_PARAMETERS):
+                batch = keys[start : start + _MAX_PARAMETERS]
+                rows = db.execute(
+                    "SELECT key, record FROM metadata WHERE host = ? AND catalog = ?"
+                    f" AND stored_at >= ? AND key IN ({','.join('?' * len(batch))})",
+                    [host, catalog, oldest, *batch],
+                )
+                for key, record in rows:
+                    found[key] = json.loads(record)
+        return found
+
+    def store(self, host: str, catalog: str, records: Dict[str, Optional[dict]]):
+        """Store records by key; `None` marks an unknown identifier. Expired
+        entries are removed."""
+        now = time.time()
+        with self._connect() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)",
+                [
+                    (host, catalog, key, now, json.dumps(record))
+                    for key, record in records.items()
+                ],
+            )
+            if self.ttl is not None:
+                db.execute("DELETE FROM metadata WHERE stored_at < ?", (now - self.ttl,))
+
+    def clear(self):
+        """Remove all cached records."""
+        with self._connect() as db:
+            db.execute("DELETE FROM metadata")
+
+    @contextmanager
+    def _connect(self):
+        # Yields a connection and commits on success; file databases get a
+        # fresh connection per operation, so the cache can be shared by
+        # threads and processes.
+        if self._memory is not None:
+            with self._lock, self._memory:
+                yield self._memory
+            return
+        with closing(sqlite3.connect(self.path, timeout=30)) as db, db:
+            yield db
@@ -0,0 +1,135 @@
+"""Local mock of the ALTA metadata API.
+
+`alta_server` serves `altapi/dataproducts/` and `altapi/observations/` with
+`<field>__in` filters and page-number pagination, like ALTA's REST API, so
+that `alta_connector.fetch_metadata` and `alta_connector.enrich` can be
+tested without network access, e.g.
+
+    with alta_server(dataproducts=[{"PID": "dp1", "RA": 1.0}]) as server:
+        connector = alta_connector(host=server.url, cache=None)
+        frame = connector.enrich(items)
+"""
+import json
+import threading
+import urllib.parse
+from typing import Iterable, Optional
+
+from shopping_client.stand_in import stand_in_handler, stand_in_server
+
+
+class alta_server(stand_in_server):
+    """ALTA metadata API on `127.0.0.1`.
+
+    Attributes
+    ----------
+    url : str
+        Base URL of the server, to be passed as `host`.
+    requests : list
+        Path and query of every request received.
+    max_active : int
+        Highest number of concurrent requests seen.
+    """
+
+    lookup_fields = {"dataproducts": "PID", "observations": "runId"}
+
+    def __init__(
+        self,
+        dataproducts: Optional[Iterable[dict]] = None,
+        observations: Optional[Iterable[dict]] = None,
+        page_size: int = 100,
+        delay: float = 0.0,
+        fail: int = 0,
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        dataproducts, observations : Iterable[dict]
+            Records served by the two catalogs, identified by their `PID`
+            and `runId` respectively.
+        page_size : int
+            Largest page size; the `page_size` query parameter may ask for
+            less.
+        delay : float
+            Seconds each request takes.
+        fail : int
+            Number of initial requests answered with status 500.
+
+        """
+        self.records = {
+            "dataproducts": list(dataproducts or []),
+            "observations": list(observations or []),
+        }
+        self.page_size = page_size
+        self.delay = delay
+        self.fail = fail
+        self.requests = []
+        self.max_active = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        super().__init__(_handler)
+
+    def page(self, catalog: str, query: dict) -> Optional[dict]:
+        """The response body for a query of `catalog`, or `None` if the
+        catalog does not exist."""
+        if catalog not in self.records:
+            return None
+        field = self.lookup_fields[catalog]
+        selected = self.records[catalog]
+        wanted = query.get(f"{field}__in")
+        if wanted is not None:
+            keys = set(wanted[0].split(","))
+            selected = [record for record in selected if str(record.get(field)) in keys]
+        page_size = min(int(query.get("page_size", [self.page_size])[0]), self.page_size)
+        page = int(query.get("page", ["1"])[0])
+        start = (page - 1) * page_size
+        following = None
+        if start + page_size < len(selected):
+            following_query = {key: values[0] for key, values in query.items()}
+            following_query["page"] = page + 1
+            following = (
+                f"{self.url}altapi/{catalog}/?"
+                + urllib.parse.urlencode(following_query)
+            )
+        return dict(
+            count=len(selected),
+            next=following,
+            previous=None,
+            results=selected[start : start + page_size],
+        )
+
+
+class _handler(stand_in_handler):
+    def do_GET(self):
+        server = self.stand_in
+        with server._lock:
+            server.requests.append(self.path)
+            server._active += 1
+            server.max_active = max(server.max_active, server._active)
+            failing = server.fail > 0
+            if failing:
+                server.fail -= 1
+        try:
+            if server.delay:
+                threading.Event().wait(server.delay)
+            if failing:
+                return self._send(500, {"detail": "Internal server error"})
+            parsed = urllib.parse.urlparse(self.path)
+            parts = parsed.path.strip("/").split("/")
+            body = None
+            if len(parts) == 2 and parts[0] == "altapi":
+                body = server.page(parts[1], urllib.parse.parse_qs(parsed.query))
+            if body is None:
+                return self._send(404, {"detail": "Not found."})
+            self._send(200, body)
+        finally:
+            with server._lock:
+                server._active -= 1
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
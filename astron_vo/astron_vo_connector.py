@@ -1,14 +1,90 @@
-import json
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
+import requests
 
-from typing import Union, Optional
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+
+from shopping_client.basket_item import load_item_data
+from shopping_client.session import DEFAULT_TIMEOUT, default_session
+
+# TAP service of the ASTRON Virtual Observatory
+DEFAULT_SERVICE = "https://vo.astron.nl/tap/"
 
 class astron_vo_connector:
 
     name = "astron_vo"
     archive = "astron_vo"
 
+    # `validate_basket_item(item, return_loaded=True)` returns the decoded
+    # item data, see `shopping_client.frames.basket_record`
+    loads_basket_items = True
+
+    # Typed columns of Arrow exports, see `shopping_client.arrow`
+    arrow_fields = (
+        ("obs_publisher_did", "string"),
+        ("obs_collection", "category"),
+        ("dataproduct_type", "category"),
+        ("target_name", "string"),
+        ("s_ra", "float64"),
+        ("s_dec", "float64"),
+        ("s_fov", "float64"),
+        ("t_min", "float64"),
+        ("t_max", "float64"),
+        ("em_min", "float64"),
+        ("em_max", "float64"),
+        ("access_url", "string"),
+        ("access_format", "category"),
+    )
+
+    # Columns holding the position of a row in cone-search tables
+    position_columns = ("s_ra", "s_dec")
+    default_table = "ivoa.obscore"
+
+    def __init__(
+        self,
+        service: Optional[str] = DEFAULT_SERVICE,
+        session: Optional[requests.Session] = None,
+        timeout: Union[float, tuple, None] = DEFAULT_TIMEOUT,
+        max_workers: int = 4,
+        chunk_size: int = 10000,
+        poll_interval: float = 0.5,
+        max_poll_interval: float = 10.0,
+        job_timeout: Optional[float] = 600.0,
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        service : str
+            Base URL of the TAP service used for items that do not name one.
+        session : requests.Session
+            Session used for all HTTP requests; defaults to the shared
+            session.
+        timeout : Union[float, tuple, None]
+            Timeout passed to every request.
+        max_workers : int
+            Maximum number of TAP jobs run at the same time.
+        chunk_size : int
+            Number of rows per DataFrame chunk when streaming results.
+        poll_interval : float
+            Initial interval in seconds between polls of a running job; it
+            grows by half after every poll.
+        max_poll_interval : float
+            Upper bound of the polling interval.
+        job_timeout : float
+            Seconds after which an unfinished job is aborted.
+
+        """
+        self.service = service
+        self.session = session if session is not None else default_session()
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.job_timeout = job_timeout
+
     def basket_item_to_pandas(
             self, basket_item: Union[dict, pd.Series], validate: bool = True
     ) -> Optional[pd.Series]:
@@ -34,7 +110,7 @@ class astron_vo_connector:
         if validate:
             item_data = self.validate_basket_item(basket_item, return_loaded=True)
         else:
-            item_data = json.loads(basket_item["item_data"])
+            item_data = load_item_data(basket_item)
         if item_data:
             return pd.Series(item_data)
         return None
@@ -65,10 +141,194 @@ class astron_vo_connector:
             If validation fails return `None`.
 
         """
-        item_data = json.loads(basket_item["item_data"])
+        item_data = load_item_data(basket_item)
         if "archive" in item_data and item_data["archive"] == self.archive:
             if return_loaded:
                 return item_data
             else:
                 return True
-        return None
\ No newline at end of file
+        return None
+
+    def iter_query(
+        self,
+        query: str,
+        service: Optional[str] = None,
+        uploads: Optional[Dict[str, pd.DataFrame]] = None,
+        maxrec: Optional[int] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """Run an ADQL query as an asynchronous TAP job and stream the
+        result as DataFrame chunks of at most `chunk_size` rows.
+
+        Parameters
+        ----------
+        query : str
+            ADQL query.
+        service : str
+            TAP service URL; defaults to the connector's `service`.
+        uploads : Dict[str, pd.DataFrame]
+            Tables uploaded with the query as `TAP_UPLOAD.<name>`.
+        maxrec : int
+            Maximum number of rows to return.
+
+        Returns
+        -------
+        Iterator[pd.DataFrame]
+
+        Raises
+        ------
+        RuntimeError
+            If the job fails or does not finish within `job_timeout`.
+
+        """
+        service = service or self.service
+        if service is None:
+            raise RuntimeError("No TAP service given for the query")
+        # The UWS client pulls in the XML parsers; only import it for queries
+        from astron_vo.tap import tap_job
+
+        with tap_job(
+            service, query, uploads, maxrec, session=self.session, timeout=self.timeout
+        ) as job:
+            job.submit()
+            job.wait(self.poll_interval, self.max_poll_interval, self.job_timeout)
+            yield from job.iter_results(self.chunk_size)
+
+    def run_query(
+        self,
+        query: str,
+        service: Optional[str] = None,
+        uploads: Optional[Dict[str, pd.DataFrame]] = None,
+        maxrec: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """Run an ADQL query and return the whole result; see
+        `iter_query`."""
+        chunks = list(self.iter_query(query, service, uploads, maxrec))
+        if not chunks:
+            # The result document has no table
+            return pd.DataFrame()
+        return pd.concat(chunks, ignore_index=True)
+
+    def run_queries(
+        self,
+        items: Union[pd.DataFrame, Iterable[Union[dict, pd.Series]]],
+        max_workers: Optional[int] = None,
+    ) -> Tuple[dict, dict]:
+        """Run the queries of several basket items concurrently.
+
+        An item either carries an ADQL `query`, or describes a cone search
+        with `s_ra`, `s_dec` and a `radius` (or `s_fov`) in degrees on a
+        `table` (default `ivoa.obscore`). The TAP service is taken from the
+        item's `service_url` or `tap_url`, or is the connector's `service`.
+        Cone searches on the same service and table are combined into a
+        single job that uploads the positions of all the items and joins
+        them with the table.
+
+        Parameters
+        ----------
+        items : Union[pd.DataFrame, Iterable[Union[dict, pd.Series]]]
+            Basket items, or a DataFrame such as
+            `shopping_client.get_basket(convert_to_pandas=True)["astron_vo"]`.
+        max_workers : int
+            Maximum number of concurrent jobs; defaults to the connector's
+            `max_workers`.
+
+        Returns
+        -------
+        Tuple[dict, dict]
+            `(results, errors)`: the result DataFrame and the exception
+            raised, keyed by the DataFrame index label or by the position of
+            the item in the iterable. Items that are neither queries nor cone
+            searches are reported as errors.
+
+        """
+        if isinstance(items, pd.DataFrame):
+            labelled = list(items.iterrows())
+        else:
+            labelled = list(enumerate(items))
+
+        results, errors, tasks, cones = {}, {}, {}, {}
+        for label, item in labelled:
+            spec = self.item_query(item)
+            if spec is None:
+                errors[label] = ValueError("Item has neither a query nor a position")
+            elif "query" in spec:
+                tasks[(label,)] = (self.run_query, spec["query"], spec["service"])
+            else:
+                key = (spec["service"], spec["table"])
+                cones.setdefault(key, []).append((label, spec))
+        for (service, table), group in cones.items():
+            labels = tuple(label for label, _ in group)
+            tasks[labels] = (self._run_cones, service, table, [spec for _, spec in group])
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+            futures = {
+                labels: executor.submit(*task) for labels, task in tasks.items()
+            }
+            for labels, future in futures.items():
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.update((label, e) for label in labels)
+                    continue
+                if len(labels) == 1 and isinstance(result, pd.DataFrame):
+                    results[labels[0]] = result
+                else:
+                    results.update(zip(labels, result))
+        order = [label for label, _ in labelled]
+        return (
+            {label: results[label] for label in order if label in results},
+            {label: errors[label] for label in order if label in errors},
+        )
+
+    def item_query(self, item: Union[dict, pd.Series]) -> Optional[dict]:
+        """The query described by a basket item: a `dict` with `service` and
+        either `query`, or `table`, `ra`, `dec` and `radius` for a cone
+        search; `None` if the item describes neither."""
+        if "item_data" in item:
+            data = load_item_data(item)
+        else:
+            data = item.dropna().to_dict() if isinstance(item, pd.Series) else item
+        service = data.get("service_url") or data.get("tap_url") or self.service
+        if data.get("query"):
+            return dict(service=service, query=data["query"])
+        ra, dec = (data.get(column) for column in self.position_columns)
+        radius = data.get("radius")
+        if radius is None and data.get("s_fov") is not None:
+            radius = float(data["s_fov"]) / 2
+        if ra is None or dec is None or radius is None:
+            return None
+        return dict(
+            service=service,
+            table=data.get("table") or self.default_table,
+            ra=float(ra),
+            dec=float(dec),
+            radius=float(radius),
+        )
+
+    def _run_cones(self, service, table, specs):
+        # One job for all cone searches on `table`: the positions are
+        # uploaded and joined with the table, and the result is split by the
+        # uploaded row number.
+        positions = pd.DataFrame(
+            dict(
+                esap_row=range(len(specs)),
+                ra=[spec["ra"] for spec in specs],
+                dec=[spec["dec"] for spec in specs],
+                radius=[spec["radius"] for spec in specs],
+            )
+        )
+        ra, dec = self.position_columns
+        query = (
+            f"SELECT u.esap_row, t.* FROM TAP_UPLOAD.positions AS u "
+            f"JOIN {table} AS t ON 1 = CONTAINS("
+            f"POINT('ICRS', t.{ra}, t.{dec}), CIRCLE('ICRS', u.ra, u.dec, u.radius))"
+        )
+        matches = self.run_query(query, service, uploads=dict(positions=positions))
+        groups = dict(iter(matches.groupby("esap_row", sort=False)))
+        empty = matches.iloc[0:0].drop(columns="esap_row")
+        return [
+            groups[row].drop(columns="esap_row").reset_index(drop=True)
+            if row in groups
+            else empty
+            for row in range(len(specs))
+        ]
@@ -0,0 +1,205 @@
+import io
+import time
+import urllib.parse
+from typing import Dict, Iterator, Optional
+from xml.etree import ElementTree
+
+import pandas as pd
+import requests
+
+from shopping_client.session import DEFAULT_TIMEOUT, default_session
+from shopping_client.votable import MEDIA_TYPE, iter_votable, write_votable
+
+# Requested output: VOTable with the TABLEDATA serialisation, which can be
+# parsed as a stream
+RESPONSE_FORMAT = "votable/td"
+
+_FINAL_PHASES = {"COMPLETED", "ERROR", "ABORTED"}
+
+
+class tap_job:
+    """An asynchronous TAP query, run as a UWS job.
+
+    The job is created and started by `submit`, `wait` polls its phase with
+    a growing interval until it has finished, and `iter_results` streams the
+    result table as DataFrame chunks. Use the job as a context manager to
+    delete it on the service afterwards.
+    """
+
+    def __init__(
+        self,
+        service: str,
+        query: str,
+        uploads: Optional[Dict[str, pd.DataFrame]] = None,
+        maxrec: Optional[int] = None,
+        session: Optional[requests.Session] = None,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        service : str
+            Base URL of the TAP service.
+        query : str
+            ADQL query.
+        uploads : Dict[str, pd.DataFrame]
+            Tables uploaded with the query, available in ADQL as
+            `TAP_UPLOAD.<name>`.
+        maxrec : int
+            Maximum number of rows to return.
+        session : requests.Session
+            Session used for all requests; defaults to the shared session.
+        timeout : Union[float, tuple, None]
+            Timeout passed to every request.
+
+        """
+        self.service = service.rstrip("/") + "/"
+        self.query = query
+        self.uploads = uploads or {}
+        self.maxrec = maxrec
+        self.session = session if session is not None else default_session()
+        self.timeout = timeout
+        self.url = None
+
+    def submit(self) -> str:
+        """Create and start the job; returns the job URL."""
+        parameters = dict(
+            REQUEST="doQuery",
+            LANG="ADQL",
+            QUERY=self.query,
+            RESPONSEFORMAT=RESPONSE_FORMAT,
+            FORMAT=RESPONSE_FORMAT,
+            PHASE="RUN",
+        )
+        if self.maxrec is not None:
+            parameters["MAXREC"] = str(self.maxrec)
+        files = None
+        if self.uploads:
+            parameters["UPLOAD"] = ";".join(
+                f"{name},param:{name}" for name in self.uploads
+            )
+            files = {
+                name: (f"{name}.xml", write_votable(table, table_name=name), MEDIA_TYPE)
+                for name, table in self.uploads.items()
+            }
+        response = self.session.post(
+            urllib.parse.urljoin(self.service, "async"),
+            data=parameters,
+            files=files,
+            timeout=self.timeout,
+            allow_redirects=False,
+        )
+        response.raise_for_status()
+        location = response.headers.get("Location")
+        if location is None:
+            raise RuntimeError(
+                f"TAP service {self.service} did not return a job location "
+                f"(status {response.status_code})"
+            )
+        self.url = urllib.parse.urljoin(response.url, location).rstrip("/")
+        if self.phase() == "PENDING":
+            # Some services ignore PHASE=RUN on creation
+            self._post_phase("RUN")
+        return self.url
+
+    def phase(self) -> str:
+        """Current phase of the job, e.g. `EXECUTING` or `COMPLETED`."""
+        response = self.session.get(f"{self.url}/phase", timeout=self.timeout)
+        response.raise_for_status()
+        return response.text.strip().upper()
+
+    def wait(
+        self,
+        poll_interval: float = 0.5,
+        max_poll_interval: float = 10.0,
+        job_timeout: Optional[float] = 600.0,
+    ) -> str:
+        """Poll until the job has finished, multiplying the interval by 1.5
+        after each poll up to `max_poll_interval`.
+
+        Returns
+        -------
+        str
+            `COMPLETED`
+
+        Raises
+        ------
+        RuntimeError
+            If the job failed, was aborted, or did not finish within
+            `job_timeout` seconds; in the last case it is aborted.
+
+        """
+        deadline = time.monotonic() + job_timeout if job_timeout is not None else None
+        interval = poll_interval
+        while True:
+            phase = self.phase()
+            if phase in _FINAL_PHASES:
+                break
+            if deadline is not None and time.monotonic() > deadline:
+                self._post_phase("ABORT")
+                raise RuntimeError(f"TAP job {self.url} did not finish in time")
+            time.sleep(interval)
+            interval = min(interval * 1.5, max_poll_interval)
+        if phase == "ERROR":
+            raise RuntimeError(f"TAP job {self.url} failed: {self.error()}")
+        if phase == "ABORTED":
+            raise RuntimeError(f"TAP job {self.url} was aborted")
+        return phase
+
+    def error(self) -> str:
+        """Error message of a failed job."""
+        try:
+            response = self.session.get(f"{self.url}/error", timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException:
+            return "unknown error"
+        text = response.text.strip()
+        if text.startswith("<"):
+            # A VOTable with the message in its QUERY_STATUS INFO
+            try:
+                for element in ElementTree.fromstring(text).iter():
+                    if element.get("name") == "QUERY_STATUS":
+                        return (element.text or "").strip() or "unknown error"
+            except ElementTree.ParseError:
+                pass
+        return text or "unknown error"
+
+    def iter_results(self, chunk_size: int = 10000) -> Iterator[pd.DataFrame]:
+        """Stream the result table as DataFrame chunks; see
+        `shopping_client.votable.iter_votable`."""
+        response = self.session.get(
+            f"{self.url}/results/result", stream=True, timeout=self.timeout
+        )
+        with response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            # Keep the raw stream "open" at EOF so that buffered data can be read
+            response.raw.auto_close = False
+            yield from iter_votable(
+                io.BufferedReader(response.raw, buffer_size=1 << 16), chunk_size
+            )
+
+    def delete(self):
+        """Remove the job from the service, ignoring failures."""
+        if self.url is None:
+            return
+        try:
+            self.session.delete(self.url, timeout=self.timeout, allow_redirects=False)
+        except requests.RequestException:
+            pass
+
+    def _post_phase(self, phase):
+        response = self.session.post(
+            f"{self.url}/phase",
+            data=dict(PHASE=phase),
+            timeout=self.timeout,
+            allow_redirects=False,
+        )
+        response.raise_for_status()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.delete()
@@ -0,0 +1,270 @@
+"""Local stand-in for an asynchronous TAP service.
+
+`tap_server` implements the UWS job endpoints used by
+`astron_vo.tap.tap_job` (job creation, phase polling, results, error and
+deletion) and table uploads, so that `astron_vo_connector.run_query` and
+`astron_vo_connector.run_queries` can be tested without network access, e.g.
+
+    with tap_server({"ivoa.obscore": frame}) as server:
+        connector = astron_vo_connector(service=server.url)
+        results, errors = connector.run_queries(items)
+
+It does not parse ADQL; queries are answered by an `execute` function, and
+the default one only understands the queries the connector generates.
+"""
+import email.parser
+import email.policy
+import io
+import itertools
+import re
+import threading
+import urllib.parse
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from shopping_client.stand_in import stand_in_handler, stand_in_server
+from shopping_client.votable import MEDIA_TYPE, read_votable, write_votable
+
+_SELECT = re.compile(r"^\s*SELECT\s+(?:TOP\s+(\d+)\s+)?\*\s+FROM\s+([\w.]+)\s*$", re.I)
+_CONE = re.compile(
+    r"SELECT\s+u\.(\w+)\s*,\s*t\.\*\s+FROM\s+TAP_UPLOAD\.(\w+)\s+AS\s+u\s+"
+    r"JOIN\s+([\w.]+)\s+AS\s+t\s+ON\s+1\s*=\s*CONTAINS\(\s*"
+    r"POINT\('ICRS',\s*t\.(\w+),\s*t\.(\w+)\)\s*,\s*"
+    r"CIRCLE\('ICRS',\s*u\.(\w+),\s*u\.(\w+),\s*u\.(\w+)\)\s*\)",
+    re.I,
+)
+
+
+class tap_server(stand_in_server):
+    """TAP service on `127.0.0.1` serving the tables in `tables`.
+
+    Attributes
+    ----------
+    url : str
+        Base URL of the service, to be passed as `service`.
+    queries : list
+        Query of every job created.
+    max_active : int
+        Highest number of jobs seen executing at the same time.
+    """
+
+    path = "/tap/"
+
+    def __init__(
+        self,
+        tables: Dict[str, pd.DataFrame],
+        execute: Optional[Callable[[str, Dict[str, pd.DataFrame], Dict], pd.DataFrame]] = None,
+        executing_polls: int = 2,
+        run_on_create: bool = True,
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        tables : Dict[str, pd.DataFrame]
+            Tables by qualified name, e.g. `ivoa.obscore`.
+        execute : Callable
+            Called as `execute(query, uploads, tables)` to answer a query,
+            with the uploaded tables by name; raising an exception makes the
+            job fail with its message. Defaults to `default_execute`.
+        executing_polls : int
+            Number of phase requests answered with `EXECUTING` before a job
+            is reported as finished.
+        run_on_create : bool
+            If `False`, `PHASE=RUN` is ignored when a job is created, as by
+            services that leave every new job `PENDING` until it is started
+            separately.
+
+        """
+        self.tables = dict(tables)
+        self.execute = execute or default_execute
+        self.executing_polls = executing_polls
+        self.run_on_create = run_on_create
+        self.queries = []
+        self.jobs = {}
+        self.max_active = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        super().__init__(_handler)
+
+    def create_job(self, parameters: Dict[str, str], files: Dict[str, bytes]) -> str:
+        """Run a query and register its job; returns the job id. The result
+        is computed immediately, only the reported phase lags behind."""
+        query = parameters.get("QUERY", "")
+        uploads = {}
+        for upload in filter(None, parameters.get("UPLOAD", "").split(";")):
+            name, _, reference = upload.partition(",")
+            if reference.startswith("param:"):
+                uploads[name] = read_votable(io.BytesIO(files[reference[6:]]))
+        job = dict(query=query, polls=0, result=None, error=None)
+        try:
+            result = self.execute(query, uploads, self.tables)
+            if parameters.get("MAXREC"):
+                result = result.head(int(parameters["MAXREC"]))
+            job["result"] = write_votable(result, table_name="result")
+        except Exception as e:
+            job["error"] = str(e)
+        run = self.run_on_create and parameters.get("PHASE", "").upper() == "RUN"
+        job["phase"] = "EXECUTING" if run else "PENDING"
+        with self._lock:
+            job_id = str(next(self._ids))
+            self.queries.append(query)
+            self.jobs[job_id] = job
+            self._count_active()
+        return job_id
+
+    def poll(self, job_id: str) -> str:
+        """Phase of a job, advancing executing jobs towards completion."""
+        with self._lock:
+            job = self.jobs[job_id]
+            if job["phase"] == "EXECUTING":
+                if job["polls"] >= self.executing_polls:
+                    job["phase"] = "ERROR" if job["error"] is not None else "COMPLETED"
+                job["polls"] += 1
+                self._count_active()
+            return job["phase"]
+
+    def set_phase(self, job_id: str, phase: str):
+        with self._lock:
+            job = self.jobs[job_id]
+            if phase == "RUN" and job["phase"] == "PENDING":
+                job["phase"] = "EXECUTING"
+            elif phase == "ABORT" and job["phase"] in ("PENDING", "EXECUTING"):
+                job["phase"] = "ABORTED"
+            self._count_active()
+
+    def _count_active(self):
+        active = sum(job["phase"] == "EXECUTING" for job in self.jobs.values())
+        self.max_active = max(self.max_active, active)
+
+
+def default_execute(
+    query: str, uploads: Dict[str, pd.DataFrame], tables: Dict[str, pd.DataFrame]
+) -> pd.DataFrame:
+    """Answer `SELECT [TOP n] * FROM <table>` and the upload cone search of
+    `astron_vo_connector.run_queries`; any other query fails, as does a query
+    containing the word `ERROR`."""
+    if re.search(r"\bERROR\b", query):
+        raise RuntimeError("Query failed on request")
+    match = _SELECT.match(query)
+    if match:
+        top, table = match.groups()
+        result = _table(tables, table)
+        return result.head(int(top)) if top else result
+    match = _CONE.search(query)
+    if match:
+        key, upload, table, ra, dec, u_ra, u_dec, u_radius = match.groups()
+        positions = uploads[upload]
+        table = _table(tables, table)
+        parts = []
+        for row in positions.itertuples(index=False):
+            row = row._asdict()
+            separation = _separation(
+                table[ra].to_numpy(float), table[dec].to_numpy(float), row[u_ra], row[u_dec]
+            )
+            selected = table[separation <= row[u_radius]]
+            parts.append(selected.assign(**{key: row[key]})[[key, *table.columns]])
+        if not parts:
+            return pd.DataFrame(columns=[key, *table.columns])
+        return pd.concat(parts, ignore_index=True)
+    raise RuntimeError(f"Unsupported query: {query}")
+
+
+def _table(tables, name):
+    if name not in tables:
+        raise RuntimeError(f"Table {name} does not exist")
+    return tables[name]
+
+
+def _separation(ra, dec, ra0, dec0):
+    # Angular distance in degrees (haversine formula)
+    ra, dec, ra0, dec0 = map(np.radians, (ra, dec, ra0, dec0))
+    a = np.sin((dec - dec0) / 2) ** 2 + np.cos(dec) * np.cos(dec0) * np.sin((ra - ra0) / 2) ** 2
+    return np.degrees(2 * np.arcsin(np.sqrt(np.clip(a, 0, 1))))
+
+
+class _handler(stand_in_handler):
+    def _route(self):
+        # `(job id, remainder)` for paths under /tap/async, else `None`
+        parts = urllib.parse.urlparse(self.path).path.strip("/").split("/")
+        if parts[:2] != ["tap", "async"]:
+            return None
+        if len(parts) == 2:
+            return None, ""
+        if parts[2] not in self.stand_in.jobs:
+            return None
+        return parts[2], "/".join(parts[3:])
+
+    def do_POST(self):
+        server = self.stand_in
+        route = self._route()
+        if route is None:
+            return self._send(404, b"Not found")
+        parameters, files = self._form()
+        job_id, remainder = route
+        if job_id is None:
+            job_id = server.create_job(parameters, files)
+        elif remainder == "phase":
+            server.set_phase(job_id, parameters.get("PHASE", "").upper())
+        else:
+            return self._send(404, b"Not found")
+        self._redirect(f"/tap/async/{job_id}")
+
+    def do_GET(self):
+        server = self.stand_in
+        route = self._route()
+        if route is None or route[0] is None:
+            return self._send(404, b"Not found")
+        job_id, remainder = route
+        job = server.jobs[job_id]
+        if remainder == "phase":
+            return self._send(200, server.poll(job_id).encode())
+        if remainder == "results/result" and job["phase"] == "COMPLETED":
+            return self._send(200, job["result"], MEDIA_TYPE)
+        if remainder == "error" and job["phase"] == "ERROR":
+            return self._send(200, job["error"].encode())
+        if remainder == "":
+            return self._send(200, job["phase"].encode())
+        self._send(404, b"Not found")
+
+    def do_DELETE(self):
+        route = self._route()
+        if route is None or route[0] is None:
+            return self._send(404, b"Not found")
+        with self.stand_in._lock:
+            self.stand_in.jobs.pop(route[0], None)
+        self._redirect("/tap/async")
+
+    def _form(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content_type = self.headers.get("Content-Type", "")
+        if not content_type.startswith("multipart/form-data"):
+            parsed = urllib.parse.parse_qs(body.decode(), keep_blank_values=True)
+            return {key: values[0] for key, values in parsed.items()}, {}
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        parameters, files = {}, {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True)
+            if part.get_filename() is not None:
+                files[name] = payload
+            else:
+                parameters[name] = payload.decode()
+        return parameters, files
+
+    def _redirect(self, location):
+        self.send_response(303)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send(self, status, payload, content_type="text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
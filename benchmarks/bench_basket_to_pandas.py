@@ -0,0 +1,91 @@
+"""Benchmark the conversion of a shopping basket into pandas DataFrames.
+
+Compares the columnar builder used by `shopping_client.get_basket` with the
+previous implementation, which built one `pd.Series` per item and
+concatenated them. No network access is needed; baskets are synthetic.
+
+Usage::
+
+    python benchmarks/bench_basket_to_pandas.py --sizes 1000 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HERE, os.path.dirname(HERE)]
+
+import pandas as pd  # noqa: E402
+
+from alta import alta_connector  # noqa: E402
+from astron_vo import astron_vo_connector  # noqa: E402
+from rucio_cli import rucio_connector  # noqa: E402
+from samp import samp_connector  # noqa: E402
+from shopping_client import shopping_client  # noqa: E402
+from synthetic import synthetic_basket  # noqa: E402
+
+# The Zooniverse connector needs a Panoptes login, so leave its items out
+ARCHIVES = ("apertif", "astron_vo", "rucio", "samp")
+
+
+def legacy_basket_to_pandas(connectors, basket):
+    converted_basket = {}
+    for connector in connectors:
+        items = [
+            connector.basket_item_to_pandas(item)
+            for item in basket
+            if connector.validate_basket_item(item)
+        ]
+        if len(items):
+            converted_basket[connector.name] = pd.concat(items, axis=1)
+    return {
+        name: data.to_frame().T if data.ndim < 2 else data.T
+        for name, data in converted_basket.items()
+    }
+
+
+def columnar_basket_to_pandas(connectors, basket):
+    client = shopping_client(token="", connectors=connectors)
+    client.basket = basket
+    return client.get_basket(convert_to_pandas=True)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+    )
+    parser.add_argument(
+        "--legacy-max",
+        type=int,
+        default=10 ** 5,
+        help="largest basket for which the legacy path is timed",
+    )
+    args = parser.parse_args(argv)
+
+    connectors = [
+        alta_connector(),
+        astron_vo_connector(),
+        rucio_connector(),
+        samp_connector(),
+    ]
+    print(f"{'items':>10} {'legacy [s]':>12} {'columnar [s]':>14} {'speedup':>9}")
+    for size in args.sizes:
+        basket = synthetic_basket(size, archives=ARCHIVES)
+        columnar = timed(columnar_basket_to_pandas, connectors, basket)
+        if size <= args.legacy_max:
+            legacy = timed(legacy_basket_to_pandas, connectors, basket)
+            print(f"{size:>10} {legacy:>12.3f} {columnar:>14.3f} {legacy / columnar:>8.1f}x")
+        else:
+            print(f"{size:>10} {'-':>12} {columnar:>14.3f} {'-':>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Benchmark the time needed to import the client and each connector.
+
+Every import is timed in a fresh interpreter, so that module caches of one
+measurement do not affect the next. Pass `--root` to time another checkout,
+e.g. a `git worktree` of an older commit, for comparison.
+
+Usage::
+
+    python benchmarks/bench_import_time.py --repeat 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = (
+    "shopping_client",
+    "alta",
+    "astron_vo",
+    "rucio_cli",
+    "samp",
+    "zooniverse",
+)
+
+_TIMER = (
+    "import time; start = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def import_time(module, root):
+    env = dict(os.environ, PYTHONPATH=root, PYTHONDONTWRITEBYTECODE="1")
+    output = subprocess.run(
+        [sys.executable, "-c", _TIMER.format(module=module)],
+        env=env,
+        cwd=root,
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+    return float(output.split()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=list(DEFAULT_MODULES))
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--root",
+        default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        help="checkout whose modules are imported",
+    )
+    args = parser.parse_args(argv)
+
+    # Warm the OS file cache so that the first module is not penalised.
+    import_time(args.modules[0], args.root)
+    print(f"{'module':>16} {'median [ms]':>12} {'min [ms]':>10}")
+    for module in args.modules:
+        times = [import_time(module, args.root) for _ in range(args.repeat)]
+        print(
+            f"{module:>16} {statistics.median(times) * 1e3:>12.1f} "
+            f"{min(times) * 1e3:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Load test of basket retrieval by many concurrent users.
+
+Every virtual user is a `shopping_client` that obtains its access token
+from a JupyterHub API, like a notebook session, and then fetches its basket
+repeatedly. Users run as threads of one process (sharing the pooled
+session, like kernels of one server) or as separate processes (like
+JupyterHub sessions). By default they talk to a local stand-in of the
+user-profile API, `shopping_client.testing.user_profile_server`, whose
+basket sizes, latency, error rate and token lifetime are set from the
+command line; `--host` and `--hub-api-url` point the test at a real
+deployment instead.
+
+The report gives throughput and p50/p95/p99 latency of the basket
+fetches, the failures by type, and the responses of the stand-in by
+status.
+
+Usage::
+
+    python benchmarks/bench_load.py --users 200 --mode process --requests 20 \\
+        --basket-size 100 5000 --latency 0.01 0.05 --error-rate 0.01
+"""
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shopping_client import shopping_client  # noqa: E402
+from shopping_client.session import make_session  # noqa: E402
+from shopping_client.testing import user_profile_server  # noqa: E402
+
+
+class virtual_user(shopping_client):
+    """Client that gets its token from the JupyterHub API with its own
+    credentials, rather than from the environment of the process."""
+
+    def __init__(self, hub_api_url, hub_token, **kwargs):
+        self.hub_api_url = hub_api_url
+        self.hub_token = hub_token
+        super().__init__(**kwargs)
+
+    def _token_sources(self):
+        return [(self._token_from_hub, False)]
+
+    def _token_from_hub(self):
+        response = self.session.get(
+            f"{self.hub_api_url}/user",
+            headers={"Authorization": f"token {self.hub_token}"},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()["auth_state"]["exchanged_tokens"][self.audience]
+
+
+def run_user(user, options, session=None, start_at=None):
+    """Fetch the basket of `user` `options["requests"]` times; returns the
+    latencies of the successful fetches, the failures by type and the number
+    of items fetched."""
+    client = virtual_user(
+        options["hub_api_url"],
+        user,
+        host=options["host"],
+        session=session or make_session(pool_maxsize=1),
+        timeout=options["timeout"],
+    )
+    client.tokens.min_validity = options["min_validity"]
+    if start_at is not None:
+        time.sleep(max(0.0, start_at - time.time()))
+    latencies, failures, items = [], collections.Counter(), 0
+    for _ in range(options["requests"]):
+        start = time.perf_counter()
+        try:
+            basket = list(client.iter_basket())
+        except Exception as e:
+            failures[type(e).__name__] += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+            items += len(basket)
+        if options["think_time"]:
+            time.sleep(options["think_time"])
+    client.close()
+    return latencies, failures, items
+
+
+def _run_process(args):
+    user, options, start_at = args
+    return run_user(user, options, start_at=start_at)
+
+
+def run(options, users, mode, workers):
+    """Run all users and return `(latencies, failures, items, duration)`."""
+    names = [f"user{i:05d}" for i in range(users)]
+    # Let all users start at the same time, once the workers are up
+    start_at = time.time() + options["start_delay"]
+    if mode == "thread":
+        session = None
+        if options["shared_session"]:
+            session = make_session(pool_maxsize=min(users, workers))
+        executor = concurrent.futures.ThreadPoolExecutor(workers)
+        calls = [(run_user, name, options, session, start_at) for name in names]
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+        calls = [(_run_process, (name, options, start_at)) for name in names]
+    latencies, failures, items = [], collections.Counter(), 0
+    with executor:
+        futures = [executor.submit(*call) for call in calls]
+        for future in concurrent.futures.as_completed(futures):
+            user_latencies, user_failures, user_items = future.result()
+            latencies += user_latencies
+            failures.update(user_failures)
+            items += user_items
+    return latencies, failures, items, time.time() - start_at
+
+
+def percentiles(values, points=(50, 95, 99)):
+    if len(values) < 2:
+        return {point: (values[0] if values else float("nan")) for point in points}
+    quantiles = statistics.quantiles(values, n=100, method="inclusive")
+    return {point: quantiles[point - 1] for point in points}
+
+
+def _range(values):
+    return values[0] if len(values) == 1 else tuple(values)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--mode", choices=("thread", "process"), default="thread")
+    parser.add_argument("--workers", type=int, help="threads or processes; default one per user")
+    parser.add_argument("--requests", type=int, default=10, help="basket fetches per user")
+    parser.add_argument("--think-time", type=float, default=0.0,
+                        help="seconds a user waits between fetches")
+    parser.add_argument("--no-shared-session", dest="shared_session", action="store_false",
+                        help="give every thread its own connection pool")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--min-validity", type=float, default=10.0,
+                        help="seconds a token must still be valid for the clients to use it")
+    parser.add_argument("--start-delay", type=float, default=1.0,
+                        help="seconds given to the workers to start before the test")
+    stand_in = parser.add_argument_group("stand-in server")
+    stand_in.add_argument("--basket-size", type=int, nargs="+", default=[100],
+                          help="items per basket, or a LOW HIGH range")
+    stand_in.add_argument("--page-size", type=int, default=100)
+    stand_in.add_argument("--latency", type=float, nargs="+", default=[0.0],
+                          help="seconds per request, or a LOW HIGH range")
+    stand_in.add_argument("--error-rate", type=float, default=0.0)
+    stand_in.add_argument("--token-lifetime", type=float, default=3600.0,
+                          help="seconds; must exceed --min-validity, or no token is ever used")
+    remote = parser.add_argument_group("remote server")
+    remote.add_argument("--host", help="ESAP gateway to test instead of the stand-in")
+    remote.add_argument("--hub-api-url", help="JupyterHub API issuing the tokens")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.host is None:
+        if args.token_lifetime <= args.min_validity:
+            parser.error(
+                f"--token-lifetime {args.token_lifetime:g} must exceed --min-validity "
+                f"{args.min_validity:g}: clients never use a token valid for less"
+            )
+        server = user_profile_server(
+            basket_size=_range(args.basket_size),
+            page_size=args.page_size,
+            latency=_range(args.latency),
+            error_rate=args.error_rate,
+            token_lifetime=args.token_lifetime,
+        ).start()
+        args.host, args.hub_api_url = server.url, server.hub_api_url
+    elif args.hub_api_url is None:
+        parser.error("--hub-api-url is required with --host")
+
+    options = dict(
+        host=args.host,
+        hub_api_url=args.hub_api_url,
+        requests=args.requests,
+        think_time=args.think_time,
+        timeout=args.timeout,
+        min_validity=args.min_validity,
+        shared_session=args.shared_session,
+        start_delay=args.start_delay,
+    )
+    workers = args.workers or args.users
+    try:
+        latencies, failures, items, duration = run(options, args.users, args.mode, workers)
+    finally:
+        if server is not None:
+            server.stop()
+
+    fetches = len(latencies) + sum(failures.values())
+    quantiles = percentiles(latencies)
+    report = dict(
+        users=args.users,
+        mode=args.mode,
+        workers=workers,
+        fetches=fetches,
+        failed=sum(failures.values()),
+        failures=dict(failures),
+        duration=duration,
+        throughput=len(latencies) / duration,
+        items_per_second=items / duration,
+        latency=dict(
+            mean=statistics.mean(latencies) if latencies else float("nan"),
+            p50=quantiles[50],
+            p95=quantiles[95],
+            p99=quantiles[99],
+            max=max(latencies, default=float("nan")),
+        ),
+    )
+    if server is not None:
+        report["server"] = dict(
+            responses={str(status): count for status, count in sorted(server.statuses.items())},
+            tokens_issued=server.tokens_issued,
+            max_active=server.max_active,
+        )
+
+    print(f"{args.users} users ({workers} {args.mode} workers), {fetches} basket fetches in {duration:.2f} s")
+    print(f"throughput  {report['throughput']:.1f} fetches/s, {report['items_per_second']:.0f} items/s")
+    latency = report["latency"]
+    print(
+        "latency     "
+        + ", ".join(f"{key} {latency[key] * 1000:.1f} ms" for key in ("mean", "p50", "p95", "p99", "max"))
+    )
+    print(f"failures    {report['failed']}" + (f" {dict(failures)}" if failures else ""))
+    if server is not None:
+        print(
+            f"server      responses {report['server']['responses']}, "
+            f"{server.tokens_issued} tokens issued, {server.max_active} concurrent requests at most"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""Micro-benchmark suite for basket conversion and export parsing.
+
+Every case runs without network access on synthetic data (see
+`benchmarks/synthetic.py`): HTTP responses are served from memory by a
+`requests` transport adapter. For each case and input size the suite
+records the wall time of several runs and, in a separate run under
+`tracemalloc`, the peak of the memory allocated by Python. Results are
+written as JSON, by default to `benchmarks/results/<commit>.json`, and two
+result files can be compared with `benchmarks/compare.py`.
+
+Cases that use an API the benchmarked checkout does not have are recorded
+as skipped, and a case that raises is recorded with its error; neither
+stops the run.
+
+To benchmark an older commit with the same cases and data, check it out in
+a worktree and pass it as `--root`:
+
+    git worktree add /tmp/base v0.3.0
+    python benchmarks/bench_suite.py --root /tmp/base --output base.json
+    python benchmarks/bench_suite.py --output head.json
+    python benchmarks/compare.py base.json head.json
+
+Usage::
+
+    python benchmarks/bench_suite.py --sizes 100 10000 1000000 --cases 'get_basket.*'
+"""
+import argparse
+import contextlib
+import datetime
+import fnmatch
+import gc
+import importlib.util
+import inspect
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+DEFAULT_SIZES = [10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+DEFAULT_ROWS = [10 ** 3, 10 ** 4, 10 ** 5]
+PAGE_SIZE = 1000
+
+
+class skipped(str):
+    """Reason why a case cannot run on the benchmarked checkout."""
+
+
+def _memory_adapter(responses):
+    # Transport adapter answering GET requests from `responses`, a `dict` of
+    # body bytes keyed by URL, as if they came from the network
+    import requests
+    import urllib3
+
+    class adapter(requests.adapters.HTTPAdapter):
+        def send(self, request, **kwargs):
+            body = responses.get(request.url)
+            raw = urllib3.HTTPResponse(
+                body=io.BytesIO(body or b""),
+                headers={"Content-Type": "application/json"},
+                status=404 if body is None else 200,
+                preload_content=False,
+                decode_content=True,
+            )
+            return self.build_response(request, raw)
+
+    return adapter()
+
+
+def _memory_session(responses, host):
+    import requests
+
+    session = requests.Session()
+    session.mount(host, _memory_adapter(responses))
+    return session
+
+
+def _accepts(function, parameter):
+    # Whether `function` takes `parameter`, so that cases can tell which
+    # features the benchmarked checkout has
+    try:
+        return parameter in inspect.signature(function).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _offline_zooniverse():
+    # A Zooniverse connector that does not log in to Panoptes, or `None` on
+    # checkouts that always log in when the connector is created
+    from zooniverse import zooniverse
+
+    if not _accepts(zooniverse.__init__, "connect"):
+        return None
+    return zooniverse(username="benchmark", password="", connect=False)
+
+
+def basket_cases(size):
+    """Cases working on a basket of `size` items of all five connectors.
+
+    The Zooniverse connector is not passed to the client, as older checkouts
+    cannot create it without a Panoptes login, so its items are only
+    filtered out; cases whose API the checkout lacks are skipped.
+    """
+    from alta import alta_connector
+    from astron_vo import astron_vo_connector
+    from rucio_cli import rucio_connector
+    from samp import samp_connector
+    from shopping_client import shopping_client
+    from synthetic import basket_pages, synthetic_basket
+
+    connectors = [
+        alta_connector(),
+        astron_vo_connector(),
+        rucio_connector(),
+        samp_connector(),
+    ]
+    basket = synthetic_basket(size)
+
+    def client(**kwargs):
+        sc = shopping_client(
+            token="benchmark", client_validate_token=False, connectors=connectors, **kwargs
+        )
+        sc.basket = list(basket)
+        return sc
+
+    host = "http://esap.invalid/"
+    pages = basket_pages(basket, PAGE_SIZE, host)
+    session = _memory_session(pages, host)
+
+    def iter_basket():
+        sc = shopping_client(
+            token="benchmark", host=host, client_validate_token=False, session=session
+        )
+        for _ in sc.iter_basket():
+            pass
+
+    def filter_on_archive():
+        client()._filter_on_archive()
+
+    def get_basket_pandas():
+        client().get_basket(convert_to_pandas=True)
+
+    def get_basket_flatten():
+        client().get_basket(convert_to_pandas=True, flatten=True)
+
+    def get_basket_arrow():
+        client().get_basket(format="arrow")
+
+    get_basket = shopping_client.get_basket
+    cases = {
+        "iter_basket": iter_basket
+        if hasattr(shopping_client, "iter_basket")
+        and _accepts(shopping_client.__init__, "session")
+        else skipped("no shopping_client.iter_basket(session=...)"),
+        "filter_on_archive": filter_on_archive
+        if hasattr(shopping_client, "_filter_on_archive")
+        else skipped("no shopping_client._filter_on_archive"),
+        "get_basket.pandas": get_basket_pandas,
+        "get_basket.flatten": get_basket_flatten
+        if _accepts(get_basket, "flatten")
+        else skipped("no get_basket(flatten=...)"),
+    }
+    if not _accepts(get_basket, "format"):
+        cases["get_basket.arrow"] = skipped("no get_basket(format=...)")
+    elif importlib.util.find_spec("pyarrow") is None:
+        cases["get_basket.arrow"] = skipped("pyarrow is not installed")
+    else:
+        cases["get_basket.arrow"] = get_basket_arrow
+    return cases
+
+
+def zooniverse_cases(rows):
+    """Cases parsing Zooniverse exports with `rows` rows."""
+    from synthetic import classifications_csv, subjects_csv
+
+    modes = ("eager", "batch")
+    exports = {
+        "subjects": subjects_csv(rows),
+        "classifications": classifications_csv(rows),
+    }
+    names = [
+        f"zooniverse.chunked_content.{category}.{mode}"
+        for category in exports
+        for mode in modes
+    ]
+    connector = _offline_zooniverse()
+    if connector is None:
+        reason = skipped("zooniverse connector cannot be created without a login")
+        return dict.fromkeys(names, reason)
+
+    host = "http://panoptes.invalid/"
+    session = _memory_session(
+        {host + category: data for category, data in exports.items()}, host
+    )
+    json_columns = _accepts(connector._chunked_content, "json_columns")
+
+    def chunked_content(category, mode):
+        if not json_columns and mode != "eager":
+            return skipped("no _chunked_content(json_columns=...)")
+        kwargs = dict(json_columns=mode) if json_columns else {}
+        item = dict(
+            item_data=json.dumps(
+                dict(archive="zooniverse", catalog="workflow", workflow_id=1, category=category)
+            )
+        )
+
+        def run():
+            response = session.get(host + category, stream=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                connector._chunked_content(item, response, **kwargs)
+
+        return run
+
+    return {
+        f"zooniverse.chunked_content.{category}.{mode}": chunked_content(category, mode)
+        for category in exports
+        for mode in modes
+    }
+
+
+def measure(function, repeat, min_time=0.0):
+    """Times of at least `repeat` runs, repeated until they add up to
+    `min_time` seconds, and the peak of traced memory of one more run."""
+    times = []
+    while len(times) < repeat or (sum(times) < min_time and len(times) < 1000):
+        # Like timeit, keep garbage collection out of the timings
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def git_commit(root):
+    """`(commit, dirty)` of the checkout at `root`, or `(None, None)`."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=root, check=True,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+            check=True, stdout=subprocess.PIPE, universal_newlines=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def environment():
+    versions = {}
+    for module in ("pandas", "numpy", "pyarrow", "ijson", "orjson", "requests"):
+        try:
+            versions[module] = __import__(module).__version__
+        except (ImportError, AttributeError):
+            versions[module] = None
+    return dict(
+        python=platform.python_version(),
+        implementation=platform.python_implementation(),
+        machine=platform.machine(),
+        system=platform.system(),
+        processor=platform.processor(),
+        cpus=os.cpu_count(),
+        packages=versions,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="numbers of basket items")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS,
+                        help="numbers of rows of the Zooniverse exports")
+    parser.add_argument("--cases", nargs="+", default=["*"],
+                        help="glob patterns selecting the cases to run")
+    parser.add_argument("--repeat", type=int, default=3, help="minimum number of runs")
+    parser.add_argument("--min-time", type=float, default=0.5,
+                        help="fast cases are repeated until they ran this many seconds")
+    parser.add_argument("--root", default=ROOT, help="checkout whose code is benchmarked")
+    parser.add_argument("--output", help="result file; defaults to benchmarks/results/<commit>.json")
+    args = parser.parse_args(argv)
+
+    root = os.path.abspath(args.root)
+    sys.path[:0] = [HERE, root]
+    commit, dirty = git_commit(root)
+    output = args.output or os.path.join(
+        HERE, "results", f"{commit or 'unknown'}{'-dirty' if dirty else ''}.json"
+    )
+
+    # panoptes_client logs INFO to stderr; keep the output out of the timings
+    logging.disable(logging.INFO)
+
+    def selected(name):
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in args.cases)
+
+    suites = [(basket_cases, size) for size in args.sizes]
+    suites += [(zooniverse_cases, rows) for rows in args.rows]
+    results = []
+    print(f"{'case':<50} {'size':>8} {'min [s]':>9} {'median [s]':>11} {'peak [MB]':>10}")
+    for build, size in suites:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            try:
+                cases = build(size)
+            except Exception as e:
+                # e.g. a module the checkout does not have
+                cases = {build.__name__: e}
+            for name, function in cases.items():
+                if not selected(name):
+                    continue
+                result = dict(case=name, size=size)
+                results.append(result)
+                if isinstance(function, skipped):
+                    result["skipped"] = str(function)
+                    print(f"{name:<50} {size:>8} skipped: {function}")
+                    continue
+                try:
+                    if isinstance(function, Exception):
+                        raise function
+                    times, peak = measure(function, args.repeat, args.min_time)
+                except Exception as e:
+                    result["error"] = f"{type(e).__name__}: {e}"
+                    print(f"{name:<50} {size:>8} FAILED: {result['error']}")
+                    continue
+                result.update(
+                    runs=len(times),
+                    min=min(times),
+                    median=statistics.median(times),
+                    peak_memory=peak,
+                )
+                print(
+                    f"{name:<50} {size:>8} {min(times):>9.4f} "
+                    f"{statistics.median(times):>11.4f} {peak / 2 ** 20:>10.1f}"
+                )
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(
+            dict(
+                commit=commit,
+                dirty=dirty,
+                root=root,
+                date=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                repeat=args.repeat,
+                environment=environment(),
+                results=results,
+            ),
+            f,
+            indent=1,
+        )
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Compare two result files of `benchmarks/bench_suite.py`.
+
+For every case and size present in both files, the minimum time and the
+peak memory of the new run are shown relative to the base run. The exit
+status is 1 if any of them grew by more than the threshold, so the script
+can gate a release or a CI job.
+
+Usage::
+
+    python benchmarks/compare.py base.json head.json --threshold 0.2
+"""
+import argparse
+import json
+import sys
+
+# Times below this are dominated by noise and never count as regressions
+MIN_TIME = 5e-3
+# Likewise for peak memory below this many bytes
+MIN_MEMORY = 1 << 20
+
+
+def load(path):
+    # Cases that were skipped or failed have no timings and are not compared
+    with open(path) as f:
+        run = json.load(f)
+    timed = {
+        (result["case"], result["size"]): result
+        for result in run["results"]
+        if "min" in result
+    }
+    return run, timed
+
+
+def untimed(run):
+    """`"case[size]: reason"` of every skipped or failed case of `run`."""
+    return [
+        f"{result['case']}[{result['size']}]: "
+        + result.get("error", "skipped, " + result.get("skipped", ""))
+        for result in run["results"]
+        if "min" not in result
+    ]
+
+
+def label(run):
+    commit = (run.get("commit") or "unknown")[:10]
+    return commit + ("+" if run.get("dirty") else "")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative increase reported as a regression")
+    parser.add_argument("--metric", choices=("min", "median"), default="min",
+                        help="time statistic to compare")
+    args = parser.parse_args(argv)
+
+    base_run, base = load(args.base)
+    new_run, new = load(args.new)
+    if base_run.get("environment") != new_run.get("environment"):
+        print("Warning: the runs were made in different environments\n")
+
+    print(f"base {label(base_run)}, new {label(new_run)}, {args.metric} time\n")
+    print(
+        f"{'case':<50} {'size':>8} {'base [s]':>9} {'new [s]':>9} {'time':>7} "
+        f"{'base [MB]':>9} {'new [MB]':>9} {'memory':>7}"
+    )
+    regressions = []
+    for key in sorted(base.keys() & new.keys()):
+        old, current = base[key], new[key]
+        time_ratio = current[args.metric] / old[args.metric] if old[args.metric] else 1.0
+        memory_ratio = (
+            current["peak_memory"] / old["peak_memory"] if old["peak_memory"] else 1.0
+        )
+        flags = []
+        if time_ratio > 1 + args.threshold and current[args.metric] >= MIN_TIME:
+            flags.append("time")
+        if memory_ratio > 1 + args.threshold and current["peak_memory"] >= MIN_MEMORY:
+            flags.append("memory")
+        if flags:
+            regressions.append((key, flags))
+        case, size = key
+        print(
+            f"{case:<50} {size:>8} {old[args.metric]:>9.4f} {current[args.metric]:>9.4f} "
+            f"{time_ratio:>6.2f}x {old['peak_memory'] / 2 ** 20:>9.1f} "
+            f"{current['peak_memory'] / 2 ** 20:>9.1f} {memory_ratio:>6.2f}x"
+            + ("  <- " + ", ".join(flags) if flags else "")
+        )
+
+    base_cases = {(result["case"], result["size"]) for result in base_run["results"]}
+    new_cases = {(result["case"], result["size"]) for result in new_run["results"]}
+    for name, keys in (("base", base_cases - new_cases), ("new", new_cases - base_cases)):
+        if keys:
+            print(f"\nOnly in {name}: " + ", ".join(f"{c}[{s}]" for c, s in sorted(keys)))
+    for name, run in (("base", base_run), ("new", new_run)):
+        lines = untimed(run)
+        if lines:
+            print(f"\nNot timed in {name}:\n  " + "\n  ".join(lines))
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        return 1
+    print(f"\nNo regressions above {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""Synthetic, reproducible input data for the benchmarks.
+
+Baskets contain items of all five connectors in equal parts, with fields
+like those the ESAP archives put into `item_data`. Zooniverse exports have
+the columns of real subject and classification exports, including their
+JSON columns.
+"""
+import csv
+import io
+import json
+import random
+
+ARCHIVES = ("apertif", "astron_vo", "rucio", "samp", "zooniverse")
+
+
+def _apertif(rng, i):
+    return {
+        "archive": "apertif",
+        "catalog": rng.choice(("dataproducts", "observations")),
+        "PID": f"{190000000 + i}_AP_B{rng.randrange(40):03d}",
+        "name": f"WSRTA{190000000 + i}",
+        "RA": rng.uniform(0, 360),
+        "dec": rng.uniform(-10, 90),
+        "fov": 1.0,
+        "dataProductType": "visibility",
+        "dataProductSubType": rng.choice(("uncalibratedVisibility", "calibratedVisibility")),
+        "datasetID": "apertif-imaging",
+        "url": f"https://alta.astron.nl/altapi/dataproducts/{i}/",
+        "thumbnail": f"https://alta.astron.nl/static/thumbnails/{i}.png",
+    }
+
+
+def _astron_vo(rng, i):
+    return {
+        "archive": "astron_vo",
+        "catalog": "ivoa.obscore",
+        "obs_id": f"obs-{i}",
+        "obs_publisher_did": f"ivo://astron.nl/~?lofar/{i}",
+        "dataproduct_type": rng.choice(("image", "cube", "visibility")),
+        "s_ra": rng.uniform(0, 360),
+        "s_dec": rng.uniform(-90, 90),
+        "s_fov": rng.uniform(0.1, 5),
+        "t_min": 58000 + rng.random() * 1000,
+        "em_min": 1.5,
+        "calib_level": rng.randrange(4),
+        "access_url": f"https://vo.astron.nl/getproduct/lofar/{i}.fits",
+        "access_format": "image/fits",
+    }
+
+
+def _rucio(rng, i):
+    scope = rng.choice(("lofar", "skao", "user.jdoe"))
+    name = f"L{600000 + i}_SB{rng.randrange(244):03d}_uv.MS.tar"
+    return {
+        "archive": "rucio",
+        "catalog": "rucio",
+        "scope": scope,
+        "name": name,
+        "did": f"{scope}:{name}",
+        "rse": rng.choice(("SARA-DCACHE", "JUELICH-DCACHE", "PSNC-DCACHE")),
+        "bytes": rng.randrange(10 ** 6, 10 ** 10),
+        "adler32": f"{rng.getrandbits(32):08x}",
+    }
+
+
+def _samp(rng, i):
+    return {
+        "archive": "samp",
+        "catalog": "samp",
+        "name": f"table-{i}",
+        "url": f"http://127.0.0.1:8000/tables/{i}.vot",
+        "table_id": f"t{i}",
+        "meta": {"rows": rng.randrange(10 ** 5), "sender": "topcat"},
+    }
+
+
+def _zooniverse(rng, i):
+    catalog = rng.choice(("project", "workflow"))
+    data = {
+        "archive": "zooniverse",
+        "catalog": catalog,
+        "project_id": 10000 + i % 50,
+        "category": rng.choice(("subjects", "classifications")),
+    }
+    if catalog == "workflow":
+        data["workflow_id"] = 20000 + i % 200
+    return data
+
+
+_ITEMS = dict(
+    apertif=_apertif, astron_vo=_astron_vo, rucio=_rucio, samp=_samp, zooniverse=_zooniverse
+)
+
+
+def synthetic_basket(n_items: int, archives=ARCHIVES, seed: int = 0) -> list:
+    """A basket of `n_items` raw items cycling through `archives`."""
+    rng = random.Random(seed)
+    return [
+        {"id": i, "item_data": json.dumps(_ITEMS[archives[i % len(archives)]](rng, i))}
+        for i in range(n_items)
+    ]
+
+
+def basket_pages(basket: list, page_size: int, host: str) -> dict:
+    """The paginated user-profile API responses serving `basket`, as JSON
+    bytes keyed by URL."""
+    url = host + "esap-api/accounts/user-profiles/"
+    pages = {}
+    for number, start in enumerate(range(0, max(len(basket), 1), page_size), start=1):
+        page_url = url if number == 1 else f"{url}?page={number}"
+        following = f"{url}?page={number + 1}" if start + page_size < len(basket) else None
+        pages[page_url] = json.dumps(
+            {
+                "count": 1,
+                "next": following,
+                "results": [
+                    {
+                        "user_name": "benchmark",
+                        "shopping_cart": basket[start : start + page_size],
+                    }
+                ],
+            }
+        ).encode()
+    return pages
+
+
+def subjects_csv(n_rows: int, seed: int = 0) -> bytes:
+    """A Zooniverse subjects export with `n_rows` subjects."""
+    rng = random.Random(seed)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(
+        [
+            "subject_id", "project_id", "workflow_id", "subject_set_id", "metadata",
+            "locations", "classifications_count", "retired_at", "retirement_reason",
+            "created_at", "updated_at",
+        ]
+    )
+    for i in range(n_rows):
+        retired = rng.random() < 0.3
+        writer.writerow(
+            [
+                50000000 + i,
+                10000,
+                20000 + i % 4,
+                90000 + i % 20,
+                json.dumps(
+                    {
+                        "ra": rng.uniform(0, 360),
+                        "dec": rng.uniform(-90, 90),
+                        "#source": f"LOFAR-{i}",
+                        "Filename": f"cutout_{i}.png",
+                    }
+                ),
+                json.dumps({"0": f"https://panoptes-uploads.zooniverse.org/subject_location/{i}.png"}),
+                rng.randrange(40),
+                "2021-03-01 12:00:00 UTC" if retired else "",
+                "classification_count" if retired else "",
+                "2020-11-17 10:31:22 UTC",
+                "2021-03-01 12:00:00 UTC",
+            ]
+        )
+    return buffer.getvalue().encode()
+
+
+def classifications_csv(n_rows: int, seed: int = 0) -> bytes:
+    """A Zooniverse classifications export with `n_rows` classifications."""
+    rng = random.Random(seed)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(
+        [
+            "classification_id", "user_name", "user_id", "user_ip", "workflow_id",
+            "workflow_name", "workflow_version", "created_at", "gold_standard",
+            "expert", "metadata", "annotations", "subject_data", "subject_ids",
+        ]
+    )
+    for i in range(n_rows):
+        subject_id = 50000000 + rng.randrange(max(n_rows // 10, 1))
+        writer.writerow(
+            [
+                300000000 + i,
+                f"volunteer{rng.randrange(1000)}",
+                rng.randrange(10 ** 6),
+                f"{rng.getrandbits(32):08x}",
+                20000,
+                "Radio morphology",
+                "12.34",
+                "2021-01-05 09:12:44 UTC",
+                "",
+                "",
+                json.dumps(
+                    {
+                        "session": f"{rng.getrandbits(64):016x}",
+                        "viewport": {"width": 1920, "height": 1080},
+                        "started_at": "2021-01-05T09:12:01.114Z",
+                        "finished_at": "2021-01-05T09:12:44.532Z",
+                        "user_language": "en",
+                    }
+                ),
+                json.dumps(
+                    [
+                        {"task": "T0", "value": rng.choice(("Yes", "No"))},
+                        {
+                            "task": "T1",
+                            "value": [
+                                {"x": rng.uniform(0, 500), "y": rng.uniform(0, 500), "tool": 0}
+                                for _ in range(rng.randrange(3))
+                            ],
+                        },
+                    ]
+                ),
+                json.dumps({str(subject_id): {"retired": None, "Filename": f"cutout_{i}.png"}}),
+                subject_id,
+            ]
+        )
+    return buffer.getvalue().encode()
@@ -1,16 +1,73 @@
-import requests
 import json
-import io
-import getpass
+import urllib.parse
+
 import pandas as pd
+import requests
 
-from typing import Union, Optional
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+
+from rucio_cli.transfers import transfer_manager
+from shopping_client.basket_item import load_item_data
+from shopping_client.download import ProgressCallback
+from shopping_client.instrumentation import received_bytes, span
+from shopping_client.session import DEFAULT_TIMEOUT, default_session, post_idempotent
 
 class rucio_connector:
 
     name = "rucio"
     archive = "rucio"
 
+    # `validate_basket_item(item, return_loaded=True)` returns the decoded
+    # item data, see `shopping_client.frames.basket_record`
+    loads_basket_items = True
+
+    # Typed columns of Arrow exports, see `shopping_client.arrow`
+    arrow_fields = (
+        ("scope", "category"),
+        ("name", "string"),
+        ("did", "string"),
+        ("rse", "category"),
+        ("bytes", "int64"),
+        ("adler32", "string"),
+        ("md5", "string"),
+    )
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        token: Union[str, Callable[[], str], None] = None,
+        session: Optional[requests.Session] = None,
+        timeout: Union[float, tuple, None] = DEFAULT_TIMEOUT,
+        schemes: Iterable[str] = ("https", "davs", "http"),
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        host : str
+            URL of the Rucio server, needed for `resolve_replicas` and
+            `download`.
+        token : Union[str, Callable[[], str]]
+            Rucio authentication token (an OIDC access token with the `rucio`
+            audience, such as that of `shopping_client`), or a function
+            returning a valid token.
+        session : requests.Session
+            Session used for all HTTP requests; defaults to the shared
+            session.
+        timeout : Union[float, tuple, None]
+            Timeout passed to every request.
+        schemes : Iterable[str]
+            Protocols of the replicas to return, in order of preference.
+            Replicas are downloaded over HTTP, so only `https`/`davs`/`http`
+            replicas can be downloaded.
+
+        """
+        self.host = host
+        self.token = token
+        self.session = session if session is not None else default_session()
+        self.timeout = timeout
+        self.schemes = list(schemes)
+
     def basket_item_to_pandas(
             self, basket_item: Union[dict, pd.Series], validate: bool = True
     ) -> Optional[pd.Series]:
@@ -36,7 +93,7 @@ class rucio_connector:
         if validate:
             item_data = self.validate_basket_item(basket_item, return_loaded=True)
         else:
-            item_data = json.loads(basket_item["item_data"])
+            item_data = load_item_data(basket_item)
         if item_data:
             return pd.Series(item_data)
         return None
@@ -67,10 +124,168 @@ class rucio_connector:
             If validation fails return `None`.
 
         """
-        item_data = json.loads(basket_item["item_data"])
+        item_data = load_item_data(basket_item)
         if "archive" in item_data and item_data["archive"] == self.archive:
             if return_loaded:
                 return item_data
             else:
                 return True
         return None
+
+    def resolve_replicas(
+        self,
+        items: Union[pd.DataFrame, Iterable[Union[dict, pd.Series]]],
+        batch_size: int = 1000,
+    ) -> Dict[str, dict]:
+        """Resolve the replicas of all Rucio items with batched requests to
+        the `/replicas/list` endpoint, instead of one request per DID.
+
+        Parameters
+        ----------
+        items : Union[pd.DataFrame, Iterable[Union[dict, pd.Series]]]
+            Basket items, or a DataFrame such as
+            `shopping_client.get_basket(convert_to_pandas=True)["rucio"]`.
+            Items of other archives are ignored; duplicate DIDs are resolved
+            once.
+        batch_size : int
+            Maximum number of DIDs per request.
+
+        Returns
+        -------
+        Dict[str, dict]
+            Replica description by DID (`"scope:name"`), with keys `scope`,
+            `name`, `bytes`, `adler32`, `md5` and `sources`, a list of
+            `(rse, pfn)` pairs in order of preference. DIDs without available
+            replicas have an empty `sources` list.
+
+        """
+        dids = {}
+        for did in map(self.item_did, self._iter_items(items)):
+            if did is not None:
+                dids[f"{did[0]}:{did[1]}"] = did
+        replicas = {}
+        keys = list(dids)
+        for start in range(0, len(keys), batch_size):
+            batch = [
+                dict(scope=dids[key][0], name=dids[key][1])
+                for key in keys[start : start + batch_size]
+            ]
+            replicas.update(self._list_replicas(batch))
+        for key, (scope, name) in dids.items():
+            replicas.setdefault(
+                key,
+                dict(scope=scope, name=name, bytes=None, adler32=None, md5=None, sources=[]),
+            )
+        return replicas
+
+    def download(
+        self,
+        items: Union[pd.DataFrame, Iterable[Union[dict, pd.Series]]],
+        directory: str,
+        max_workers: int = 8,
+        per_rse_limit: int = 2,
+        max_attempts: int = 3,
+        progress: Optional[ProgressCallback] = None,
+        storage_headers: Optional[dict] = None,
+    ) -> Tuple[dict, dict]:
+        """Resolve and download the files of all Rucio items to
+        `<directory>/<scope>/<name>`.
+
+        See `rucio_cli.transfers.transfer_manager` for the meaning of the
+        transfer parameters. The Rucio token is only sent to the Rucio
+        server, never to the storage endpoints serving the replicas; pass
+        `storage_headers` if those need their own authentication.
+
+        Returns
+        -------
+        Tuple[dict, dict]
+            `(paths, errors)`: the path of each downloaded file and the
+            exception of each failed one, keyed by DID.
+
+        """
+        replicas = self.resolve_replicas(items)
+        manager = transfer_manager(
+            session=self.session,
+            max_workers=max_workers,
+            per_rse_limit=per_rse_limit,
+            max_attempts=max_attempts,
+            timeout=self.timeout,
+            headers=storage_headers,
+        )
+        return manager.download(replicas, directory, progress=progress)
+
+    @staticmethod
+    def item_did(item: Union[dict, pd.Series]) -> Optional[Tuple[str, str]]:
+        """The `(scope, name)` of a basket item, from its `scope` and `name`
+        fields or a `did` of the form `scope:name`; `None` if the item is not
+        a Rucio item."""
+        data = load_item_data(item) if "item_data" in item else item
+
+        def field(key):
+            # Missing values of DataFrame rows are NaN
+            value = data.get(key)
+            return str(value) if isinstance(value, str) or pd.notna(value) else ""
+
+        if field("archive") != rucio_connector.archive:
+            return None
+        if field("scope") and field("name"):
+            return field("scope"), field("name")
+        scope, _, name = field("did").partition(":")
+        return (scope, name) if scope and name else None
+
+    @staticmethod
+    def _iter_items(items):
+        if isinstance(items, pd.DataFrame):
+            return (row for _, row in items.iterrows())
+        return iter(items)
+
+    def _auth_header(self):
+        token = self.token() if callable(self.token) else self.token
+        return {"X-Rucio-Auth-Token": token} if token else {}
+
+    def _list_replicas(self, dids):
+        # The response is a stream of JSON objects, one per line
+        if self.host is None:
+            raise RuntimeError("rucio_connector needs a `host` to resolve replicas")
+        url = urllib.parse.urljoin(self.host, "replicas/list")
+        headers = dict(self._auth_header(), Accept="application/x-json-stream")
+        payload = dict(dids=dids, schemes=self.schemes, all_states=False)
+        with span("rucio_replicas"):
+            # Listing replicas has no side effects, so it is retried like a GET
+            response = post_idempotent(
+                self.session,
+                url,
+                json=payload,
+                headers=headers,
+                timeout=self.timeout,
+                stream=True,
+            )
+        with response, received_bytes(response, "rucio"):
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                replica = json.loads(line)
+                key = f"{replica['scope']}:{replica['name']}"
+                yield key, dict(
+                    scope=replica["scope"],
+                    name=replica["name"],
+                    bytes=replica.get("bytes"),
+                    adler32=replica.get("adler32"),
+                    md5=replica.get("md5"),
+                    sources=self._sources(replica),
+                )
+
+    def _sources(self, replica):
+        # (rse, pfn) pairs of the replica ordered by scheme preference and
+        # the priority assigned by Rucio
+        pfns = replica.get("pfns") or {}
+        ranked = []
+        for pfn, info in pfns.items():
+            scheme = pfn.partition(":")[0]
+            if scheme not in self.schemes:
+                continue
+            ranked.append(
+                (self.schemes.index(scheme), info.get("priority", 0), info["rse"], pfn)
+            )
+        return [(rse, pfn) for _, _, rse, pfn in sorted(ranked)]
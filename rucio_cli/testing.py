@@ -0,0 +1,169 @@
+"""Local stand-in for a Rucio server and its storage elements.
+
+`rucio_server` serves the `/replicas/list` endpoint and the files of its
+replicas over plain HTTP with Range support. It is meant for testing
+`rucio_connector.resolve_replicas` and `rucio_connector.download` without
+access to a Rucio instance, e.g.
+
+    with rucio_server({("user.jdoe", "file.fits"): b"..."}) as server:
+        connector = rucio_connector(host=server.url)
+        paths, errors = connector.download(items, "data/")
+"""
+import hashlib
+import json
+import threading
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+
+from shopping_client.stand_in import stand_in_handler, stand_in_server
+
+
+class rucio_server(stand_in_server):
+    """Rucio replica catalogue and storage on `127.0.0.1`.
+
+    Every file has one replica on each RSE in `rses`, with the first RSE
+    preferred. Faults can be injected per RSE: `corrupt` RSEs serve wrong
+    bytes, `unavailable` RSEs answer with status 503, and the first
+    `drop_after` bytes of the first transfer of each file from any RSE are
+    followed by a dropped connection.
+
+    Attributes
+    ----------
+    url : str
+        Base URL of the server, to be passed as `host`.
+    requests : list
+        `(method, path)` of every request received.
+    request_headers : list
+        Headers of every request received, in the order of `requests`.
+    max_active : dict
+        Highest number of concurrent transfers seen per RSE.
+    """
+
+    def __init__(
+        self,
+        files: Dict[Tuple[str, str], bytes],
+        rses: Iterable[str] = ("RSE_A", "RSE_B"),
+        corrupt: Iterable[str] = (),
+        unavailable: Iterable[str] = (),
+        drop_after: Optional[int] = None,
+        delay: float = 0.0,
+    ):
+        self.files = dict(files)
+        self.rses = list(rses)
+        self.corrupt = set(corrupt)
+        self.unavailable = set(unavailable)
+        self.drop_after = drop_after
+        self.delay = delay
+        self.requests = []
+        self.request_headers = []
+        self.max_active = {}
+        self._active = {}
+        self._dropped = set()
+        self._lock = threading.Lock()
+        super().__init__(_handler)
+
+    def pfn(self, rse: str, scope: str, name: str) -> str:
+        """URL of the replica of `scope:name` on `rse`."""
+        return f"{self.url}rse/{rse}/{scope}/{name}"
+
+    def replica(self, scope: str, name: str) -> dict:
+        """The `/replicas/list` entry of a file."""
+        data = self.files[(scope, name)]
+        pfns = {
+            self.pfn(rse, scope, name): dict(rse=rse, type="DISK", priority=priority)
+            for priority, rse in enumerate(self.rses, start=1)
+        }
+        return dict(
+            scope=scope,
+            name=name,
+            bytes=len(data),
+            adler32=f"{zlib.adler32(data) & 0xFFFFFFFF:08x}",
+            md5=hashlib.md5(data).hexdigest(),
+            pfns=pfns,
+            rses={rse: [pfn] for pfn, rse in ((p, i["rse"]) for p, i in pfns.items())},
+        )
+
+
+class _handler(stand_in_handler):
+    def do_POST(self):
+        server = self.stand_in
+        server.requests.append(("POST", self.path))
+        server.request_headers.append(dict(self.headers))
+        if not self.path.rstrip("/").endswith("/replicas/list"):
+            return self._empty(404)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        dids = json.loads(body)["dids"]
+        lines = [
+            json.dumps(server.replica(did["scope"], did["name"])).encode() + b"\n"
+            for did in dids
+            if (did["scope"], did["name"]) in server.files
+        ]
+        payload = b"".join(lines)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-json-stream")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.stand_in
+        server.requests.append(("GET", self.path))
+        server.request_headers.append(dict(self.headers))
+        parts = self.path.lstrip("/").split("/", 3)
+        if len(parts) != 4 or parts[0] != "rse":
+            return self._empty(404)
+        _, rse, scope, name = parts
+        data = server.files.get((scope, name))
+        if data is None or rse not in server.rses:
+            return self._empty(404)
+        if rse in server.unavailable:
+            return self._empty(503)
+        if rse in server.corrupt:
+            data = bytes(b ^ 0xFF for b in data)
+
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") in (None, etag):
+            start = int(range_header.split("=")[1].split("-")[0])
+        if start >= len(data) and data:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(data)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = data[start:]
+        drop = False
+        with server._lock:
+            if server.drop_after is not None and (scope, name) not in server._dropped:
+                server._dropped.add((scope, name))
+                drop = True
+            server._active[rse] = server._active.get(rse, 0) + 1
+            server.max_active[rse] = max(server.max_active.get(rse, 0), server._active[rse])
+        try:
+            self.send_response(206 if start else 200)
+            if start:
+                self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Accept-Ranges", "bytes")
+            self.end_headers()
+            if drop:
+                self.wfile.write(body[: server.drop_after])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            if server.delay:
+                threading.Event().wait(server.delay)
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with server._lock:
+                server._active[rse] -= 1
+
+    def _empty(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
@@ -0,0 +1,170 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from shopping_client.download import ProgressCallback, download_file
+from shopping_client.session import DEFAULT_TIMEOUT, default_session
+
+logger = logging.getLogger(__name__)
+
+
+class transfer_manager:
+    """Parallel download of Rucio file replicas.
+
+    Files are downloaded on a pool of worker threads, with at most
+    `per_rse_limit` concurrent transfers from any one RSE. Each transfer is
+    resumable and retried on connection errors (see
+    `shopping_client.download.download_file`), verified against the size and
+    checksum known to Rucio, and falls back to the next replica of the file
+    if a source keeps failing.
+    """
+
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        max_workers: int = 8,
+        per_rse_limit: int = 2,
+        max_attempts: int = 3,
+        chunk_size: int = 1 << 20,
+        timeout=DEFAULT_TIMEOUT,
+        headers: Optional[dict] = None,
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        session : requests.Session
+            Session used for the transfers; defaults to the shared session.
+            Its connection pool should be at least `max_workers` large.
+        max_workers : int
+            Maximum number of concurrent transfers.
+        per_rse_limit : int
+            Maximum number of concurrent transfers from a single RSE.
+        max_attempts : int
+            Connection attempts per source before moving on to the next
+            replica.
+        chunk_size : int
+            Number of bytes read and written at a time.
+        timeout : Union[float, tuple, None]
+            Timeout passed to every request.
+        headers : dict
+            Extra request headers sent to the storage endpoints, e.g. their
+            own authentication. Never pass the Rucio token here, as the
+            replicas are served by third-party storage.
+
+        """
+        self.session = session if session is not None else default_session()
+        self.max_workers = max_workers
+        self.per_rse_limit = per_rse_limit
+        self.max_attempts = max_attempts
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.headers = headers
+        self._rse_slots = {}
+        self._lock = threading.Lock()
+
+    def download(
+        self,
+        replicas: Dict[str, dict],
+        directory: str,
+        progress: Optional[ProgressCallback] = None,
+    ) -> Tuple[dict, dict]:
+        """Download files to `<directory>/<scope>/<name>`.
+
+        Parameters
+        ----------
+        replicas : Dict[str, dict]
+            Replica descriptions keyed by DID, as returned by
+            `rucio_connector.resolve_replicas`.
+        directory : str
+            Destination directory.
+        progress : Callable[[int, Optional[int]], None]
+            Called for every file after each chunk with the number of bytes
+            downloaded so far and the file size.
+
+        Returns
+        -------
+        Tuple[dict, dict]
+            `(paths, errors)`: the path of each downloaded file and the
+            exception of each failed one, keyed by DID.
+
+        """
+        paths, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                did: executor.submit(self._transfer, replica, directory, progress)
+                for did, replica in replicas.items()
+            }
+            for did, future in futures.items():
+                try:
+                    paths[did] = future.result()
+                except Exception as e:
+                    errors[did] = e
+        return paths, errors
+
+    def _transfer(self, replica, directory, progress):
+        path = _destination(directory, replica["scope"], replica["name"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if replica.get("adler32"):
+            checksum = f"adler32:{replica['adler32']}"
+        elif replica.get("md5"):
+            checksum = f"md5:{replica['md5']}"
+        else:
+            checksum = None
+
+        sources = list(replica["sources"])
+        if not sources:
+            raise RuntimeError(f"No replica available for {replica['scope']}:{replica['name']}")
+        error = None
+        while sources:
+            rse, pfn = self._acquire_source(sources)
+            try:
+                return download_file(
+                    pfn,
+                    path,
+                    session=self.session,
+                    chunk_size=self.chunk_size,
+                    progress=progress,
+                    checksum=checksum,
+                    size=replica.get("bytes"),
+                    max_attempts=self.max_attempts,
+                    timeout=self.timeout,
+                    headers=self.headers,
+                )
+            except (requests.RequestException, RuntimeError) as e:
+                logger.warning(f"Transfer of {pfn} from {rse} failed: {e}")
+                error = e
+            finally:
+                self._slots(rse).release()
+        raise error
+
+    def _acquire_source(self, sources):
+        # Takes the most preferred source whose RSE has a free slot, or waits
+        # for the most preferred one. The source is removed from `sources`.
+        for index, (rse, pfn) in enumerate(sources):
+            if self._slots(rse).acquire(blocking=False):
+                return sources.pop(index)
+        rse, pfn = sources.pop(0)
+        self._slots(rse).acquire()
+        return rse, pfn
+
+    def _slots(self, rse):
+        with self._lock:
+            if rse not in self._rse_slots:
+                self._rse_slots[rse] = threading.BoundedSemaphore(self.per_rse_limit)
+            return self._rse_slots[rse]
+
+
+def _destination(directory, scope, name):
+    # Path of a file below `directory`; scopes and names come from the
+    # server, so reject any that would escape it (absolute, `..`, symlinks)
+    path = os.path.join(directory, scope, name)
+    root = os.path.realpath(directory)
+    resolved = os.path.realpath(path)
+    if resolved == root or os.path.commonpath([root, resolved]) != root:
+        raise RuntimeError(f"Refusing to write {scope}:{name} outside {directory}")
+    return path
@@ -0,0 +1,219 @@
+import http.server
+import mimetypes
+import os
+import secrets
+import shutil
+import threading
+import urllib.parse
+import urllib.request
+import xmlrpc.client
+from typing import List, Optional
+
+DEFAULT_CLIENT_NAME = "esap-userprofile-client"
+
+
+def hub_lockfile() -> str:
+    """URL or path of the lockfile of the running SAMP hub: `$SAMP_HUB` if it
+    holds a `std-lockurl:`, otherwise `~/.samp`."""
+    hub = os.getenv("SAMP_HUB", "")
+    if hub.startswith("std-lockurl:"):
+        return hub[len("std-lockurl:"):]
+    return os.path.join(os.path.expanduser("~"), ".samp")
+
+
+def read_lockfile(lockfile: Optional[str] = None) -> dict:
+    """Read the `key=value` entries of a SAMP hub lockfile, e.g.
+    `samp.secret` and `samp.hub.xmlrpc.url`.
+
+    Raises
+    ------
+    RuntimeError
+        If there is no lockfile, i.e. no hub is running.
+
+    """
+    lockfile = lockfile or hub_lockfile()
+    try:
+        if urllib.parse.urlparse(lockfile).scheme in ("file", "http", "https"):
+            with urllib.request.urlopen(lockfile) as response:
+                text = response.read().decode()
+        else:
+            with open(lockfile) as f:
+                text = f.read()
+    except OSError as e:
+        raise RuntimeError(f"No SAMP hub found ({lockfile}): {e}") from e
+    entries = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#") and "=" in line:
+            key, _, value = line.partition("=")
+            entries[key.strip()] = value.strip()
+    return entries
+
+
+class hub_client:
+    """Send-only SAMP client, talking to the hub over the Standard Profile
+    (XML-RPC).
+
+    The client registers on `connect` and unregisters on `close`; use it as
+    a context manager to do both.
+    """
+
+    def __init__(self, lockfile: Optional[str] = None, name: str = DEFAULT_CLIENT_NAME):
+        """Constructor.
+
+        Parameters
+        ----------
+        lockfile : str
+            Path or URL of the hub lockfile; see `hub_lockfile`.
+        name : str
+            Name shown by the hub and the other clients.
+
+        """
+        self.lockfile = lockfile
+        self.name = name
+        self.private_key = None
+        self.client_id = None
+        self._hub = None
+
+    def connect(self):
+        if self.private_key is not None:
+            return self
+        entries = read_lockfile(self.lockfile)
+        url = entries.get("samp.hub.xmlrpc.url")
+        if url is None or "samp.secret" not in entries:
+            raise RuntimeError("Invalid SAMP hub lockfile")
+        self._hub = xmlrpc.client.ServerProxy(url, allow_none=False)
+        try:
+            registration = self._hub.samp.hub.register(entries["samp.secret"])
+            self.private_key = registration["samp.private-key"]
+            self.client_id = registration.get("samp.self-id")
+            self._hub.samp.hub.declareMetadata(self.private_key, {"samp.name": self.name})
+        except (OSError, xmlrpc.client.Error) as e:
+            # E.g. a stale lockfile left behind by a hub that has exited
+            raise RuntimeError(f"Cannot register with the SAMP hub at {url}: {e}") from e
+        return self
+
+    def close(self):
+        if self.private_key is None:
+            return
+        try:
+            self._hub.samp.hub.unregister(self.private_key)
+        except (OSError, xmlrpc.client.Error):
+            pass
+        self.private_key = None
+        self._hub = None
+
+    def subscribed_clients(self, mtype: str) -> List[str]:
+        """Ids of the clients subscribed to `mtype`."""
+        self.connect()
+        return list(self._hub.samp.hub.getSubscribedClients(self.private_key, mtype))
+
+    def notify(self, mtype: str, params: dict, recipient: Optional[str] = None) -> List[str]:
+        """Send a notification to `recipient`, or to all subscribed clients if
+        `recipient` is `None`; returns the ids of the recipients."""
+        self.connect()
+        message = {"samp.mtype": mtype, "samp.params": params}
+        try:
+            if recipient is None:
+                return list(self._hub.samp.hub.notifyAll(self.private_key, message))
+            self._hub.samp.hub.notify(self.private_key, recipient, message)
+        except xmlrpc.client.Fault as e:
+            raise RuntimeError(f"SAMP hub refused {mtype}: {e.faultString}") from e
+        except (OSError, xmlrpc.client.Error) as e:
+            # The hub has exited; register again with the next hub
+            self.private_key = None
+            self._hub = None
+            raise RuntimeError(f"Lost the connection to the SAMP hub: {e}") from e
+        return [recipient]
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class file_server:
+    """Serve files over HTTP on `127.0.0.1`, in a background thread, so that
+    SAMP clients can load them by URL.
+
+    Only files registered with `file_url` are served, under a random path
+    prefix, so that other users of the host can neither list nor guess
+    them.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.url = None
+        self.prefix = secrets.token_urlsafe(24)
+        self._files = {}
+        self._server = None
+
+    def start(self):
+        if self._server is not None:
+            return self
+        handler = type("handler", (_handler,), {"file_server": self})
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/{self.prefix}/"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def file_url(self, path: str) -> str:
+        """Serve the file at `path` and return its URL."""
+        self.start()
+        name = os.path.relpath(path, self.directory)
+        self._files[name] = path
+        return self.url + urllib.parse.quote(name)
+
+    def path(self, url_path: str) -> Optional[str]:
+        """Local path of the file served at `url_path`, or `None`."""
+        prefix, _, name = url_path.lstrip("/").partition("/")
+        if not secrets.compare_digest(prefix, self.prefix):
+            return None
+        return self._files.get(urllib.parse.unquote(name.split("?", 1)[0]))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _handler(http.server.BaseHTTPRequestHandler):
+    file_server = None
+
+    def do_GET(self):
+        self._send_file(body=True)
+
+    def do_HEAD(self):
+        self._send_file(body=False)
+
+    def _send_file(self, body):
+        path = self.file_server.path(self.path)
+        try:
+            data_file = open(path, "rb") if path is not None else None
+        except OSError:
+            # e.g. evicted from the cache
+            data_file = None
+        if data_file is None:
+            self.send_error(404)
+            return
+        with data_file:
+            self.send_response(200)
+            self.send_header(
+                "Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream"
+            )
+            self.send_header("Content-Length", str(os.fstat(data_file.fileno()).st_size))
+            self.end_headers()
+            if body:
+                shutil.copyfileobj(data_file, self.wfile)
+
+    def log_message(self, *args):
+        pass
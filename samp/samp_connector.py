@@ -1,16 +1,143 @@
-import requests
-import json
-import io
-import getpass
+import hashlib
+import os
+
 import pandas as pd
 
-from typing import Union, Optional
+from typing import List, Optional, Union
+from warnings import warn
+
+from samp.hub_client import DEFAULT_CLIENT_NAME, file_server, hub_client
+from shopping_client.basket_item import load_item_data
+from shopping_client.cache import default_cache_dir, evict_lru
+from shopping_client.votable import write_votable
 
 class samp_connector:
 
     name = "samp"
     archive = "samp"
 
+    # `validate_basket_item(item, return_loaded=True)` returns the decoded
+    # item data, see `shopping_client.frames.basket_record`
+    loads_basket_items = True
+
+    # Typed columns of Arrow exports, see `shopping_client.arrow`
+    arrow_fields = (
+        ("name", "string"),
+        ("url", "string"),
+        ("table_id", "string"),
+    )
+
+    mtype = "table.load.votable"
+    suffix = ".vot"
+
+    def __init__(
+        self,
+        lockfile: Optional[str] = None,
+        directory: Optional[str] = None,
+        client_name: str = DEFAULT_CLIENT_NAME,
+        max_cache_size: Optional[int] = 1 << 30,
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        lockfile : str
+            Path or URL of the SAMP hub lockfile; defaults to `$SAMP_HUB` or
+            `~/.samp`.
+        directory : str
+            Directory of the exported tables. Defaults to
+            `$XDG_CACHE_HOME/esap-userprofile-client/samp`.
+        client_name : str
+            Name under which the connector registers with the hub.
+        max_cache_size : int
+            Largest total size in bytes of the exported tables; the least
+            recently sent ones are removed first, but never the table being
+            sent. `None` for no limit.
+
+        """
+        self.lockfile = lockfile
+        self.directory = directory or default_cache_dir("samp")
+        self.client_name = client_name
+        self.max_cache_size = max_cache_size
+        self._client = None
+        self._server = None
+
+    def export_table(self, table: pd.DataFrame) -> str:
+        """Write `table` as a `BINARY2` VOTable named after a hash of its
+        content and return the path. A table that was exported before is not
+        written again."""
+        digest = _table_digest(table)
+        path = os.path.join(self.directory, digest + self.suffix)
+        if os.path.exists(path):
+            os.utime(path)
+            return path
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        write_votable(table, tmp_path, table_name=digest, serialization="binary2")
+        os.replace(tmp_path, path)
+        # Older tables make room for this one, which clients are about to load
+        evict_lru(self.directory, self.suffix, self.max_cache_size, keep=[path])
+        size = os.path.getsize(path)
+        if self.max_cache_size is not None and size > self.max_cache_size:
+            warn(
+                f"Exported table of {size} bytes exceeds max_cache_size "
+                f"({self.max_cache_size} bytes); it is kept until the next export"
+            )
+        return path
+
+    def table_url(self, table: pd.DataFrame) -> str:
+        """Export `table` and return the URL under which it is served to
+        local SAMP clients."""
+        if self._server is None:
+            self._server = file_server(self.directory)
+        return self._server.file_url(self.export_table(table))
+
+    def send_table(
+        self,
+        table: pd.DataFrame,
+        name: Optional[str] = None,
+        recipient: Optional[str] = None,
+    ) -> List[str]:
+        """Send a table to SAMP clients such as TOPCAT or Aladin with a
+        single `table.load.votable` message that refers to the table by URL.
+
+        Parameters
+        ----------
+        table : pd.DataFrame
+            Table to send, e.g. a DataFrame of `get_basket(convert_to_pandas=True)`.
+        name : str
+            Name of the table shown by the receiving clients.
+        recipient : str
+            SAMP client id of the receiver; by default the table is broadcast
+            to all subscribed clients.
+
+        Returns
+        -------
+        List[str]
+            Ids of the clients the message was sent to.
+
+        Raises
+        ------
+        RuntimeError
+            If no SAMP hub is running or the hub refuses the message.
+
+        """
+        url = self.table_url(table)
+        table_id = os.path.basename(url)[: -len(self.suffix)]
+        params = {"url": url, "table-id": table_id, "name": name or table_id}
+        if self._client is None:
+            self._client = hub_client(self.lockfile, self.client_name)
+        return self._client.notify(self.mtype, params, recipient)
+
+    def close(self):
+        """Unregister from the hub and stop serving the exported tables."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+
     def basket_item_to_pandas(
             self, basket_item: Union[dict, pd.Series], validate: bool = True
     ) -> Optional[pd.Series]:
@@ -36,7 +163,7 @@ class samp_connector:
         if validate:
             item_data = self.validate_basket_item(basket_item, return_loaded=True)
         else:
-            item_data = json.loads(basket_item["item_data"])
+            item_data = load_item_data(basket_item)
         if item_data:
             return pd.Series(item_data)
         return None
@@ -67,10 +194,21 @@ class samp_connector:
             If validation fails return `None`.
 
         """
-        item_data = json.loads(basket_item["item_data"])
+        item_data = load_item_data(basket_item)
         if "archive" in item_data and item_data["archive"] == self.archive:
             if return_loaded:
                 return item_data
             else:
                 return True
-        return None
\ No newline at end of file
+        return None
+
+
+def _table_digest(table):
+    digest = hashlib.sha256()
+    digest.update(repr([(str(c), str(t)) for c, t in table.dtypes.items()]).encode())
+    try:
+        digest.update(pd.util.hash_pandas_object(table, index=False).to_numpy().tobytes())
+    except TypeError:
+        # Unhashable values such as lists: hash the serialised table
+        digest.update(write_votable(table))
+    return digest.hexdigest()[:32]
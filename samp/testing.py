@@ -0,0 +1,183 @@
+"""In-process SAMP hub for tests.
+
+`samp_hub` implements the hub side of the SAMP Standard Profile over
+XML-RPC and writes a lockfile, so that `samp_connector.send_table` can be
+tested without TOPCAT or Aladin running, e.g.
+
+    with samp_hub(lockfile) as hub:
+        topcat = hub.add_receiver("topcat", ["table.load.votable"])
+        samp_connector(lockfile=lockfile).send_table(frame)
+        message = hub.received[topcat][0]
+
+Receivers are simulated inside the hub: messages for them are stored in
+`received` instead of being forwarded to a callable client.
+"""
+import fnmatch
+import itertools
+import os
+import secrets
+import threading
+import xmlrpc.server
+from typing import Iterable
+
+from shopping_client.stand_in import stand_in_server
+
+
+class samp_hub(stand_in_server):
+    """SAMP hub on `127.0.0.1`.
+
+    Attributes
+    ----------
+    lockfile : str
+        Path of the lockfile, to be passed as `lockfile`.
+    received : dict
+        Messages received by each simulated receiver, by client id.
+    messages : list
+        `(sender id, recipient id, message)` of every message delivered.
+    """
+
+    hub_id = "hub"
+
+    def __init__(self, lockfile: str):
+        self.lockfile = lockfile
+        self.secret = secrets.token_hex(16)
+        self.clients = {}
+        self.received = {}
+        self.messages = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        super().__init__()
+
+    def make_server(self, address):
+        server = xmlrpc.server.SimpleXMLRPCServer(
+            address, logRequests=False, allow_none=False
+        )
+        server.register_instance(_hub_api(self), allow_dotted_names=True)
+        return server
+
+    def started(self):
+        with open(self.lockfile, "w") as f:
+            f.write(
+                "# SAMP Standard Profile lockfile\n"
+                f"samp.secret={self.secret}\n"
+                f"samp.hub.xmlrpc.url={self.url}\n"
+                "samp.profile.version=1.3\n"
+            )
+
+    def stopped(self):
+        try:
+            os.remove(self.lockfile)
+        except FileNotFoundError:
+            pass
+
+    def add_receiver(self, name: str, mtypes: Iterable[str]) -> str:
+        """Register a simulated client subscribed to `mtypes`, which may use
+        wildcards such as `table.load.*`; returns its client id."""
+        with self._lock:
+            client_id = f"c{next(self._ids)}"
+            self.clients[client_id] = dict(
+                key=None, metadata={"samp.name": name}, mtypes=list(mtypes)
+            )
+            self.received[client_id] = []
+        return client_id
+
+    def register(self) -> dict:
+        with self._lock:
+            client_id = f"c{next(self._ids)}"
+            key = secrets.token_hex(16)
+            self.clients[client_id] = dict(key=key, metadata={}, mtypes=[])
+        return {
+            "samp.private-key": key,
+            "samp.hub-id": self.hub_id,
+            "samp.self-id": client_id,
+        }
+
+    def client_id(self, key: str) -> str:
+        for client_id, client in self.clients.items():
+            if client["key"] is not None and client["key"] == key:
+                return client_id
+        raise ValueError("Unknown private key")
+
+    def subscribed(self, mtype: str) -> list:
+        return [
+            client_id
+            for client_id, client in self.clients.items()
+            if any(fnmatch.fnmatchcase(mtype, pattern) for pattern in client["mtypes"])
+        ]
+
+    def deliver(self, sender: str, recipient: str, message: dict):
+        mtype = message.get("samp.mtype")
+        if recipient not in self.subscribed(mtype):
+            raise ValueError(f"Client {recipient} is not subscribed to {mtype}")
+        with self._lock:
+            self.messages.append((sender, recipient, message))
+            if recipient in self.received:
+                self.received[recipient].append(message)
+
+
+class _hub_api:
+    # Methods exposed as `samp.hub.*`
+    def __init__(self, hub):
+        self.samp = _namespace(hub=_hub_methods(hub))
+
+
+class _namespace:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class _hub_methods:
+    def __init__(self, hub):
+        self._hub = hub
+
+    def register(self, secret):
+        if secret != self._hub.secret:
+            raise ValueError("Wrong hub secret")
+        return self._hub.register()
+
+    def unregister(self, key):
+        with self._hub._lock:
+            self._hub.clients.pop(self._hub.client_id(key))
+        return ""
+
+    def declareMetadata(self, key, metadata):
+        self._hub.clients[self._hub.client_id(key)]["metadata"] = metadata
+        return ""
+
+    def declareSubscriptions(self, key, subscriptions):
+        self._hub.clients[self._hub.client_id(key)]["mtypes"] = list(subscriptions)
+        return ""
+
+    def getRegisteredClients(self, key):
+        sender = self._hub.client_id(key)
+        return [client_id for client_id in self._hub.clients if client_id != sender]
+
+    def getSubscribedClients(self, key, mtype):
+        sender = self._hub.client_id(key)
+        return {
+            client_id: {}
+            for client_id in self._hub.subscribed(mtype)
+            if client_id != sender
+        }
+
+    def getMetadata(self, key, client_id):
+        self._hub.client_id(key)
+        return self._hub.clients[client_id]["metadata"]
+
+    def ping(self, *args):
+        return ""
+
+    def notify(self, key, recipient, message):
+        self._hub.deliver(self._hub.client_id(key), recipient, message)
+        return ""
+
+    def notifyAll(self, key, message):
+        sender = self._hub.client_id(key)
+        recipients = [
+            client_id
+            for client_id in self._hub.subscribed(message.get("samp.mtype"))
+            if client_id != sender
+        ]
+        for recipient in recipients:
+            self._hub.deliver(sender, recipient, message)
+        return recipients
@@ -14,10 +14,24 @@ setuptools.setup(
     url="https://git.astron.nl/astron-sdc/esap-userprofile-python-client",
     packages=setuptools.find_packages(),
     install_requires=["pandas", "requests", "panoptes-client"],
+    extras_require={
+        "streaming": ["ijson>=3.1"],
+        "async": ["aiohttp"],
+        "arrow": ["pyarrow"],
+    },
+    entry_points={
+        "esap_userprofile.connectors": [
+            "zooniverse = zooniverse.zooniverse:zooniverse",
+            "apertif = alta.alta_connector:alta_connector",
+            "astron_vo = astron_vo.astron_vo_connector:astron_vo_connector",
+            "rucio = rucio_cli.rucio_connector:rucio_connector",
+            "samp = samp.samp_connector:samp_connector",
+        ]
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: Apache Software License",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.6",
+    python_requires=">=3.8",
 )
@@ -1 +1,15 @@
 from .shopping_client import shopping_client
+from .cache import basket_cache
+from .instrumentation import get_instrumentation, metrics_collector, set_instrumentation
+from .registry import connector_registry, get_connector, register_connector
+from .sync import basket_delta, basket_sync, basket_watcher
+
+
+def __getattr__(name):
+    # The async client is imported on first use, so that aiohttp is only
+    # loaded by those who need it.
+    if name == "async_shopping_client":
+        from .async_client import async_shopping_client
+
+        return async_shopping_client
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
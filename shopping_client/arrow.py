@@ -0,0 +1,268 @@
+import json
+import os
+from typing import Dict, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+SCHEMA_VERSION = "1"
+EXTRA_COLUMN = "extra"
+
+# Fields common to every basket item; connectors extend these through their
+# `arrow_fields` attribute.
+BASE_FIELDS = (("archive", "category"), ("catalog", "category"))
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError(
+            "Arrow output requires pyarrow; install it with `pip install pyarrow`"
+        )
+
+
+def _arrow_type(kind):
+    return {
+        "string": pa.string(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "bool": pa.bool_(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+    }[kind]
+
+
+def connector_schema(connector) -> "pa.Schema":
+    """The stable Arrow schema of the basket items handled by `connector`.
+
+    The schema has a nullable column for each of the common fields
+    (`archive`, `catalog`) and the fields listed in the connector's
+    `arrow_fields` attribute, as `(name, kind)` pairs with `kind` one of
+    `"string"`, `"int64"`, `"float64"`, `"bool"` or `"category"`. Any other
+    item fields, and values that do not fit the type of their column, are
+    kept in a final `extra` column holding a JSON object, so the schema does
+    not depend on the contents of the basket.
+    """
+    _require_pyarrow()
+    fields = dict(BASE_FIELDS)
+    fields.update(getattr(connector, "arrow_fields", ()))
+    name = getattr(connector, "name", type(connector).__name__)
+    return pa.schema(
+        [pa.field(field, _arrow_type(kind)) for field, kind in fields.items()]
+        + [pa.field(EXTRA_COLUMN, pa.string())],
+        metadata={"esap.connector": name, "esap.schema_version": SCHEMA_VERSION},
+    )
+
+
+_MISSING = object()
+
+
+def _coerce(value, kind):
+    # Returns `value` converted losslessly to `kind`, or _MISSING
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return value if kind == "bool" else _MISSING
+    if kind in ("string", "category"):
+        if isinstance(value, str):
+            return value
+        return str(value) if isinstance(value, (int, float)) else _MISSING
+    try:
+        if kind == "int64" and isinstance(value, (int, str)):
+            return int(value)
+        if kind == "int64" and isinstance(value, float) and value.is_integer():
+            return int(value)
+        if kind == "float64" and isinstance(value, (int, float, str)):
+            return float(value)
+    except ValueError:
+        pass
+    return _MISSING
+
+
+def _lossy(values, kind):
+    # Whether pyarrow would silently convert some of `values` to `kind` with
+    # a loss, e.g. 2.5 or True to int64, or True to float64
+    if kind == "int64":
+        return any(
+            isinstance(value, bool) or (isinstance(value, float) and not value.is_integer())
+            for value in values
+        )
+    if kind == "float64":
+        return any(isinstance(value, bool) for value in values)
+    return False
+
+
+def records_to_table(records: Sequence[dict], schema: "pa.Schema") -> "pa.Table":
+    """Build an Arrow table with the given `schema` from decoded basket item
+    payloads.
+
+    Parameters
+    ----------
+    records : Sequence[dict]
+        Decoded `item_data` payloads, one per row.
+    schema : pa.Schema
+        Schema from `connector_schema`.
+
+    Returns
+    -------
+    pa.Table
+
+    """
+    _require_pyarrow()
+    records = list(records)
+    fields = [field for field in schema if field.name != EXTRA_COLUMN]
+    extras = [None] * len(records)
+    try:
+        if any(
+            _lossy([record.get(field.name) for record in records], _kind(field.type))
+            for field in fields
+        ):
+            raise pa.ArrowInvalid("values that do not fit their column")
+        # Converts all known fields in one pass in C++, ignoring other keys
+        struct_type = pa.struct(
+            [pa.field(field.name, _value_type(field.type)) for field in fields]
+        )
+        columns = pa.array(records, type=struct_type).flatten()
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        columns = [_convert_field(records, field, extras) for field in fields]
+    columns = [
+        column.dictionary_encode().cast(field.type)
+        if pa.types.is_dictionary(field.type)
+        else column
+        for column, field in zip(columns, fields)
+    ]
+
+    known = frozenset(schema.names)
+    extra_column = []
+    for record, extra in zip(records, extras):
+        if not record.keys() - known:
+            extra_column.append(_encode(extra) if extra else None)
+            continue
+        unknown = {key: value for key, value in record.items() if key not in known}
+        extra_column.append(_encode({**extra, **unknown} if extra else unknown))
+    columns.append(pa.array(extra_column, type=pa.string()))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _encode(extra):
+    # JSON with sorted keys, so equal items give equal strings
+    if orjson is not None:
+        try:
+            return orjson.dumps(extra, option=orjson.OPT_SORT_KEYS).decode()
+        except TypeError:  # e.g. integers beyond 64 bit
+            pass
+    return _json_encode(extra)
+
+
+_json_encode = json.JSONEncoder(sort_keys=True, separators=(",", ":")).encode
+
+
+def _convert_field(records, field, extras):
+    # Converts one field value by value; values that do not fit go to the
+    # `extra` column
+    value_type = _value_type(field.type)
+    values = [record.get(field.name) for record in records]
+    kind = _kind(field.type)
+    if not _lossy(values, kind):
+        try:
+            return pa.array(values, type=value_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            pass
+    converted = []
+    for row, value in enumerate(values):
+        coerced = _coerce(value, kind)
+        if coerced is not _MISSING and coerced is not None:
+            try:
+                # e.g. integers beyond 64 bit
+                pa.scalar(coerced, type=value_type)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+                coerced = _MISSING
+        if coerced is _MISSING:
+            if extras[row] is None:
+                extras[row] = {}
+            extras[row][field.name] = value
+            coerced = None
+        converted.append(coerced)
+    return pa.array(converted, type=value_type)
+
+
+def _value_type(arrow_type):
+    return arrow_type.value_type if pa.types.is_dictionary(arrow_type) else arrow_type
+
+
+def _kind(arrow_type):
+    if pa.types.is_dictionary(arrow_type) or pa.types.is_string(arrow_type):
+        return "string"
+    if pa.types.is_integer(arrow_type):
+        return "int64"
+    if pa.types.is_floating(arrow_type):
+        return "float64"
+    return "bool"
+
+
+def to_parquet(
+    tables: Dict[str, "pa.Table"], directory: str, compression: Optional[str] = "zstd"
+) -> Dict[str, str]:
+    """Write per-connector tables to `<directory>/<name>.parquet`.
+
+    Returns
+    -------
+    Dict[str, str]
+        Mapping of connector name to the path written.
+
+    """
+    _require_pyarrow()
+    return _write_tables(
+        tables,
+        directory,
+        ".parquet",
+        lambda table, path: pq.write_table(table, path, compression=compression),
+    )
+
+
+def to_ipc(tables: Dict[str, "pa.Table"], directory: str) -> Dict[str, str]:
+    """Write per-connector tables to uncompressed Arrow IPC files
+    `<directory>/<name>.arrow`, which other processes can open without
+    deserialisation using `read_ipc`.
+
+    Returns
+    -------
+    Dict[str, str]
+        Mapping of connector name to the path written.
+
+    """
+    _require_pyarrow()
+
+    def write(table, path):
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    return _write_tables(tables, directory, ".arrow", write)
+
+
+def read_ipc(path: str) -> "pa.Table":
+    """Open an Arrow IPC file written by `to_ipc` through a memory map; the
+    table's buffers reference the mapped file instead of copies."""
+    _require_pyarrow()
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _write_tables(tables, directory, suffix, write):
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name, table in tables.items():
+        path = os.path.join(directory, name + suffix)
+        tmp_path = path + ".tmp"
+        write(table, tmp_path)
+        os.replace(tmp_path, path)
+        paths[name] = path
+    return paths
+
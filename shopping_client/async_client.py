@@ -0,0 +1,241 @@
+import asyncio
+import urllib.parse
+from typing import AsyncIterator, Awaitable, Callable, Optional, Union
+from warnings import warn
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+from .basket_item import basket_item
+from .cache import basket_cache
+from .instrumentation import count, count_cache, span
+from .shopping_client import _import_ijson, _page_parser, shopping_client
+
+TokenProvider = Callable[[], Awaitable[str]]
+
+
+class async_shopping_client(shopping_client):
+    """Non-blocking counterpart of `shopping_client` built on `aiohttp`.
+
+    `get_basket` and `iter_basket` are coroutines with the same filtering
+    and pandas conversion semantics as the synchronous client. Many clients
+    (e.g. one per user) can share one `aiohttp.ClientSession` and one
+    semaphore, so a single event loop can serve hundreds of concurrent basket
+    fetches over a bounded connection pool.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        host: str = "http://localhost:5555/",
+        connectors: list = [],
+        client_validate_token: bool = True,
+        session: Optional["aiohttp.ClientSession"] = None,
+        timeout: Optional[float] = 60.0,
+        cache: Optional[basket_cache] = None,
+        token_cache: Union[bool, str] = False,
+        token_provider: Optional[TokenProvider] = None,
+        max_concurrency: int = 64,
+        semaphore: Optional[asyncio.Semaphore] = None,
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        token : str
+            OAuth access token as a string.
+        host : str
+            Hostname of the EASP Gateway backend.
+        connectors : list
+            List of connector classes that can handle specific types of shopping
+            item.
+        client_validate_token : bool
+            If `True`, check the expiry of the token before each request and
+            acquire a new one when needed.
+        session : aiohttp.ClientSession
+            Session used for all requests. If `None`, one is created on first
+            use with a connection pool of `max_concurrency` connections and
+            closed by `close()`.
+        timeout : float
+            Total timeout in seconds for each request.
+        cache : basket_cache
+            Optional persistent basket cache, as for `shopping_client`.
+        token_cache : Union[bool, str]
+            Share tokens between processes, as for `shopping_client`.
+        token_provider : Callable[[], Awaitable[str]]
+            Coroutine function returning a valid access token. Overrides the
+            built-in token sources, which otherwise run in the default
+            executor so that they never block the event loop.
+        max_concurrency : int
+            Maximum number of requests in flight for this client.
+        semaphore : asyncio.Semaphore
+            Semaphore bounding concurrent requests; pass the same one to
+            several clients to bound them together. Overrides
+            `max_concurrency`.
+
+        """
+        if aiohttp is None:
+            raise ImportError(
+                "async_shopping_client requires aiohttp; "
+                "install it with `pip install aiohttp`"
+            )
+        super().__init__(
+            token=token,
+            host=host,
+            connectors=connectors,
+            client_validate_token=client_validate_token,
+            cache=cache,
+            token_cache=token_cache,
+        )
+        self.async_session = session
+        self._owns_session = session is None
+        self.async_timeout = aiohttp.ClientTimeout(total=timeout)
+        self.token_provider = token_provider
+        self.max_concurrency = max_concurrency
+        self._semaphore = semaphore
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Close the `aiohttp` session if it was created by this client, and
+        stop the background token refresh, if any."""
+        self.tokens.close()
+        if self._owns_session and self.async_session is not None:
+            await self.async_session.close()
+            self.async_session = None
+
+    async def get_basket(
+        self,
+        convert_to_pandas: bool = False,
+        reload: bool = False,
+        filter_archives: bool = False,
+        flatten: bool = False,
+        format: Optional[str] = None,
+    ) -> Union[list, dict, None]:
+        """Retrieve the shopping basket for a user.
+
+        See `shopping_client.get_basket` for the meaning of the parameters
+        and the returned object.
+        """
+        if self.basket is None or reload:
+            try:
+                with span("basket_fetch"):
+                    self.basket = [item async for item in self.iter_basket()]
+            except aiohttp.ClientResponseError:
+                warn(f"Unable to load data from {self.host}; is your key valid?")
+
+        if filter_archives:
+            self.basket = self._filter_on_archive()
+
+        return self._convert_to(format, convert_to_pandas, flatten)
+
+    async def iter_basket(self, chunk_size: int = 64 * 1024) -> AsyncIterator[dict]:
+        """Asynchronously iterate over the items in the shopping basket,
+        following every page of the ESAP API response.
+
+        See `shopping_client.iter_basket`.
+
+        Raises
+        ------
+        aiohttp.ClientResponseError
+            If any page could not be retrieved.
+
+        """
+        url = urllib.parse.urljoin(self.host, shopping_client.endpoint)
+        cached_pages, fetched_pages = {}, []
+        loop = asyncio.get_running_loop()
+        if self.cache is not None:
+            await self._async_request_header()
+            user = self._cache_user()
+            cached_pages = (
+                await loop.run_in_executor(None, self.cache.load, self.host, user)
+                or {}
+            )
+
+        session = self._aiohttp_session()
+        while url:
+            cached = cached_pages.get(url)
+            headers = self._conditional_headers(
+                await self._async_request_header(), cached
+            )
+            # Each page is read completely before its items are yielded, so
+            # that a slow consumer does not hold up other fetches sharing
+            # the semaphore.
+            async with self._get_semaphore():
+                async with session.get(
+                    url, headers=headers, timeout=self.async_timeout
+                ) as response:
+                    if cached is not None:
+                        count_cache("basket", response.status == 304)
+                    if cached is not None and response.status == 304:
+                        page = cached
+                        items = [basket_item(item) for item in page["items"]]
+                    else:
+                        response.raise_for_status()
+                        page = self._new_page(url, response.headers)
+                        items = [
+                            basket_item(item)
+                            async for item in self._aiter_page_items(
+                                response, page, chunk_size
+                            )
+                        ]
+                        if self.cache is not None:
+                            page["items"] = items
+                    count(
+                        "bytes_received_total",
+                        getattr(response.content, "total_bytes", 0),
+                        stage="basket",
+                    )
+            for item in items:
+                yield item
+            fetched_pages.append(page)
+            url = page.get("next")
+
+        if self.cache is not None:
+            await loop.run_in_executor(None, self._store_pages, user, fetched_pages)
+
+    async def _aiter_page_items(self, response, page, chunk_size):
+        ijson = _import_ijson()
+        if ijson is None:
+            payload = await response.json(content_type=None)
+            page["next"] = payload.get("next")
+            for result in payload["results"]:
+                for item in result["shopping_cart"]:
+                    yield item
+            return
+
+        parser = _page_parser(page, self.basket_item_prefix)
+        async for event in ijson.parse_async(
+            response.content, buf_size=chunk_size, use_float=True
+        ):
+            item = parser.feed(*event)
+            if item is not None:
+                yield item
+
+    async def _async_request_header(self):
+        if self.token_provider is not None:
+            self.token = await self.token_provider()
+        elif self.client_validate_token and not self._is_valid_token(self.token):
+            loop = asyncio.get_running_loop()
+            self.token = await loop.run_in_executor(None, self.tokens.get, self.token)
+
+        return self._headers()
+
+    def _aiohttp_session(self):
+        if self.async_session is None:
+            self.async_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency)
+            )
+        return self.async_session
+
+    def _get_semaphore(self):
+        # Created lazily so that it binds to the running event loop.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
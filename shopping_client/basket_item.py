@@ -0,0 +1,80 @@
+import ast
+import json
+from typing import TYPE_CHECKING, Iterable, Union
+
+if TYPE_CHECKING:  # only used in annotations; importing pandas is slow
+    import pandas as pd
+
+
+class basket_item(dict):
+    """A shopping basket item as returned by the ESAP API, whose `item_data`
+    JSON string is decoded at most once.
+
+    Behaves exactly like the raw `dict`; the decoded payload is available as
+    `data` and is shared by the shopping client and all connectors.
+    """
+
+    __slots__ = ("_data",)
+
+    @classmethod
+    def with_data(cls, item: dict, data: dict) -> "basket_item":
+        """Wrap a raw item whose `item_data` has already been decoded."""
+        wrapped = cls(item)
+        wrapped._data = data
+        return wrapped
+
+    @property
+    def data(self) -> dict:
+        """The decoded `item_data` payload."""
+        try:
+            return self._data
+        except AttributeError:
+            self._data = decode_item_data(self["item_data"])
+            return self._data
+
+    @property
+    def archive(self):
+        """The `archive` the item belongs to, or `None`."""
+        data = self.data
+        return data.get("archive") if isinstance(data, dict) else None
+
+
+def as_basket_item(item: dict) -> basket_item:
+    """Wrap a raw basket item `dict` unless it already is a `basket_item`."""
+    return item if isinstance(item, basket_item) else basket_item(item)
+
+
+def decode_item_data(item_data: str) -> dict:
+    """Decode an `item_data` string, which is JSON or, for items stored by
+    older clients, the Python-style repr of a `dict` with single quotes."""
+    try:
+        return json.loads(item_data)
+    except ValueError as error:
+        try:
+            return ast.literal_eval(item_data)
+        except (SyntaxError, ValueError):
+            raise error from None
+
+
+def load_item_data(item: Union[dict, "pd.Series"]) -> dict:
+    """Return the decoded `item_data` of a basket item, reusing the cached
+    payload of a `basket_item`."""
+    if isinstance(item, basket_item):
+        return item.data
+    return decode_item_data(item["item_data"])
+
+
+def index_by_archive(items: Iterable[dict]) -> dict:
+    """Group basket items by their `archive`, preserving basket order.
+
+    Returns
+    -------
+    dict
+        Mapping of archive name to a `list` of `basket_item`s. Items without
+        an archive are grouped under `None`.
+    """
+    index = {}
+    for item in items:
+        item = as_basket_item(item)
+        index.setdefault(item.archive, []).append(item)
+    return index
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def default_cache_dir(*parts: str) -> str:
+    """Return the directory used for on-disk caches, honouring
+    `$XDG_CACHE_HOME`."""
+    root = os.getenv("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(root, "esap-userprofile-client", *parts)
+
+
+def cache_entries(directory: str, suffix: str) -> list:
+    """List `(path, mtime, size)` of the cache files in `directory` whose name
+    ends with `suffix`."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    entries = []
+    for name in names:
+        if not name.endswith(suffix):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((path, stat.st_mtime, stat.st_size))
+    return entries
+
+
+def evict_lru(
+    directory: str, suffix: str, max_size: Optional[int], keep: Iterable[str] = ()
+):
+    """Remove the least recently used cache files in `directory` until their
+    total size is at most `max_size` bytes. Reading a cache file is expected
+    to refresh its modification time. Files in `keep`, e.g. one that was
+    just written, are never removed."""
+    if max_size is None:
+        return
+    keep = {os.path.abspath(path) for path in keep}
+    entries = sorted(cache_entries(directory, suffix), key=lambda entry: entry[1])
+    total = sum(size for _, _, size in entries)
+    for path, _, size in entries:
+        if total <= max_size:
+            break
+        if os.path.abspath(path) in keep:
+            continue
+        remove_file(path)
+        total -= size
+
+
+def remove_file(path: str):
+    """Remove `path`, ignoring files that are already gone."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class basket_cache:
+    """Persistent cache of shopping baskets, keyed by ESAP host and user.
+
+    Every page of the user-profile response is stored together with its
+    `ETag` and `Last-Modified` validators, so that a reload can be issued as
+    a set of conditional requests and pages answered with
+    `304 Not Modified` are served from disk.
+    """
+
+    suffix = ".json"
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        ttl: Optional[float] = 7 * 24 * 3600,
+        max_size: Optional[int] = 256 * 1024 ** 2,
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        directory : str
+            Directory holding the cache files. Defaults to
+            `$XDG_CACHE_HOME/esap-userprofile-client/baskets`.
+        ttl : float
+            Age in seconds after which a cached basket is discarded instead of
+            revalidated. `None` keeps entries until they are evicted.
+        max_size : int
+            Upper bound in bytes for the total size of the cache directory.
+            When exceeded, the least recently used baskets are evicted.
+            `None` disables size-based eviction.
+
+        """
+        self.directory = directory or default_cache_dir("baskets")
+        self.ttl = ttl
+        self.max_size = max_size
+
+    def load(self, host: str, user: str) -> Optional[dict]:
+        """Return the cached pages for `user` on `host` as a `dict` mapping
+        page URL to page entry, or `None` if there is no usable entry."""
+        path = self._path(host, user)
+        try:
+            with open(path) as cache_file:
+                entry = json.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning(f"Discarding unreadable basket cache file {path}")
+            remove_file(path)
+            return None
+
+        if self._expired(entry.get("stored_at", 0)):
+            remove_file(path)
+            return None
+
+        # Refresh the access time used for LRU eviction.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return {page["url"]: page for page in entry["pages"]}
+
+    def store(self, host: str, user: str, pages: list):
+        """Store the pages of a freshly retrieved basket.
+
+        Parameters
+        ----------
+        host : str
+            Hostname of the ESAP Gateway backend.
+        user : str
+            Identity of the basket owner.
+        pages : list
+            List of page entries, each a `dict` with keys `url`, `etag`,
+            `last_modified`, `next` and `items`.
+
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        entry = dict(host=host, user=user, stored_at=time.time(), pages=pages)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as cache_file:
+                json.dump(entry, cache_file)
+            os.replace(tmp_path, self._path(host, user))
+        except BaseException:
+            remove_file(tmp_path)
+            raise
+        self._evict()
+
+    def invalidate(self, host: str, user: str):
+        """Remove the cached basket of `user` on `host`, if any."""
+        remove_file(self._path(host, user))
+
+    def clear(self):
+        """Remove all cached baskets."""
+        for path, _, _ in self._entries():
+            remove_file(path)
+
+    def _path(self, host, user):
+        key = hashlib.sha256(f"{host}\0{user}".encode()).hexdigest()
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _expired(self, stored_at):
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def _entries(self):
+        return cache_entries(self.directory, self.suffix)
+
+    def _evict(self):
+        evict_lru(self.directory, self.suffix, self.max_size)
@@ -0,0 +1,67 @@
+import bz2
+import gzip
+import io
+from typing import IO, Optional
+
+from urllib3.util.request import ACCEPT_ENCODING as _URLLIB3_ACCEPT_ENCODING
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Content codings that urllib3 can decode with the installed modules:
+# always gzip and deflate, plus br and zstd if brotli and zstandard are
+# available.
+ACCEPT_ENCODING = _URLLIB3_ACCEPT_ENCODING.replace(",", ", ")
+
+_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+    (b"BZh", "bz2"),
+)
+
+
+def sniff_compression(head: bytes) -> Optional[str]:
+    """Return the compression (`"gzip"`, `"zstd"` or `"bz2"`) of a payload
+    starting with the bytes `head`, or `None` if it is not compressed."""
+    for magic, compression in _MAGIC:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def file_compression(path: str) -> Optional[str]:
+    """Compression of the file at `path`, detected from its magic bytes."""
+    with open(path, "rb") as data_file:
+        return sniff_compression(data_file.read(4))
+
+
+def decompressing_stream(stream: io.BufferedReader) -> IO[bytes]:
+    """Wrap `stream` in an incremental decompressor if its payload is
+    compressed, detected from its first bytes without consuming them.
+
+    Data are decompressed as they are read, so a compressed payload is never
+    held in memory as a whole.
+
+    Raises
+    ------
+    RuntimeError
+        If the payload is zstd-compressed and `zstandard` is not installed.
+
+    """
+    compression = sniff_compression(stream.peek(4)[:4])
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    if compression == "bz2":
+        return bz2.BZ2File(stream, mode="rb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError(
+                "Payload is zstd-compressed; install zstandard with "
+                "`pip install zstandard` to read it"
+            )
+        return io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+        )
+    return stream
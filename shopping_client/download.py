@@ -0,0 +1,242 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+import zlib
+from typing import Callable, Optional
+
+import requests
+import urllib3
+
+from .cache import remove_file
+from .instrumentation import count, span
+from .session import DEFAULT_TIMEOUT, default_session
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+class _adler32:
+    """`hashlib`-style wrapper around `zlib.adler32`, as used by Rucio."""
+
+    def __init__(self):
+        self.value = 1
+
+    def update(self, data):
+        self.value = zlib.adler32(data, self.value)
+
+    def hexdigest(self):
+        return f"{self.value & 0xFFFFFFFF:08x}"
+
+
+def file_checksum(path: str, algorithm: str, block_size: int = 1 << 20) -> str:
+    """Hex digest of the file at `path` using `algorithm` (any `hashlib`
+    algorithm, or `adler32`)."""
+    digest = _adler32() if algorithm == "adler32" else hashlib.new(algorithm)
+    with open(path, "rb") as data_file:
+        for block in iter(lambda: data_file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def download_file(
+    url: str,
+    path: str,
+    session: Optional[requests.Session] = None,
+    resume: bool = True,
+    chunk_size: int = 1 << 20,
+    progress: Optional[ProgressCallback] = None,
+    checksum: Optional[str] = None,
+    size: Optional[int] = None,
+    max_attempts: int = 5,
+    timeout=DEFAULT_TIMEOUT,
+    headers: Optional[dict] = None,
+) -> str:
+    """Stream `url` to the file `path`, resuming interrupted transfers with
+    HTTP Range requests.
+
+    Data are written to `<path>.part` and moved to `path` once the transfer
+    is complete and verified. A transfer interrupted by a connection error
+    is resumed from the end of the partial file, both within this call (up to
+    `max_attempts` times) and by later calls. `If-Range` ensures that a
+    partial file is only continued if the remote file has not changed.
+
+    Parameters
+    ----------
+    url : str
+        URL of the file.
+    path : str
+        Destination path.
+    session : requests.Session
+        Session used for the requests; defaults to the shared session.
+    resume : bool
+        If `False`, discard any partial file and start from scratch.
+    chunk_size : int
+        Number of bytes read from the network and written at a time.
+    progress : Callable[[int, Optional[int]], None]
+        Called after every chunk with the number of bytes downloaded so far
+        and the total size, if known.
+    checksum : str
+        Expected checksum as `"<algorithm>:<hexdigest>"`, e.g.
+        `"sha256:..."`, `"md5:..."` or `"adler32:..."`. If not given, an MD5
+        sent by the server (`Content-MD5` or `x-ms-blob-content-md5`) is
+        checked when available.
+    size : int
+        Expected size in bytes, checked in addition to the size announced by
+        the server.
+    max_attempts : int
+        Maximum number of connection attempts.
+    timeout : Union[float, tuple, None]
+        Timeout passed to every request.
+    headers : dict
+        Extra request headers. `Accept-Encoding: identity` is sent unless
+        overridden, so that the file is stored as it is and not in a
+        content coding.
+
+    Returns
+    -------
+    str
+        `path`
+
+    Raises
+    ------
+    requests.RequestException
+        If the transfer still fails after `max_attempts` attempts, including
+        transfers cut off mid-stream (`requests.ConnectionError`).
+    RuntimeError
+        If the downloaded file has the wrong size or checksum. The partial
+        file is removed so that the next attempt starts afresh.
+
+    """
+    with span("file_download"):
+        session = session if session is not None else default_session()
+        part_path = path + ".part"
+        state_path = part_path + ".json"
+        if not resume:
+            _remove(part_path, state_path)
+        state = _read_state(state_path)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            # The bytes are stored as sent, so ask for them unencoded: sizes,
+            # checksums and Range offsets refer to the file itself
+            request_headers = {"Accept-Encoding": "identity"}
+            request_headers.update(headers or {})
+            if offset:
+                request_headers["Range"] = f"bytes={offset}-"
+                if state.get("validator"):
+                    request_headers["If-Range"] = state["validator"]
+            try:
+                with session.get(
+                    url, headers=request_headers, stream=True, timeout=timeout
+                ) as response:
+                    if response.status_code == 416 and offset:
+                        # Nothing left to fetch if the partial file is complete
+                        total = _content_range_total(response.headers)
+                        if total == offset:
+                            break
+                        _remove(part_path, state_path)
+                        state = {}
+                        continue
+                    response.raise_for_status()
+
+                    if response.status_code == 206:
+                        mode = "ab"
+                        total = _content_range_total(response.headers)
+                    else:
+                        offset, mode = 0, "wb"
+                        length = response.headers.get("Content-Length")
+                        total = int(length) if length is not None else None
+                        state = dict(
+                            validator=response.headers.get("ETag")
+                            or response.headers.get("Last-Modified"),
+                            md5=response.headers.get("Content-MD5"),
+                        )
+                    state["total"] = total
+                    # Azure blob storage sends the MD5 of the whole blob, also
+                    # with partial responses
+                    blob_md5 = response.headers.get("x-ms-blob-content-md5")
+                    if blob_md5:
+                        state["md5"] = blob_md5
+                    _write_state(state_path, state)
+
+                    done = offset
+                    try:
+                        with open(part_path, mode) as part_file:
+                            for block in response.raw.stream(chunk_size, decode_content=False):
+                                part_file.write(block)
+                                done += len(block)
+                                if progress is not None:
+                                    progress(done, total)
+                    finally:
+                        count("bytes_received_total", done - offset, stage="download")
+                break
+            except (requests.ConnectionError, requests.Timeout, urllib3.exceptions.HTTPError) as e:
+                if attempt >= max_attempts:
+                    if isinstance(e, urllib3.exceptions.HTTPError):
+                        # Raised by the raw stream when a transfer is cut off
+                        raise requests.ConnectionError(e) from e
+                    raise
+                count("http_retries_total", method="GET", reason=type(e).__name__)
+                logger.warning(f"Download of {url} interrupted ({e}); resuming")
+                time.sleep(min(2 ** (attempt - 1) * 0.5, 30))
+
+        _verify(part_path, state_path, state, size, checksum)
+        os.replace(part_path, path)
+        _remove(state_path)
+        return path
+
+
+def _verify(part_path, state_path, state, size, checksum):
+    actual_size = os.path.getsize(part_path)
+    for expected in (state.get("total"), size):
+        if expected is not None and expected != actual_size:
+            _remove(part_path, state_path)
+            raise RuntimeError(
+                f"Downloaded {actual_size} bytes but expected {expected}"
+            )
+
+    if checksum is not None:
+        algorithm, _, expected = checksum.partition(":")
+        actual = file_checksum(part_path, algorithm.lower())
+        matches = actual.lower() == expected.lower().lstrip("0").zfill(len(actual))
+    elif state.get("md5"):
+        expected = state["md5"]
+        actual = base64.b64encode(
+            bytes.fromhex(file_checksum(part_path, "md5"))
+        ).decode()
+        matches = actual == expected
+    else:
+        return
+    if not matches:
+        _remove(part_path, state_path)
+        raise RuntimeError(f"Checksum mismatch: got {actual}, expected {expected}")
+
+
+def _content_range_total(headers):
+    # "bytes 0-99/1234" or "bytes */1234"
+    total = headers.get("Content-Range", "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+
+def _read_state(state_path):
+    try:
+        with open(state_path) as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_state(state_path, state):
+    with open(state_path, "w") as state_file:
+        json.dump(state, state_file)
+
+
+def _remove(*paths):
+    for path in paths:
+        remove_file(path)
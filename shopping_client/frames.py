@@ -0,0 +1,72 @@
+from typing import Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+DEFAULT_CATEGORICAL_COLUMNS = ("archive", "catalog")
+
+
+def records_to_frame(
+    records: Sequence[dict],
+    flatten: bool = False,
+    categorical_columns: Iterable[str] = DEFAULT_CATEGORICAL_COLUMNS,
+    sep: str = ".",
+) -> pd.DataFrame:
+    """Build a `pd.DataFrame` from decoded basket item payloads in one step.
+
+    Parameters
+    ----------
+    records : Sequence[dict]
+        Decoded `item_data` payloads, one per row.
+    flatten : bool
+        If `True`, nested `dict` fields are flattened into separate columns
+        named by joining the keys with `sep`. Otherwise nested fields are kept
+        as objects in a single column.
+    categorical_columns : Iterable[str]
+        Columns with repeated string values that are stored as
+        `pd.Categorical`, if present.
+    sep : str
+        Separator used for flattened column names.
+
+    Returns
+    -------
+    pd.DataFrame
+        Frame with one row per record and a `RangeIndex`; numeric and boolean
+        columns get proper dtypes instead of `object`.
+
+    """
+    if flatten:
+        frame = pd.json_normalize(list(records), sep=sep)
+    else:
+        frame = pd.DataFrame.from_records(list(records))
+
+    frame = frame.infer_objects()
+    for column in categorical_columns:
+        if column in frame.columns:
+            frame[column] = frame[column].astype("category")
+    return frame
+
+
+def basket_record(connector, item: dict) -> Optional[dict]:
+    """Decoded payload of `item` if `connector` accepts it, else `None`.
+
+    Connectors that set `loads_basket_items = True` return the payload from
+    `validate_basket_item(item, return_loaded=True)`, so each item is decoded
+    once. For any other connector the item is validated and converted with
+    `basket_item_to_pandas`, as a row of the table.
+    """
+    if getattr(connector, "loads_basket_items", False):
+        return connector.validate_basket_item(item, return_loaded=True) or None
+    if not connector.validate_basket_item(item):
+        return None
+    row = connector.basket_item_to_pandas(item)
+    return None if row is None else row.to_dict()
+
+
+def basket_records(connector, items: Iterable[dict]) -> List[dict]:
+    """Decoded payloads of the `items` accepted by `connector`, see
+    `basket_record`."""
+    return [
+        record
+        for record in (basket_record(connector, item) for item in items)
+        if record is not None
+    ]
@@ -0,0 +1,293 @@
+"""Instrumentation hooks for timing and counting network activity.
+
+The client and the connectors report what they do to the current
+`instrumentation`, which by default discards everything at negligible
+cost. Install a `metrics_collector` to find out where retrieval time goes:
+
+    from shopping_client.instrumentation import metrics_collector, set_instrumentation
+
+    metrics = metrics_collector()
+    set_instrumentation(metrics)
+    basket = client.get_basket()
+    print(metrics.to_prometheus())
+
+Subclass `instrumentation` to forward the measurements elsewhere, e.g. to
+OpenTelemetry or a `prometheus_client` registry.
+
+Spans are recorded as `<name>_seconds` histograms with an `outcome` label
+(`ok` or `error`):
+
+- `basket_fetch`: loading the whole basket in `get_basket`
+- `basket_request`: request of one basket page, until the headers arrive
+- `token_acquisition`: acquiring a new access token
+- `panoptes_lookup`: Panoptes entity (`kind="entity"`) or export
+  description (`kind="export"`) lookup
+- `export_download`: request of a Zooniverse export, until the headers arrive
+- `csv_parse`: downloading and parsing an export into a DataFrame
+- `file_download`: a download to a local file (Zooniverse, Rucio)
+- `alta_query`: one page of a batched ALTA metadata query
+- `rucio_replicas`: request of a batch of Rucio replicas, until the
+  headers arrive
+
+Counters:
+
+- `bytes_received_total` (`stage`): bytes read from the network
+- `http_retries_total` (`method`, `reason`): requests retried by the session
+- `cache_requests_total` (`cache`, `result`): cache hits and misses of the
+  `basket`, `token`, `panoptes_entity`, `panoptes_export`, `export` and
+  `alta` caches
+"""
+import bisect
+import contextlib
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import requests
+
+# Upper bounds of the histogram buckets in seconds, as in prometheus_client
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0,
+    float("inf"),
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class instrumentation:
+    """Receiver of measurements that ignores them; the default.
+
+    Subclasses override `observe` and `count`; `span` times a block and
+    passes its duration to `observe`.
+    """
+
+    enabled = False
+
+    def span(self, name: str, **labels):
+        """Context manager timing a block as the `<name>_seconds` metric.
+
+        The labels `dict` is yielded, so that the block can add labels that
+        are only known at its end, e.g. a status code.
+        """
+        return contextlib.nullcontext(labels)
+
+    def count(self, name: str, value: float = 1, **labels):
+        """Increase the counter `name` by `value`."""
+
+    def observe(self, name: str, value: float, **labels):
+        """Record `value` in the histogram `name`."""
+
+
+class _timing(instrumentation):
+    # Base of instrumentations that record spans
+
+    enabled = True
+
+    @contextlib.contextmanager
+    def span(self, name: str, **labels):
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield labels
+        except GeneratorExit:
+            # A generator closed by its consumer has not failed
+            raise
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self.observe(
+                f"{name}_seconds", time.perf_counter() - start, outcome=outcome, **labels
+            )
+
+
+class metrics_collector(_timing):
+    """In-memory collector of counters and histograms, in the style of
+    Prometheus client libraries. It is thread-safe, and can render its
+    metrics in the Prometheus text exposition format."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """Constructor.
+
+        Parameters
+        ----------
+        buckets : Tuple[float, ...]
+            Increasing upper bounds of the histogram buckets; the last one
+            should be infinity.
+
+        """
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, value: float = 1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels(labels))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def counter(self, name: str, **labels) -> float:
+        """Value of a counter, summed over all label values that are not
+        given."""
+        wanted = set(_labels(labels))
+        with self._lock:
+            return sum(
+                value
+                for (key, key_labels), value in self._counters.items()
+                if key == name and wanted <= set(key_labels)
+            )
+
+    def summary(self, name: str, **labels) -> Dict[str, float]:
+        """`count`, `sum` and `mean` of a histogram, e.g. of the durations
+        of a span, summed over all label values that are not given."""
+        wanted = set(_labels(labels))
+        total, count = 0.0, 0
+        with self._lock:
+            for (key, key_labels), (_, value_sum, value_count) in self._histograms.items():
+                if key == name and wanted <= set(key_labels):
+                    total += value_sum
+                    count += value_count
+        return dict(count=count, sum=total, mean=total / count if count else float("nan"))
+
+    def snapshot(self) -> dict:
+        """All metrics as plain data: counters by name and labels, and
+        histograms with their cumulative bucket counts, sum and count."""
+        with self._lock:
+            counters = [
+                dict(name=name, labels=dict(labels), value=value)
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                dict(
+                    name=name,
+                    labels=dict(labels),
+                    buckets=dict(zip(self.buckets, _cumulative(bucket_counts))),
+                    sum=value_sum,
+                    count=value_count,
+                )
+                for (name, labels), (bucket_counts, value_sum, value_count) in sorted(
+                    self._histograms.items()
+                )
+            ]
+        return dict(counters=counters, histograms=histograms)
+
+    def to_prometheus(self, prefix: str = "esap_") -> str:
+        """The metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines, typed = [], set()
+        for counter in snapshot["counters"]:
+            name = prefix + counter["name"]
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(counter['labels'])} {counter['value']}")
+        for histogram in snapshot["histograms"]:
+            name = prefix + histogram["name"]
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            labels = histogram["labels"]
+            for bound, value in histogram["buckets"].items():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(dict(labels, le=le))} {value}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Discard all metrics."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _labels(labels) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _cumulative(counts):
+    total, cumulative = 0, []
+    for count in counts:
+        total += count
+        cumulative.append(total)
+    return cumulative
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+_current = instrumentation()
+
+
+def get_instrumentation() -> instrumentation:
+    """The instrumentation that receives all measurements."""
+    return _current
+
+
+def set_instrumentation(new: Optional[instrumentation]) -> instrumentation:
+    """Install `new` as the receiver of all measurements (`None` restores
+    the no-op default) and return the previous one."""
+    global _current
+    previous, _current = _current, new if new is not None else instrumentation()
+    return previous
+
+
+def span(name: str, **labels):
+    """`span` of the current instrumentation."""
+    return _current.span(name, **labels)
+
+
+def count(name: str, value: float = 1, **labels):
+    """`count` of the current instrumentation."""
+    _current.count(name, value, **labels)
+
+
+def count_cache(cache: str, hit: bool, value: int = 1):
+    """Count `value` hits or misses of the cache named `cache`."""
+    if value:
+        _current.count(
+            "cache_requests_total", value, cache=cache, result="hit" if hit else "miss"
+        )
+
+
+@contextlib.contextmanager
+def received_bytes(response: requests.Response, stage: str):
+    """Count the bytes of `response` read within the block as
+    `bytes_received_total`."""
+    start = response_bytes(response)
+    try:
+        yield
+    finally:
+        _current.count("bytes_received_total", response_bytes(response) - start, stage=stage)
+
+
+def response_bytes(response: requests.Response) -> int:
+    """Number of bytes of the body of `response` read from the network so
+    far, before any content decoding."""
+    tell = getattr(response.raw, "tell", None)
+    if tell is not None:
+        try:
+            return tell()
+        except (OSError, ValueError):
+            pass
+    content = getattr(response, "_content", None)
+    return len(content) if isinstance(content, bytes) else 0
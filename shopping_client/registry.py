@@ -0,0 +1,146 @@
+import importlib
+import logging
+import threading
+from typing import Dict, Optional, Union
+
+from .basket_item import as_basket_item
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "esap_userprofile.connectors"
+
+# Connectors shipped with this package, by the `archive` of the basket items
+# they handle. Also declared as entry points in setup.py; listed here so that
+# they are found when running from a source checkout.
+BUILTIN_CONNECTORS = {
+    "zooniverse": "zooniverse.zooniverse:zooniverse",
+    "apertif": "alta.alta_connector:alta_connector",
+    "astron_vo": "astron_vo.astron_vo_connector:astron_vo_connector",
+    "rucio": "rucio_cli.rucio_connector:rucio_connector",
+    "samp": "samp.samp_connector:samp_connector",
+}
+
+
+class connector_registry:
+    """Registry of connector classes by archive name.
+
+    Connectors are discovered through the `esap_userprofile.connectors`
+    entry point group, where the entry point name is the `archive` of the
+    basket items the connector handles, e.g.
+
+        [options.entry_points]
+        esap_userprofile.connectors =
+            my_archive = my_package.connector:my_connector
+
+    Connector modules are only imported when a connector is first requested,
+    so that users of one connector do not pay for the imports of the others.
+    """
+
+    def __init__(
+        self,
+        group: Optional[str] = ENTRY_POINT_GROUP,
+        builtins: Optional[Dict[str, str]] = None,
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        group : str
+            Entry point group searched for connectors; `None` disables
+            discovery.
+        builtins : dict
+            Mapping of archive name to `"module:attribute"` of the default
+            connectors. Defaults to the connectors of this package. Entry
+            points take precedence.
+
+        """
+        self.group = group
+        self._targets = dict(BUILTIN_CONNECTORS if builtins is None else builtins)
+        self._classes = {}
+        self._discovered = group is None
+        self._lock = threading.Lock()
+
+    def register(self, archive: str, connector: Union[str, type]):
+        """Register a connector class, or its `"module:attribute"` path, for
+        `archive`, replacing any previous registration."""
+        with self._lock:
+            self._discover()
+            self._classes.pop(archive, None)
+            if isinstance(connector, str):
+                self._targets[archive] = connector
+            else:
+                self._targets[archive] = None
+                self._classes[archive] = connector
+
+    def archives(self) -> list:
+        """Names of the archives with a registered connector."""
+        with self._lock:
+            self._discover()
+            return sorted(self._targets)
+
+    def get(self, archive: str) -> type:
+        """Return the connector class for `archive`, importing its module on
+        first use.
+
+        Raises
+        ------
+        KeyError
+            If no connector is registered for `archive`.
+
+        """
+        with self._lock:
+            self._discover()
+            if archive in self._classes:
+                return self._classes[archive]
+            if archive not in self._targets:
+                raise KeyError(f"No connector registered for archive {archive!r}")
+            module_name, _, attribute = self._targets[archive].partition(":")
+            connector = getattr(importlib.import_module(module_name), attribute)
+            self._classes[archive] = connector
+            return connector
+
+    def create(self, archive: str, *args, **kwargs):
+        """Instantiate the connector for `archive` with the given arguments."""
+        return self.get(archive)(*args, **kwargs)
+
+    def connector_for(self, item: dict) -> Optional[type]:
+        """The connector class handling a basket item, dispatched on its
+        `archive`, or `None` if there is none."""
+        try:
+            return self.get(as_basket_item(item).archive)
+        except KeyError:
+            return None
+
+    def _discover(self):
+        # Called with the lock held; entry points are only read once.
+        if self._discovered:
+            return
+        self._discovered = True
+        # Reading distribution metadata is slow to import, so only do it here
+        from importlib.metadata import entry_points
+
+        try:
+            found = entry_points()
+            found = (
+                found.select(group=self.group)
+                if hasattr(found, "select")
+                else found.get(self.group, [])
+            )
+        except Exception as e:  # broken distribution metadata
+            logger.warning(f"Could not read connector entry points: {e}")
+            return
+        for entry_point in found:
+            self._targets[entry_point.name] = entry_point.value
+
+
+default_registry = connector_registry()
+
+
+def get_connector(archive: str) -> type:
+    """Connector class for `archive` from the default registry."""
+    return default_registry.get(archive)
+
+
+def register_connector(archive: str, connector: Union[str, type]):
+    """Register a connector for `archive` with the default registry."""
+    default_registry.register(archive, connector)
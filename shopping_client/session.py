@@ -0,0 +1,169 @@
+import threading
+import time
+from typing import Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .compression import ACCEPT_ENCODING
+from .instrumentation import count
+
+DEFAULT_TIMEOUT = (10.0, 60.0)
+DEFAULT_STATUS_FORCELIST = (429, 500, 502, 503, 504)
+
+
+class _counting_retry(Retry):
+    # Reports every retry to the current instrumentation
+
+    def increment(self, method=None, url=None, response=None, error=None, *args, **kwargs):
+        retry = super().increment(method, url, response, error, *args, **kwargs)
+        if response is None or not response.get_redirect_location():
+            reason = type(error).__name__ if error is not None else str(response.status)
+            count("http_retries_total", method=method or "", reason=reason)
+        return retry
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def make_session(
+    pool_connections: int = 10,
+    pool_maxsize: int = 10,
+    max_retries: int = 3,
+    backoff_factor: float = 0.5,
+    status_forcelist: Iterable[int] = DEFAULT_STATUS_FORCELIST,
+) -> requests.Session:
+    """Create a `requests.Session` with a keep-alive connection pool and
+    retry/backoff on connection errors and transient HTTP status codes.
+
+    Only idempotent methods are retried once a request has been sent; use
+    `post_idempotent` for POST requests that are safe to repeat.
+
+    Parameters
+    ----------
+    pool_connections : int
+        Number of per-host connection pools to cache.
+    pool_maxsize : int
+        Maximum number of connections kept alive in each pool. Should be at
+        least the number of threads sharing the session.
+    max_retries : int
+        Total number of retries for connection errors, read errors and
+        responses with a status in `status_forcelist`.
+    backoff_factor : float
+        Exponential backoff factor between retries; the n-th retry sleeps for
+        `backoff_factor * 2 ** (n - 1)` seconds. `Retry-After` headers sent
+        with 429/503 responses are honoured.
+    status_forcelist : Iterable[int]
+        HTTP status codes that trigger a retry.
+
+    Returns
+    -------
+    requests.Session
+        Session with retrying adapters mounted for `http://` and `https://`,
+        negotiating every content coding the installed modules can decode.
+
+    """
+    retry = _counting_retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=tuple(status_forcelist),
+        raise_on_status=False,
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry
+    )
+    session = requests.Session()
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def post_idempotent(
+    session: requests.Session,
+    url: str,
+    max_retries: int = 3,
+    backoff_factor: float = 0.5,
+    status_forcelist: Iterable[int] = DEFAULT_STATUS_FORCELIST,
+    **kwargs,
+) -> requests.Response:
+    """POST a request that may safely be sent more than once, e.g. a
+    read-only query, retrying it like the session retries GET requests.
+
+    Parameters
+    ----------
+    session : requests.Session
+        Session to send the request with.
+    url : str
+        URL to post to.
+    max_retries : int
+        Number of retries after read errors, timeouts and responses with a
+        status in `status_forcelist`.
+    backoff_factor : float
+        Exponential backoff factor between retries, as in `make_session`.
+    status_forcelist : Iterable[int]
+        HTTP status codes that trigger a retry.
+    **kwargs
+        Passed on to `session.post`. The body must not be a stream, as it is
+        sent again on a retry.
+
+    Returns
+    -------
+    requests.Response
+        The first response with a status not in `status_forcelist`, or the
+        last one.
+
+    """
+    status_forcelist = set(status_forcelist)
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.post(url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            reason = type(e).__name__
+            delay = None
+        else:
+            if response.status_code not in status_forcelist or attempt == max_retries:
+                return response
+            reason = str(response.status_code)
+            delay = _retry_after(response)
+            response.close()
+        count("http_retries_total", method="POST", reason=reason)
+        time.sleep(delay if delay is not None else backoff_factor * 2 ** attempt)
+
+
+def _retry_after(response):
+    # Seconds given by a numeric Retry-After header, if any
+    try:
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return None
+
+
+def default_session() -> requests.Session:
+    """Return the process-wide shared session, creating it on first use.
+
+    Clients and connectors that are not given an explicit session use this
+    one, so connections to the same host are reused between them.
+    """
+    global _default_session
+    if _default_session is None:
+        with _default_session_lock:
+            if _default_session is None:
+                _default_session = make_session()
+    return _default_session
+
+
+def set_default_session(session: Optional[requests.Session]):
+    """Replace the process-wide shared session. Passing `None` resets it so
+    that a fresh session is created on next use."""
+    global _default_session
+    with _default_session_lock:
+        _default_session = session
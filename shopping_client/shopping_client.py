@@ -1,22 +1,42 @@
-import base64
+import functools
 import getpass
-import json
+import hashlib
 import logging
-import time
+import os
 import urllib.parse
 from os import getenv
-from typing import Optional, Union
+from typing import Iterator, Optional, Union
 from warnings import warn
 
-import pandas as pd
 import requests
 
+from .basket_item import as_basket_item, basket_item, index_by_archive
+from .cache import basket_cache, default_cache_dir
+from .compression import ACCEPT_ENCODING
+from .frames import basket_records, records_to_frame
+from .instrumentation import count_cache, received_bytes, span
+from .registry import default_registry
+from .session import DEFAULT_TIMEOUT, default_session
+from .token_manager import token_manager, token_payload
+
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
+def _import_ijson():
+    # The optional streaming parser, imported when the first page is parsed
+    # rather than with the client; `None` if it is not installed.
+    try:
+        import ijson
+    except ImportError:  # pragma: no cover - optional dependency
+        return None
+    return ijson
+
+
 class shopping_client:
 
     endpoint = "esap-api/accounts/user-profiles/"
+    basket_item_prefix = "results.item.shopping_cart.item"
     audience = "rucio"  # Audience used by ESAP, might be configurable later
 
     client_validate_token = True
@@ -26,7 +46,12 @@ class shopping_client:
         token: Optional[str] = None,
         host: str = "http://localhost:5555/",
         connectors: list = [],
-        client_validate_token: bool = True
+        client_validate_token: bool = True,
+        session: Optional[requests.Session] = None,
+        timeout: Union[float, tuple, None] = DEFAULT_TIMEOUT,
+        cache: Optional[basket_cache] = None,
+        token_cache: Union[bool, str] = False,
+        background_refresh: bool = False,
     ):
         """Constructor.
 
@@ -38,30 +63,98 @@ class shopping_client:
             Hostname of the EASP Gateway backend.
         connectors : list
             List of connector classes that can handle specific types of shopping
-            item.
+            item. Archive names (e.g. `"apertif"`) may be given instead of
+            instances; their connectors are looked up in the connector
+            registry and created without arguments.
+        client_validate_token : bool
+            If `True`, check the expiry of the token before each request and
+            acquire a new one when needed.
+        session : requests.Session
+            Session used for all HTTP requests. Defaults to the process-wide
+            pooled session from `shopping_client.session.default_session`,
+            which is shared with connectors that talk HTTP. Use
+            `shopping_client.session.make_session` to configure pool size and
+            retries.
+        timeout : Union[float, tuple, None]
+            Timeout in seconds passed to every request, either a single value
+            or a `(connect, read)` tuple.
+        cache : basket_cache
+            Optional persistent basket cache; reloads only transfer pages that
+            changed.
+        token_cache : Union[bool, str]
+            Share tokens between processes on this host through a cache file,
+            at the given path or, if `True`, in the user's cache directory.
+        background_refresh : bool
+            If `True`, refresh the token in a daemon thread shortly before it
+            expires, using the JupyterHub and file token sources. Call
+            `close`, or use the client as a context manager, to stop it.
 
         """
         self.token = token
         self.host = host
-        self.connectors = connectors
+        self.connectors = [
+            default_registry.create(connector) if isinstance(connector, str) else connector
+            for connector in connectors
+        ]
         self.client_validate_token = client_validate_token
+        self._session = session
+        self.timeout = timeout
+        self.cache = cache
+
+        if token_cache is True:
+            key = hashlib.sha256(f"{host}\0{self.audience}".encode()).hexdigest()
+            token_cache = os.path.join(default_cache_dir("tokens"), key)
+        self.tokens = token_manager(
+            self._token_sources(),
+            token=token,
+            cache_path=token_cache or None,
+            background_refresh=background_refresh,
+        )
 
         self.basket = None
+        self._index = None
+        self._indexed_basket = None
+
+    @property
+    def session(self) -> requests.Session:
+        """Session used for HTTP requests: the one passed to the constructor,
+        or the shared default session, taken on first use."""
+        if self._session is None:
+            self._session = default_session()
+        return self._session
+
+    @session.setter
+    def session(self, session: requests.Session):
+        self._session = session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop the background token refresh, if any. The session is shared
+        and stays open."""
+        self.tokens.close()
 
     def get_basket(
         self,
         convert_to_pandas: bool = False,
         reload: bool = False,
         filter_archives: bool = False,
-    ) -> Union[list, pd.DataFrame, None]:
+        flatten: bool = False,
+        format: Optional[str] = None,
+    ) -> Union[list, dict, None]:
         """Retrieve the shopping basket for a user.
         Prompts for access token if one was not supplied to constructor.
 
         Parameters
         ----------
         convert_to_pandas : bool
-            If `True`, attempt to convert items from the basket to pandas Series
-            and concatenate items from the same archive into pandas DataFrames.
+            If `True`, attempt to convert items from the basket into one pandas
+            DataFrame per archive. Columns get inferred dtypes, and the
+            repeated `archive` and `catalog` strings are stored as categoricals.
 
             Note that items that cannot be converted by any of the connector
             classes passed to the constructor will be ignored and lost. The
@@ -77,126 +170,322 @@ class shopping_client:
             If this archive matches the 'archive' property of the provided connector
             then the item is handled further, otherwise it is ignored.
 
+        flatten : bool
+            If `True` and `convert_to_pandas` is `True`, nested fields of the
+            items are flattened into separate dot-separated columns.
+
+        format : str
+            Output format: `"list"` for the raw items, `"pandas"` (same as
+            `convert_to_pandas=True`) or `"arrow"` for one `pyarrow.Table`
+            per connector with the stable schema from
+            `shopping_client.arrow.connector_schema`. Arrow tables can be
+            written with `shopping_client.arrow.to_parquet` or `to_ipc`.
+
         Returns
         -------
-        Union[list, pd.DataFrame, None]
-            Description of returned object.
+        Union[list, dict, None]
+            The items, or a `dict` of converted tables keyed by connector
+            name.
 
         """
         if self.basket is None or reload:
-            url = urllib.parse.urljoin(self.host, shopping_client.endpoint)
-            response = requests.get(url, headers=self._request_header())
-            if response.ok:
-                self.basket = json.loads(response.content)["results"][0][
-                    "shopping_cart"
-                ]
-            else:
+            try:
+                with span("basket_fetch"):
+                    self.basket = list(self.iter_basket())
+            except requests.HTTPError:
                 warn(f"Unable to load data from {self.host}; is your key valid?")
 
         if filter_archives:
             self.basket = self._filter_on_archive()
 
-        if convert_to_pandas:
-            return self._basket_to_pandas()
+        return self._convert_to(format, convert_to_pandas, flatten)
 
-        return self.basket
+    def iter_basket(self, chunk_size: int = 64 * 1024) -> Iterator[dict]:
+        """Iterate over the items in the shopping basket for a user, following
+        every page of the paginated ESAP API response.
+
+        Items are yielded as soon as they have been decoded from the response
+        stream, so processing can start before the download has finished. If
+        `ijson` is installed, each page is parsed incrementally and memory use
+        does not grow with the size of the basket; otherwise each page is
+        decoded in one go. The in-memory `basket` is not used or updated.
+
+        If a `basket_cache` was passed to the constructor, each page is
+        requested conditionally and served from disk when the server answers
+        `304 Not Modified`; freshly downloaded pages are kept in memory until
+        the basket has been read completely and then written to the cache.
+
+        Parameters
+        ----------
+        chunk_size : int
+            Number of bytes read from the network at a time when parsing
+            incrementally.
+
+        Returns
+        -------
+        Iterator[dict]
+            Raw basket items, each a `basket_item` (a `dict` with an
+            `item_data` JSON string, decoded once on demand).
+
+        Raises
+        ------
+        requests.HTTPError
+            If any page could not be retrieved.
+
+        """
+        url = urllib.parse.urljoin(self.host, shopping_client.endpoint)
+        cached_pages, fetched_pages = {}, []
+        if self.cache is not None:
+            self._request_header()
+            user = self._cache_user()
+            cached_pages = self.cache.load(self.host, user) or {}
+
+        while url:
+            cached = cached_pages.get(url)
+            headers = self._conditional_headers(self._request_header(), cached)
+            with span("basket_request") as labels:
+                response = self.session.get(
+                    url, headers=headers, timeout=self.timeout, stream=True
+                )
+                labels["status"] = response.status_code
+            if cached is not None:
+                count_cache("basket", response.status_code == 304)
+            with response, received_bytes(response, "basket"):
+                if cached is not None and response.status_code == 304:
+                    page = cached
+                    yield from map(basket_item, page["items"])
+                else:
+                    response.raise_for_status()
+                    page = self._new_page(url, response.headers)
+                    for item in self._iter_page_items(response, page, chunk_size):
+                        item = basket_item(item)
+                        if self.cache is not None:
+                            page["items"].append(item)
+                        yield item
+            fetched_pages.append(page)
+            url = page.get("next")
+
+        if self.cache is not None:
+            self._store_pages(user, fetched_pages)
+
+    @staticmethod
+    def _conditional_headers(headers, cached):
+        if cached is not None:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+        return headers
+
+    @staticmethod
+    def _new_page(url, response_headers):
+        return dict(
+            url=url,
+            etag=response_headers.get("ETag"),
+            last_modified=response_headers.get("Last-Modified"),
+            next=None,
+            items=[],
+        )
+
+    def _store_pages(self, user, pages):
+        # Pages without validators can never be revalidated, so a basket
+        # served without any is not worth keeping.
+        if any(page["etag"] or page["last_modified"] for page in pages):
+            self.cache.store(self.host, user, pages)
+
+    def _iter_page_items(self, response, page, chunk_size):
+        # Yields the shopping cart items of one page and stores the URL of the
+        # following page in `page["next"]`.
+        ijson = _import_ijson()
+        if ijson is None:
+            payload = response.json()
+            page["next"] = payload.get("next")
+            for result in payload["results"]:
+                yield from result["shopping_cart"]
+            return
+
+        response.raw.decode_content = True
+        parser = _page_parser(page, self.basket_item_prefix)
+        for event in ijson.parse(response.raw, buf_size=chunk_size, use_float=True):
+            item = parser.feed(*event)
+            if item is not None:
+                yield item
 
     def _is_valid_token(self, token: Optional[str]) -> bool:
         """Checks expiry of the token"""
+        return self.tokens.is_valid(token)
 
-        if token is None:
-            return False
-
+    def _cache_user(self) -> str:
+        """Identity of the basket owner used as cache key: the `sub` claim of
+        the token, or a digest of the token if it cannot be decoded."""
         try:
-            data = token.split(".")[1]
-            padded = data + "=" * divmod(len(data), 4)[1]
-            payload = json.loads(base64.urlsafe_b64decode(padded))
-            return payload["exp"] > int(time.time()) + 10
-        except KeyError:
-            raise RuntimeError("Invalid JWT format")
+            return str(token_payload(self.token)["sub"])
+        except (IndexError, KeyError, TypeError, ValueError):
+            return hashlib.sha256(str(self.token).encode()).hexdigest()
 
     def _request_header(self):
         if self.client_validate_token:
-            while not self._is_valid_token(self.token):
-                self._get_token()
-
-        return dict(Accept="application/json", Authorization=f"Bearer {self.token}")
+            self.token = self.tokens.get(self.token)
+
+        return self._headers()
+
+    def _headers(self):
+        # Headers of every user-profile request, shared with the async client
+        return {
+            "Accept": "application/json",
+            "Accept-Encoding": ACCEPT_ENCODING,
+            "Authorization": f"Bearer {self.token}",
+        }
+
+    def _archive_index(self) -> dict:
+        """Index of the current basket by archive, rebuilt only when the
+        basket has been replaced."""
+        if self._indexed_basket is not self.basket:
+            self._index = index_by_archive(self.basket or [])
+            self._indexed_basket = self.basket
+        return self._index
 
     # filter on items belonging to the provided connectors
     def _filter_on_archive(self):
         filtered_items = []
         if len(self.connectors):
+            archives = {connector.archive for connector in self.connectors}
+            filtered_items = [
+                item
+                for item in map(as_basket_item, self.basket)
+                if item.archive in archives
+            ]
 
-            for item in self.basket:
-                item_data = json.loads(item["item_data"])
+        return filtered_items
 
-                for connector in self.connectors:
-                    if (
-                        "archive" in item_data
-                        and item_data["archive"] == connector.archive
-                    ):
-                        filtered_items.append(item)
+    def _convert_to(self, format, convert_to_pandas=False, flatten=False):
+        if format is None:
+            format = "pandas" if convert_to_pandas else "list"
+        if format == "pandas":
+            return self._basket_to_pandas(flatten=flatten)
+        if format == "arrow":
+            return self._basket_to_arrow()
+        if format != "list":
+            raise ValueError(f"Unknown basket format {format!r}")
+        return self.basket
 
-        return filtered_items
+    def _basket_to_pandas(self, flatten: bool = False):
+        return self._convert_basket(
+            lambda connector, records: records_to_frame(records, flatten=flatten),
+            "Pandas DataFrame",
+        )
+
+    def _basket_to_arrow(self):
+        from .arrow import connector_schema, records_to_table
 
-    def _basket_to_pandas(self):
+        return self._convert_basket(
+            lambda connector, records: records_to_table(
+                records, connector_schema(connector)
+            ),
+            "Arrow table",
+        )
+
+    def _convert_basket(self, build, target):
         if len(self.connectors):
 
             converted_basket = {}
 
             for connector in self.connectors:
 
-                items = [
-                    connector.basket_item_to_pandas(item)
-                    for item in self.basket
-                    if connector.validate_basket_item(item)
-                ]
+                # Route items via the archive index; connectors without an
+                # `archive` get to see the whole basket.
+                archive = getattr(connector, "archive", None)
+                candidates = (
+                    self._archive_index().get(archive, [])
+                    if archive is not None
+                    else self.basket
+                )
+                # Collect the decoded records and build each table in one
+                # step rather than concatenating one Series per item.
+                records = basket_records(connector, candidates)
 
-                if len(items):
-                    converted_basket[connector.name] = pd.concat(items, axis=1)
+                if len(records):
+                    converted_basket[connector.name] = build(connector, records)
                 else:
                     warn(
                         f"Connector {connector.name} specified but no data found for it "
                         f"in shopping basket. Result will not contain an entry named {connector.name}."
                         )
 
-            return {
-                name: data.to_frame().T if data.ndim < 2 else data.T
-                for name, data in converted_basket.items()
-            }
-            
+            return converted_basket
+
         warn(
-            "No archive connectors specified - could not convert any basket items to Pandas DataFrame"
+            f"No archive connectors specified - could not convert any basket items to {target}"
         )
         return self.basket
 
     def _get_token(self):
-
+        """Acquire a new token, sharing the acquisition with concurrent
+        callers."""
+        self.token = self.tokens.refresh()
+
+    def _token_sources(self):
+        # Ordered (source, interactive) pairs consulted by the token manager
+        return [
+            (self._token_from_jupyterhub, False),
+            (self._token_from_file, False),
+            (self._token_from_prompt, True),
+        ]
+
+    def _token_from_jupyterhub(self):
         # Generic JH token method using authstate
         jh_api_uri = getenv("JUPYTERHUB_API_URL")
         jh_api_token = getenv("JUPYTERHUB_API_TOKEN")
-        # Fallback to older rucio file
-        token_fn = getenv("RUCIO_OIDC_FILE_NAME")
+        if not all((jh_api_token, jh_api_uri)):
+            return None
 
         try:
-            if all((jh_api_token, jh_api_uri)):
-                res = requests.get(
-                    f"{jh_api_uri}/user",
-                    headers={"Authorization": f"token {jh_api_token}"},
-                )
-
-                self.token = res.json()["auth_state"]["exchanged_tokens"][self.audience]
-
+            res = self.session.get(
+                f"{jh_api_uri}/user",
+                headers={"Authorization": f"token {jh_api_token}"},
+                timeout=self.timeout,
+            )
+            return res.json()["auth_state"]["exchanged_tokens"][self.audience]
         except KeyError:
             logger.warning("JupyterHub without Authstate enabled")
+        return None
 
-        # Try to get token from Rucio OIDC file (when running in CERN DLaaS notebook)
-        if self.token is None and token_fn is not None:
-            with open(token_fn) as token_file:
-                self.token = token_file.readline()
-
-        elif self.token is None:
-            self.token = getpass.getpass("Enter your ESAP access token:")
-
-        if self.token is None:
-            raise RuntimeError("No token found!")
+    def _token_from_file(self):
+        # Fallback to older rucio file (when running in CERN DLaaS notebook)
+        token_fn = getenv("RUCIO_OIDC_FILE_NAME")
+        if token_fn is None:
+            return None
+
+        with open(token_fn) as token_file:
+            return token_file.readline()
+
+    def _token_from_prompt(self):
+        if getenv("RUCIO_OIDC_FILE_NAME") is not None:
+            return None
+        return getpass.getpass("Enter your ESAP access token:")
+
+
+class _page_parser:
+    """Assembles the basket items of one user-profile page from `ijson` parse
+    events, and records the URL of the following page in `page["next"]`."""
+
+    __slots__ = ("page", "item_prefix", "builder")
+
+    def __init__(self, page: dict, item_prefix: str):
+        self.page = page
+        self.item_prefix = item_prefix
+        self.builder = None
+
+    def feed(self, prefix, event, value) -> Optional[dict]:
+        """Consume one parse event; returns an item once it is complete."""
+        if self.builder is not None:
+            self.builder.event(event, value)
+            if prefix == self.item_prefix and event == "end_map":
+                item, self.builder = self.builder.value, None
+                return item
+        elif prefix == self.item_prefix and event == "start_map":
+            self.builder = _import_ijson().ObjectBuilder()
+            self.builder.event(event, value)
+        elif prefix == "next" and event in ("string", "null"):
+            self.page["next"] = value
+        return None
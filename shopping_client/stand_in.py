@@ -0,0 +1,88 @@
+"""Base classes of the local stand-in servers used for testing.
+
+The `testing` modules of the connectors (`alta.testing`,
+`astron_vo.testing`, `rucio_cli.testing`, `samp.testing`,
+`zooniverse.testing`) and `shopping_client.testing` serve their APIs from a `stand_in_server`
+subclass on `127.0.0.1`, in a background thread, e.g.
+
+    class echo_server(stand_in_server):
+        def __init__(self):
+            super().__init__(echo_handler)
+
+    with echo_server() as server:
+        requests.get(server.url)
+"""
+import http.server
+import threading
+
+
+class stand_in_handler(http.server.BaseHTTPRequestHandler):
+    """Request handler of a `stand_in_server`, which is available as
+    `self.stand_in`. Requests are not logged."""
+
+    protocol_version = "HTTP/1.1"
+    stand_in = None
+
+    def log_message(self, *args):
+        pass
+
+
+class stand_in_server:
+    """HTTP server on `127.0.0.1`, on a free port, serving requests in a
+    daemon thread between `start` and `stop`, or within a `with` block.
+
+    Subclasses pass their `stand_in_handler` subclass to the constructor,
+    and may override `make_server` to use another kind of server, e.g. an
+    XML-RPC server.
+
+    Attributes
+    ----------
+    url : str
+        Base URL of the server while it is running: `path` on the server's
+        address.
+    """
+
+    server_class = http.server.ThreadingHTTPServer
+    path = "/"
+
+    def __init__(self, handler=stand_in_handler):
+        self.handler = handler
+        self._server = None
+        self.url = None
+
+    def make_server(self, address):
+        """The server listening on `address`, with a handler bound to this
+        stand-in."""
+        handler = type("handler", (self.handler,), {"stand_in": self})
+        server = self.server_class(address, handler)
+        server.daemon_threads = True
+        return server
+
+    def start(self):
+        """Start serving; returns the stand-in."""
+        self._server = self.make_server(("127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}{self.path}"
+        self.started()
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self.stopped()
+
+    def started(self):
+        """Called by `start` once `url` is known, before the first request
+        is served."""
+
+    def stopped(self):
+        """Called by `stop` after the server was closed."""
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,340 @@
+import hashlib
+import logging
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+import requests
+
+from .basket_item import as_basket_item
+from .frames import basket_record, records_to_frame
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "item_key"
+
+
+def item_key(item: dict) -> str:
+    """Identity of a basket item: its `id` if the API sent one, otherwise a
+    digest of its `item_data`."""
+    if item.get("id") is not None:
+        return str(item["id"])
+    return hashlib.sha256(str(item.get("item_data")).encode()).hexdigest()
+
+
+class basket_delta:
+    """Changes of a shopping basket between two fetches, as lists of
+    `(key, item)` pairs, where `key` is the index of the item's row in the
+    DataFrames of `basket_sync`.
+
+    Attributes
+    ----------
+    added : list
+        Items that are new in the basket.
+    removed : list
+        Items that are no longer in the basket, as last seen.
+    changed : list
+        Items whose `item_data` changed, with their new contents.
+    """
+
+    __slots__ = ("added", "removed", "changed")
+
+    def __init__(self, added=None, removed=None, changed=None):
+        self.added = added or []
+        self.removed = removed or []
+        self.changed = changed or []
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def __repr__(self):
+        return (
+            f"basket_delta(added={len(self.added)}, removed={len(self.removed)}, "
+            f"changed={len(self.changed)})"
+        )
+
+
+class basket_sync:
+    """Incremental synchronisation of a shopping basket.
+
+    Every call to `sync` fetches the basket and compares it with the
+    previous fetch by item identity (see `item_key`). Only the added and
+    changed items are decoded and converted; their rows are applied to the
+    per-connector DataFrames in `frames`, where rows of removed items are
+    dropped, rows of changed items are replaced in place and rows of added
+    items are appended. Fetching and comparing the items still costs time
+    in proportion to the size of the basket, but the rows of unchanged items
+    are never decoded or converted again. Pass a client with a
+    `basket_cache` so that pages that did not change are answered with
+    `304 Not Modified` and not downloaded again.
+    """
+
+    def __init__(self, client, flatten: bool = False):
+        """Constructor.
+
+        Parameters
+        ----------
+        client : shopping_client
+            Client used to fetch the basket; its `connectors` determine the
+            DataFrames that are maintained, and its `basket` is kept up to
+            date.
+        flatten : bool
+            If `True`, nested fields are flattened into dot-separated columns,
+            as with `get_basket(flatten=True)`.
+
+        """
+        self.client = client
+        self.flatten = flatten
+        self.items = {}
+        self.frames = {}
+        self.lock = threading.RLock()
+
+    def sync(self) -> basket_delta:
+        """Fetch the basket and apply the changes since the last call.
+
+        Returns
+        -------
+        basket_delta
+            The changes; everything is `added` on the first call.
+
+        Raises
+        ------
+        requests.HTTPError
+            If the basket could not be retrieved; nothing is changed then.
+
+        """
+        fetched = list(self.client.iter_basket())
+        with self.lock:
+            items = self._keyed(fetched)
+            delta = self._diff(items)
+            self.items = items
+            self.client.basket = fetched
+            if delta:
+                self._update_frames(delta)
+        return delta
+
+    def _keyed(self, fetched):
+        # Items without an `id` that have the same contents get a running
+        # number, so that duplicates are kept apart.
+        items = {}
+        for item in map(as_basket_item, fetched):
+            key = base = item_key(item)
+            n = 1
+            while key in items:
+                key = f"{base}:{n}"
+                n += 1
+            items[key] = item
+        return items
+
+    def _diff(self, items):
+        delta = basket_delta()
+        for key, item in items.items():
+            previous = self.items.get(key)
+            if previous is None:
+                delta.added.append((key, item))
+            elif previous.get("item_data") != item.get("item_data"):
+                delta.changed.append((key, item))
+        delta.removed = [
+            (key, item) for key, item in self.items.items() if key not in items
+        ]
+        return delta
+
+    def _update_frames(self, delta):
+        # Only the payloads of added and changed items are decoded; their rows
+        # are built in one step and applied to each connector's frame.
+        stale = [key for key, _ in delta.removed + delta.changed]
+        for connector in self.client.connectors:
+            archive = getattr(connector, "archive", None)
+            keys, records = [], []
+            for key, item in delta.added + delta.changed:
+                if archive is not None and item.archive != archive:
+                    continue
+                data = basket_record(connector, item)
+                if data:
+                    keys.append(key)
+                    records.append(data)
+
+            frame = self.frames.get(connector.name)
+            if not records:
+                if frame is not None and stale:
+                    self.frames[connector.name] = frame.drop(index=stale, errors="ignore")
+                continue
+            rows = records_to_frame(records, flatten=self.flatten)
+            rows.index = pd.Index(keys, name=INDEX_NAME)
+            if frame is None:
+                self.frames[connector.name] = rows
+            else:
+                self.frames[connector.name] = _apply_rows(frame, stale, rows)
+
+
+def _apply_rows(frame, stale, rows):
+    # Drop the rows of `stale` keys that have no new row, overwrite the rows
+    # of changed items where they are and append the rows of new keys; the
+    # rows of unchanged items are not copied unless rows are dropped or
+    # appended.
+    dropped = frame.index.intersection(stale).difference(rows.index)
+    if len(dropped):
+        frame = frame.drop(index=dropped)
+    replaced = rows.index.intersection(frame.index)
+    if len(replaced):
+        _set_rows(frame, replaced, rows)
+    added = rows.index.difference(frame.index, sort=False)
+    if not len(added):
+        return frame
+    categorical = [
+        column
+        for column in frame.columns
+        if isinstance(frame[column].dtype, pd.CategoricalDtype)
+    ]
+    combined = pd.concat([frame, rows.loc[added]], axis=0)
+    # Concatenating categoricals with different categories gives `object`
+    for column in categorical:
+        combined[column] = combined[column].astype("category")
+    return combined
+
+
+def _set_rows(frame, keys, rows):
+    # Overwrite the rows `keys` of `frame` with those of `rows`, in place.
+    # Columns that `rows` lacks become missing, and columns are cast to a
+    # dtype that holds both the old and the new values.
+    for column in rows.columns.difference(frame.columns, sort=False):
+        frame[column] = rows[column].reindex(frame.index)
+    for column in frame.columns:
+        if column in rows.columns:
+            values = rows.loc[keys, column]
+        else:
+            values = pd.Series(np.nan, index=keys)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Categoricals can only be set from ones with identical categories
+            values = values.astype(object)
+        current = frame[column]
+        if isinstance(current.dtype, pd.CategoricalDtype):
+            new = pd.Index(values.dropna().unique()).difference(current.cat.categories)
+            if len(new):
+                frame[column] = current.cat.add_categories(new)
+        elif values.dtype != current.dtype:
+            # The dtype `pd.concat` gives for the two columns
+            dtype = pd.concat([current.iloc[:0], values.iloc[:0]]).dtype
+            if dtype != current.dtype:
+                frame[column] = current.astype(dtype)
+        frame.loc[keys, column] = values
+
+
+class basket_watcher:
+    """Polls a shopping basket in a background thread and passes the changes
+    to registered callbacks.
+
+    Callbacks are only called when the basket changed. After a failed poll
+    the interval is multiplied by `backoff`, up to `max_interval`; it is
+    reset after the next successful poll. Errors are logged and never stop
+    the background thread.
+    """
+
+    def __init__(
+        self,
+        sync: basket_sync,
+        interval: float = 60.0,
+        max_interval: float = 900.0,
+        backoff: float = 2.0,
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        sync : basket_sync
+            Synchronisation state the watcher updates.
+        interval : float
+            Seconds between polls.
+        max_interval : float
+            Upper bound in seconds for the interval after failed polls.
+        backoff : float
+            Factor applied to the interval after each failed poll.
+
+        """
+        self.sync = sync
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.callbacks = []
+        self._current_interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_callback(self, callback: Callable[[basket_delta], None]):
+        """Register `callback`, called with each non-empty `basket_delta`."""
+        self.callbacks.append(callback)
+
+    def remove_callback(self, callback: Callable[[basket_delta], None]):
+        """Unregister `callback`."""
+        self.callbacks.remove(callback)
+
+    def poll(self) -> Optional[basket_delta]:
+        """Synchronise once and notify the callbacks of any changes.
+
+        Returns
+        -------
+        Optional[basket_delta]
+            The changes, or `None` if the basket could not be fetched.
+
+        """
+        try:
+            delta = self.sync.sync()
+        except requests.RequestException as e:
+            self._back_off()
+            logger.warning(
+                f"Basket poll failed ({e}); retrying in {self._current_interval:.1f} s"
+            )
+            return None
+        self._current_interval = self.interval
+        if delta:
+            for callback in list(self.callbacks):
+                try:
+                    callback(delta)
+                except Exception:
+                    logger.exception(f"Basket watcher callback {callback!r} failed")
+        return delta
+
+    def start(self):
+        """Start polling in a daemon thread; the first poll is immediate."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="basket-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop polling and wait for the thread to finish."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _back_off(self):
+        self._current_interval = min(
+            self._current_interval * self.backoff, self.max_interval
+        )
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception:
+                # e.g. no token, or a malformed page; keep watching
+                self._back_off()
+                logger.exception(
+                    f"Basket poll failed; retrying in {self._current_interval:.1f} s"
+                )
+            self._stop.wait(self._current_interval)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
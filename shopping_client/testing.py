@@ -0,0 +1,298 @@
+"""Local stand-in for the ESAP user-profile API.
+
+`user_profile_server` serves the paginated `esap-api/accounts/user-profiles/`
+endpoint with a synthetic basket per user, and the JupyterHub `user`
+endpoint through which notebook sessions obtain their access token. Basket
+size, latency, error rate and token lifetime are configurable, so that
+`shopping_client` can be tested, and load tested with
+`benchmarks/bench_load.py`, without an ESAP gateway, e.g.
+
+    with user_profile_server(basket_size=1000, latency=0.05) as server:
+        client = shopping_client(token=server.issue_token("jdoe"), host=server.url)
+        basket = client.get_basket()
+"""
+import base64
+import collections
+import gzip
+import hashlib
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+from typing import Optional, Tuple, Union
+
+from .shopping_client import shopping_client
+from .stand_in import stand_in_handler, stand_in_server
+
+_ARCHIVES = ("apertif", "astron_vo", "rucio", "samp", "zooniverse")
+
+Range = Union[float, Tuple[float, float]]
+
+
+def _encode(part: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(part).encode()).rstrip(b"=").decode()
+
+
+def _draw(rng, value):
+    # A fixed value, or a uniform draw from a `(low, high)` range
+    if isinstance(value, tuple):
+        return rng.uniform(*value)
+    return value
+
+
+class user_profile_server(stand_in_server):
+    """ESAP user-profile API and JupyterHub token endpoint on `127.0.0.1`.
+
+    Requests to the user-profile API must carry a bearer token issued by the
+    server (`issue_token`, or the JupyterHub endpoint) that has not expired;
+    otherwise they are answered with status 401. Pages carry an `ETag` and
+    are answered with status 304 when it matches `If-None-Match`.
+
+    Attributes
+    ----------
+    url : str
+        Base URL of the server, to be passed as `host`.
+    hub_api_url : str
+        URL of the JupyterHub API stand-in; `GET <hub_api_url>/user` with the
+        header `Authorization: token <user name>` returns a fresh access
+        token in `auth_state.exchanged_tokens`, like a JupyterHub with token
+        exchange.
+    statuses : collections.Counter
+        Number of responses sent per status code.
+    encodings : collections.Counter
+        Number of responses sent per content coding, `gzip` or `identity`.
+    accept_encodings : collections.Counter
+        Number of requests answered per `Accept-Encoding` header received.
+    tokens_issued : int
+        Number of access tokens issued.
+    max_active : int
+        Highest number of concurrent requests seen.
+    """
+
+    # Load tests open many connections at once
+    server_class = type(
+        "server", (http.server.ThreadingHTTPServer,), {"request_queue_size": 1024}
+    )
+
+    def __init__(
+        self,
+        basket_size: Union[int, Tuple[int, int]] = 100,
+        page_size: int = 100,
+        latency: Range = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        token_lifetime: float = 3600.0,
+        compress: bool = False,
+        seed: int = 0,
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        basket_size : Union[int, Tuple[int, int]]
+            Number of items in the basket of every user, or a `(low, high)`
+            range from which the size of each user's basket is drawn.
+        page_size : int
+            Number of basket items per page of the API response.
+        latency : Union[float, Tuple[float, float]]
+            Seconds every request takes before it is answered, or a
+            `(low, high)` range to draw it from.
+        error_rate : float
+            Fraction of user-profile requests that fail with `error_status`.
+        error_status : int
+            Status of the injected failures; 503 is retried by the client.
+        token_lifetime : float
+            Lifetime in seconds of the tokens issued. It must exceed the
+            minimum validity the client's token manager requires (10 s by
+            default); below its refresh window (60 s more) the background
+            refresh gives up and tokens are renewed when they expire.
+        compress : bool
+            If `True`, responses are gzip-compressed for clients that accept
+            it, like a gateway with compression enabled.
+        seed : int
+            Seed of the basket contents, latencies and failures.
+
+        """
+        self.basket_size = basket_size
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.token_lifetime = token_lifetime
+        self.compress = compress
+        self.seed = seed
+        self.statuses = collections.Counter()
+        self.encodings = collections.Counter()
+        self.accept_encodings = collections.Counter()
+        self.tokens_issued = 0
+        self.max_active = 0
+        self._active = 0
+        self._pages = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.hub_api_url = None
+        super().__init__(_handler)
+
+    def started(self):
+        self.hub_api_url = self.url + "hub/api"
+
+    def issue_token(self, user: str, lifetime: Optional[float] = None) -> str:
+        """An (unsigned) JWT for `user` expiring after `lifetime` seconds,
+        `token_lifetime` by default."""
+        lifetime = self.token_lifetime if lifetime is None else lifetime
+        now = time.time()
+        with self._lock:
+            self.tokens_issued += 1
+            serial = self.tokens_issued
+        payload = dict(
+            sub=user, aud=shopping_client.audience, iat=int(now), exp=now + lifetime, jti=serial
+        )
+        return f"{_encode(dict(alg='none', typ='JWT'))}.{_encode(payload)}.stand-in"
+
+    def token_user(self, token: str) -> Optional[str]:
+        """The user of a valid token, or `None` if it is malformed or
+        expired."""
+        try:
+            data = token.split(".")[1]
+            payload = json.loads(base64.urlsafe_b64decode(data + "=" * (-len(data) % 4)))
+            if payload["exp"] <= time.time():
+                return None
+            return payload["sub"]
+        except (IndexError, KeyError, TypeError, ValueError):
+            return None
+
+    def pages(self, user: str) -> list:
+        """The `(body, etag)` pages of the basket of `user`, created on first
+        use."""
+        pages = self._pages.get(user)
+        if pages is None:
+            pages = self._make_pages(user)
+            with self._lock:
+                pages = self._pages.setdefault(user, pages)
+        return pages
+
+    def _make_pages(self, user):
+        rng = random.Random(f"{self.seed}:{user}")
+        size = self.basket_size
+        if isinstance(size, tuple):
+            size = rng.randint(*size)
+        items = [
+            dict(
+                id=i,
+                item_data=json.dumps(
+                    dict(
+                        archive=_ARCHIVES[i % len(_ARCHIVES)],
+                        catalog="catalog",
+                        id=i,
+                        ra=rng.uniform(0, 360),
+                        dec=rng.uniform(-90, 90),
+                        name=f"{user}-item-{i}",
+                    )
+                ),
+            )
+            for i in range(size)
+        ]
+        endpoint = self.url + shopping_client.endpoint
+        pages = []
+        for number, start in enumerate(range(0, max(size, 1), self.page_size), start=1):
+            following = None
+            if start + self.page_size < size:
+                following = f"{endpoint}?page={number + 1}"
+            body = json.dumps(
+                dict(
+                    count=1,
+                    next=following,
+                    previous=None,
+                    results=[
+                        dict(
+                            user_name=user,
+                            shopping_cart=items[start : start + self.page_size],
+                        )
+                    ],
+                )
+            ).encode()
+            pages.append((body, f'"{hashlib.md5(body).hexdigest()}"'))
+        return pages
+
+    def _wait(self):
+        with self._lock:
+            latency = _draw(self._rng, self.latency)
+        if latency:
+            time.sleep(latency)
+
+    def _fails(self):
+        with self._lock:
+            return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+
+class _handler(stand_in_handler):
+    def do_GET(self):
+        server = self.stand_in
+        with server._lock:
+            server._active += 1
+            server.max_active = max(server.max_active, server._active)
+        try:
+            server._wait()
+            parsed = urllib.parse.urlparse(self.path)
+            if parsed.path == "/hub/api/user":
+                return self._hub_user()
+            if parsed.path.lstrip("/") == shopping_client.endpoint:
+                return self._user_profiles(urllib.parse.parse_qs(parsed.query))
+            self._send(404, {"detail": "Not found."})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with server._lock:
+                server._active -= 1
+
+    def _hub_user(self):
+        authorization = self.headers.get("Authorization", "")
+        if not authorization.startswith("token "):
+            return self._send(403, {"message": "Missing or invalid credentials"})
+        user = authorization[len("token "):].strip()
+        token = self.stand_in.issue_token(user)
+        self._send(
+            200,
+            dict(name=user, auth_state=dict(exchanged_tokens={shopping_client.audience: token})),
+        )
+
+    def _user_profiles(self, query):
+        server = self.stand_in
+        authorization = self.headers.get("Authorization", "")
+        user = None
+        if authorization.startswith("Bearer "):
+            user = server.token_user(authorization[len("Bearer "):])
+        if user is None:
+            return self._send(401, {"detail": "Given token not valid for any token type"})
+        if server._fails():
+            return self._send(server.error_status, {"detail": "Service unavailable"})
+        pages = server.pages(user)
+        number = int(query.get("page", ["1"])[0])
+        if not 1 <= number <= len(pages):
+            return self._send(404, {"detail": "Invalid page."})
+        body, etag = pages[number - 1]
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, None, etag)
+        self._send(200, body, etag)
+
+    def _send(self, status, body, etag=None):
+        payload = b"" if body is None else body if isinstance(body, bytes) else json.dumps(body).encode()
+        encoding = "identity"
+        if self.stand_in.compress and payload and "gzip" in self.headers.get("Accept-Encoding", ""):
+            payload, encoding = gzip.compress(payload), "gzip"
+        with self.stand_in._lock:
+            self.stand_in.statuses[status] += 1
+            self.stand_in.encodings[encoding] += 1
+            self.stand_in.accept_encodings[self.headers.get("Accept-Encoding")] += 1
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", "application/json")
+        if encoding != "identity":
+            self.send_header("Content-Encoding", encoding)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
@@ -0,0 +1,313 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional, Tuple
+
+from .instrumentation import count_cache, span
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TokenSource = Tuple[Callable[[], Optional[str]], bool]
+
+
+def token_payload(token: str) -> dict:
+    """Decodes the (unverified) payload of a JWT"""
+    data = token.split(".")[1]
+    padded = data + "=" * divmod(len(data), 4)[1]
+    return json.loads(base64.urlsafe_b64decode(padded))
+
+
+class token_manager:
+    """Provides valid access tokens without blocking the request path.
+
+    The expiry of every token seen is decoded once and memoized. Tokens are
+    acquired from an ordered list of sources; only one acquisition runs at a
+    time and concurrent callers wait for its result. Optionally the current
+    token is shared between processes on the same host through a file-locked
+    cache file, and a background thread refreshes the token shortly before
+    it expires, so callers normally never wait for acquisition at all.
+    """
+
+    max_memoized = 64
+    # Seconds before the first retry of a failed background refresh, and the
+    # most it waits between retries
+    retry_delay = 1.0
+    max_retry_delay = 60.0
+
+    def __init__(
+        self,
+        sources: Iterable[TokenSource],
+        token: Optional[str] = None,
+        cache_path: Optional[str] = None,
+        min_validity: float = 10.0,
+        refresh_ahead: float = 60.0,
+        background_refresh: bool = False,
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        sources : Iterable[TokenSource]
+            Ordered `(callable, interactive)` pairs. Each callable returns a
+            token or `None`. Interactive sources (e.g. a password prompt) are
+            never used for background refreshes.
+        token : str
+            Initial token, if any.
+        cache_path : str
+            Path of a file used to share the token between processes. The file
+            is created with user-only permissions. `None` disables sharing.
+        min_validity : float
+            Minimum remaining lifetime in seconds for a token to be handed out.
+        refresh_ahead : float
+            How many seconds before expiry the background refresh starts. For
+            tokens that live shorter, it starts halfway through the time the
+            token is still handed out.
+        background_refresh : bool
+            If `True`, refresh the token in a daemon thread ahead of expiry
+            using the non-interactive sources. Failed refreshes are retried
+            with exponential backoff while the current token is valid. Call
+            `close` to stop.
+
+        """
+        self.sources = list(sources)
+        self.cache_path = cache_path
+        self.min_validity = min_validity
+        self.refresh_ahead = refresh_ahead
+        self.background_refresh = background_refresh
+
+        self._token = token
+        self._expiries = {}
+        self._condition = threading.Condition()
+        self._refreshing = False
+        self._timer = None
+        self._refresh_margin = None
+        self._failures = 0
+        self._closed = False
+        if token is not None and background_refresh:
+            try:
+                self._schedule_refresh(token)
+            except (RuntimeError, IndexError, ValueError):
+                pass  # not a JWT; replaced on first use
+
+    def expiry(self, token: str) -> float:
+        """Return the `exp` claim of `token`, decoding each token only once.
+
+        Raises
+        ------
+        RuntimeError
+            If the token has no `exp` claim.
+        """
+        exp = self._expiries.get(token)
+        if exp is None:
+            try:
+                exp = token_payload(token)["exp"]
+            except KeyError:
+                raise RuntimeError("Invalid JWT format")
+            if len(self._expiries) >= self.max_memoized:
+                self._expiries.clear()
+            self._expiries[token] = exp
+        return exp
+
+    def is_valid(self, token: Optional[str], margin: Optional[float] = None) -> bool:
+        """Check that `token` is still valid for at least `margin` seconds."""
+        if token is None:
+            return False
+        margin = self.min_validity if margin is None else margin
+        return self.expiry(token) > time.time() + margin
+
+    def get(self, token: Optional[str] = None) -> str:
+        """Return a valid token.
+
+        Parameters
+        ----------
+        token : str
+            A candidate token, e.g. one set by the user. It is adopted if it is
+            still valid.
+
+        Returns
+        -------
+        str
+            A valid token. Only blocks if no valid token is known, in which
+            case a single acquisition is shared by all waiting callers.
+
+        """
+        if token is not None and token != self._token and self.is_valid(token):
+            self._set_token(token)
+            return token
+        current = self._token
+        if self.is_valid(current):
+            return current
+        return self.refresh()
+
+    def refresh(self, interactive: bool = True, margin: Optional[float] = None) -> str:
+        """Acquire a new token, or wait for an acquisition already in flight.
+
+        Parameters
+        ----------
+        interactive : bool
+            If `False`, interactive sources are skipped.
+        margin : float
+            Minimum remaining lifetime in seconds of the new token. Defaults to
+            `min_validity`.
+
+        Raises
+        ------
+        RuntimeError
+            If no source provides a valid token.
+        """
+        with self._condition:
+            while self._refreshing:
+                self._condition.wait()
+                if self.is_valid(self._token):
+                    return self._token
+            self._refreshing = True
+
+        token = None
+        try:
+            with span("token_acquisition"):
+                token = self._acquire(interactive, margin)
+        finally:
+            with self._condition:
+                self._refreshing = False
+                if token is not None:
+                    self._set_token(token)
+                self._condition.notify_all()
+        return token
+
+    def close(self):
+        """Cancel a scheduled background refresh and stop refreshing in the
+        background. Tokens are still acquired on demand by `get`."""
+        with self._condition:
+            self._closed = True
+            self._cancel_timer()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _acquire(self, interactive, margin):
+        with self._file_lock():
+            token = self._read_cache()
+            try:
+                valid = self.is_valid(token, margin)
+            except (RuntimeError, IndexError, ValueError):
+                logger.warning(f"Ignoring malformed token in {self.cache_path}")
+                valid = False
+            if self.cache_path is not None:
+                count_cache("token", valid)
+            if valid:
+                return token
+
+            for source, source_interactive in self.sources:
+                if source_interactive and not interactive:
+                    continue
+                token = source()
+                if token is not None:
+                    token = token.strip()
+                if self.is_valid(token, margin):
+                    self._write_cache(token)
+                    return token
+
+        raise RuntimeError("No token found!")
+
+    def _set_token(self, token):
+        self._token = token
+        self._failures = 0
+        if self.background_refresh:
+            self._schedule_refresh(token)
+
+    def _schedule_refresh(self, token):
+        if not any(not interactive for _, interactive in self.sources):
+            return
+        # Tokens living shorter than the refresh window are refreshed halfway
+        # through their usable lifetime, so that a new token of the same
+        # lifetime is accepted.
+        usable = self.expiry(token) - time.time() - self.min_validity
+        if usable <= 0:
+            return
+        ahead = min(self.refresh_ahead, usable / 2)
+        self._refresh_margin = ahead + self.min_validity
+        self._start_timer(usable + self.min_validity - ahead)
+
+    def _start_timer(self, delay):
+        with self._condition:
+            if self._closed:
+                return
+            self._cancel_timer()
+            # The timer only holds a weak reference, so that an unused client
+            # and its token manager can still be garbage collected.
+            self._timer = threading.Timer(delay, _refresh, (weakref.ref(self),))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _background_refresh(self):
+        try:
+            # Only accept a token that outlives the current refresh window,
+            # otherwise the refresh would immediately be scheduled again.
+            self.refresh(interactive=False, margin=self._refresh_margin)
+        except Exception as e:
+            self._failures += 1
+            delay = min(
+                self.retry_delay * 2 ** (self._failures - 1), self.max_retry_delay
+            )
+            if self.is_valid(self._token, delay):
+                logger.warning(
+                    f"Background token refresh failed: {e}; retrying in {delay:g} s"
+                )
+                self._start_timer(delay)
+            else:
+                logger.warning(
+                    f"Background token refresh failed: {e}; "
+                    "a new token will be acquired on next use"
+                )
+
+    @contextmanager
+    def _file_lock(self):
+        # Serialises token acquisition between processes sharing the cache.
+        if self.cache_path is None or fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        fd = os.open(self.cache_path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _read_cache(self):
+        if self.cache_path is None:
+            return None
+        try:
+            with open(self.cache_path) as cache_file:
+                return json.load(cache_file).get("token")
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, token):
+        if self.cache_path is None:
+            return
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as cache_file:
+            json.dump(dict(token=token, exp=self.expiry(token)), cache_file)
+        os.replace(tmp_path, self.cache_path)
+
+
+def _refresh(manager_ref):
+    # Timer target; the manager may have been collected in the meantime
+    manager = manager_ref()
+    if manager is not None:
+        manager._background_refresh()
@@ -0,0 +1,285 @@
+import base64
+import io
+import math
+import struct
+from typing import IO, Iterator, Optional, Union
+from warnings import warn
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pandas as pd
+
+_INTEGER_TYPES = {"unsignedByte", "short", "int", "long"}
+_FLOAT_TYPES = {"float", "double"}
+
+MEDIA_TYPE = "application/x-votable+xml"
+
+
+def _local(tag):
+    # Tag name without the VOTable namespace of any version
+    return tag.rpartition("}")[2]
+
+
+def iter_votable(
+    source: Union[str, IO[bytes]], chunk_size: int = 10000
+) -> Iterator[pd.DataFrame]:
+    """Parse the first table of a VOTable incrementally into DataFrame
+    chunks.
+
+    The document is read piece by piece, and rows are discarded once they
+    have been added to a chunk, so memory use is bounded by `chunk_size`
+    rows whatever the size of the table. Only the `TABLEDATA` serialisation
+    is supported.
+
+    Parameters
+    ----------
+    source : Union[str, IO[bytes]]
+        Path or binary file-like object, e.g. the raw stream of an HTTP
+        response.
+    chunk_size : int
+        Maximum number of rows per chunk.
+
+    Returns
+    -------
+    Iterator[pd.DataFrame]
+        Chunks with identical columns and dtypes derived from the `FIELD`
+        datatypes: integer columns with missing values use the nullable
+        `Int64` dtype. An empty table gives a single empty chunk.
+
+    Raises
+    ------
+    RuntimeError
+        If the document reports a query error, or the table uses a binary
+        serialisation.
+
+    """
+    fields, rows, tabledata = [], [], None
+    row, in_table, done, chunks = None, False, False, 0
+    for event, element in ElementTree.iterparse(source, events=("start", "end")):
+        tag = _local(element.tag)
+        if event == "start":
+            if tag == "TABLE" and not done:
+                in_table = True
+            elif tag == "TABLEDATA" and in_table:
+                tabledata = element
+            elif tag == "TR" and tabledata is not None:
+                row = []
+            elif tag in ("BINARY", "BINARY2", "FITS") and in_table:
+                raise RuntimeError(
+                    f"VOTable {tag} serialisation is not supported; "
+                    "request TABLEDATA output"
+                )
+            continue
+
+        if tag == "INFO" and element.get("name") == "QUERY_STATUS":
+            status = element.get("value")
+            if status == "ERROR":
+                raise RuntimeError(
+                    f"Query failed: {(element.text or '').strip() or 'unknown error'}"
+                )
+            if status == "OVERFLOW":
+                warn("Query result was truncated by the service (OVERFLOW)")
+        elif not in_table:
+            continue
+        elif tag == "FIELD":
+            fields.append(
+                (element.get("name"), element.get("datatype"), element.get("arraysize"))
+            )
+        elif tag == "TD" and row is not None:
+            row.append(element.text)
+        elif tag == "TR" and row is not None:
+            rows.append(row)
+            row = None
+            if len(rows) >= chunk_size:
+                yield _to_frame(fields, rows)
+                chunks += 1
+                rows = []
+                tabledata.clear()
+        elif tag == "TABLE":
+            in_table, done = False, True
+            # Only an empty table ends with an empty chunk
+            if rows or not chunks:
+                yield _to_frame(fields, rows)
+            tabledata = None
+            rows = []
+            element.clear()
+
+
+def _to_frame(fields, rows):
+    names = [name for name, _, _ in fields]
+    frame = pd.DataFrame.from_records(rows, columns=names) if rows else pd.DataFrame(
+        {name: pd.Series(dtype=object) for name in names}
+    )
+    for name, datatype, arraysize in fields:
+        scalar = arraysize in (None, "1")
+        column = frame[name]
+        if datatype in _INTEGER_TYPES and scalar:
+            frame[name] = pd.to_numeric(column, errors="coerce").astype("Int64")
+        elif datatype in _FLOAT_TYPES and scalar:
+            frame[name] = pd.to_numeric(column, errors="coerce").astype("float64")
+        elif datatype == "boolean" and scalar:
+            frame[name] = column.map(_boolean).astype("boolean")
+    return frame
+
+
+def _boolean(text):
+    if text is None:
+        return None
+    text = text.strip().lower()
+    if text in ("t", "true", "1"):
+        return True
+    if text in ("f", "false", "0"):
+        return False
+    return None
+
+
+def read_votable(source: Union[str, IO[bytes]]) -> pd.DataFrame:
+    """Parse the first table of a VOTable into a single DataFrame; a
+    document without a table gives an empty DataFrame."""
+    chunks = list(iter_votable(source))
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
+
+
+def write_votable(
+    frame: pd.DataFrame,
+    target: Union[str, IO[bytes], None] = None,
+    table_name: str = "table",
+    serialization: str = "tabledata",
+) -> Optional[bytes]:
+    """Write a DataFrame as a VOTable 1.3 document.
+
+    Parameters
+    ----------
+    frame : pd.DataFrame
+        Table to write; the index is not written.
+    target : Union[str, IO[bytes], None]
+        Path or binary file-like object; if `None` the document is returned.
+    table_name : str
+        Name of the table.
+    serialization : str
+        `"tabledata"` for rows of XML elements, readable by every VOTable
+        parser including `iter_votable`, or `"binary2"` for base64-encoded
+        binary rows, which are smaller and faster to parse for clients such
+        as TOPCAT and Aladin.
+
+    Returns
+    -------
+    Optional[bytes]
+        The document if `target` is `None`.
+
+    """
+    if serialization not in ("tabledata", "binary2"):
+        raise ValueError(f"Unknown VOTable serialisation {serialization!r}")
+    if target is None:
+        buffer = io.BytesIO()
+        write_votable(frame, buffer, table_name, serialization)
+        return buffer.getvalue()
+    if isinstance(target, str):
+        with open(target, "wb") as stream:
+            write_votable(frame, stream, table_name, serialization)
+        return None
+
+    kinds = [_datatype(frame[column]) for column in frame.columns]
+    write = target.write
+    write(
+        b'<?xml version="1.0" encoding="UTF-8"?>\n'
+        b'<VOTABLE version="1.3" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">\n'
+        b"<RESOURCE><TABLE name=" + quoteattr(table_name).encode() + b">\n"
+    )
+    for column, (datatype, arraysize) in zip(frame.columns, kinds):
+        size = f' arraysize="{arraysize}"' if arraysize else ""
+        write(
+            f"<FIELD name={quoteattr(str(column))} datatype=\"{datatype}\"{size}/>\n".encode()
+        )
+    if serialization == "binary2":
+        write(b'<DATA><BINARY2><STREAM encoding="base64">\n')
+        _write_binary2(frame, kinds, write)
+        write(b"</STREAM></BINARY2></DATA>\n</TABLE></RESOURCE>\n</VOTABLE>\n")
+        return None
+    write(b"<DATA><TABLEDATA>\n")
+    for values in frame.itertuples(index=False, name=None):
+        cells = "".join(f"<TD>{_cell(value)}</TD>" for value in values)
+        write(f"<TR>{cells}</TR>\n".encode())
+    write(b"</TABLEDATA></DATA>\n</TABLE></RESOURCE>\n</VOTABLE>\n")
+    return None
+
+
+def _datatype(column):
+    dtype = column.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return "boolean", None
+    if pd.api.types.is_integer_dtype(dtype):
+        return "long", None
+    if pd.api.types.is_float_dtype(dtype):
+        return "double", None
+    if all(str(value).isascii() for value in column if not _is_null(value)):
+        return "char", "*"
+    # `char` is ASCII only; other text is written as UCS-2
+    return "unicodeChar", "*"
+
+
+def _is_null(value):
+    return value is None or value is pd.NA or (
+        isinstance(value, (float, np.floating)) and math.isnan(value)
+    )
+
+
+_LONG = struct.Struct(">q")
+_DOUBLE = struct.Struct(">d")
+_LENGTH = struct.Struct(">I")
+
+
+def _pack_text(value, encoding, width):
+    data = str(value).encode(encoding)
+    return _LENGTH.pack(len(data) // width) + data
+
+
+# Big-endian encoders of the BINARY2 serialisation by datatype, and the
+# bytes written for a null value, whose flag is set in the row header
+_BINARY2 = {
+    "boolean": (lambda value: b"T" if value else b"F", b"?"),
+    "long": (lambda value: _LONG.pack(int(value)), _LONG.pack(0)),
+    "double": (lambda value: _DOUBLE.pack(float(value)), _DOUBLE.pack(math.nan)),
+    "char": (lambda value: _pack_text(value, "ascii", 1), _LENGTH.pack(0)),
+    "unicodeChar": (lambda value: _pack_text(value, "utf-16-be", 2), _LENGTH.pack(0)),
+}
+
+# Bytes of binary data per base64 line of 76 characters
+_BASE64_LINE = 57
+
+
+def _write_binary2(frame, kinds, write, buffer_size=1 << 16):
+    # Every row starts with a bit mask flagging its null cells, most
+    # significant bit first
+    encoders = [_BINARY2[datatype] for datatype, _ in kinds]
+    mask_size = (len(encoders) + 7) // 8
+    top_bit = 8 * mask_size - 1
+    buffer = bytearray()
+    for values in frame.itertuples(index=False, name=None):
+        mask, cells = 0, []
+        for index, (value, (encode, null)) in enumerate(zip(values, encoders)):
+            if _is_null(value):
+                mask |= 1 << (top_bit - index)
+                cells.append(null)
+            else:
+                cells.append(encode(value))
+        buffer += mask.to_bytes(mask_size, "big")
+        buffer += b"".join(cells)
+        if len(buffer) >= buffer_size:
+            end = len(buffer) - len(buffer) % _BASE64_LINE
+            write(base64.encodebytes(bytes(buffer[:end])))
+            del buffer[:end]
+    write(base64.encodebytes(bytes(buffer)))
+
+
+def _cell(value):
+    if value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, (bool, np.bool_)):
+        return "T" if value else "F"
+    if isinstance(value, (float, np.floating)):
+        return repr(float(value))
+    return escape(str(value))
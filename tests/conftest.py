@@ -0,0 +1,32 @@
+import inspect
+
+import pytest
+
+from shopping_client.session import make_session
+
+
+@pytest.fixture
+def connect():
+    """Factory `connect(cls, **kwargs)` creating clients and connectors that
+    talk to the stand-in servers.
+
+    Constructors that take a `session` get one that retries without backing
+    off, unless one is given. Everything created is closed after the test.
+    """
+    created, sessions = [], []
+
+    def create(cls, **kwargs):
+        if "session" in inspect.signature(cls).parameters:
+            if "session" not in kwargs:
+                kwargs["session"] = make_session(backoff_factor=0)
+                sessions.append(kwargs["session"])
+        instance = cls(**kwargs)
+        created.append(instance)
+        return instance
+
+    yield create
+    for instance in created:
+        if hasattr(instance, "close"):
+            instance.close()
+    for session in sessions:
+        session.close()
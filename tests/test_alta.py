@@ -0,0 +1,56 @@
+import pytest
+
+from alta import alta_connector
+from alta.metadata_cache import metadata_cache
+from alta.testing import alta_server
+
+DATAPRODUCTS = [dict(PID=f"dp{i}", RA=float(i), dataProductType="image") for i in range(120)]
+
+
+def items(n):
+    return [dict(archive="apertif", catalog="dataproducts", PID=f"dp{i}") for i in range(n)]
+
+
+def test_enrich_batches_lookups(connect):
+    with alta_server(dataproducts=DATAPRODUCTS, page_size=25) as server:
+        alta = connect(alta_connector, host=server.url, cache=None, batch_size=50)
+        frame = alta.enrich(items(120) + items(10))
+    assert len(frame) == 130
+    assert frame["alta.RA"].tolist() == [float(i) for i in range(120)] + list(range(10))
+    # Batches of 50, 50 and 20 identifiers in pages of at most 25 records
+    assert len(server.requests) == 5
+    assert all("PID__in=" in path for path in server.requests)
+
+
+def test_enrich_missing_records(connect):
+    with alta_server(dataproducts=DATAPRODUCTS[:1]) as server:
+        frame = connect(alta_connector, host=server.url, cache=None).enrich(items(2))
+    assert frame["alta.RA"].iloc[0] == 0.0
+    assert frame["alta.RA"].isna().iloc[1]
+
+
+def test_cached_metadata_makes_no_requests(tmp_path, connect):
+    cache = metadata_cache(str(tmp_path / "metadata.sqlite"))
+    with alta_server(dataproducts=DATAPRODUCTS) as server:
+        first = connect(alta_connector, host=server.url, cache=cache).enrich(items(20))
+        requests = len(server.requests)
+        second = connect(alta_connector, host=server.url, cache=cache).enrich(items(20))
+    assert requests == 1
+    assert len(server.requests) == requests
+    assert second.equals(first)
+
+
+def test_failed_lookup_is_retried(connect):
+    with alta_server(dataproducts=DATAPRODUCTS, fail=1) as server:
+        alta = connect(alta_connector, host=server.url, cache=None)
+        metadata = alta.fetch_metadata(items(3))
+    assert len(server.requests) == 2
+    assert metadata[("dataproducts", "dp2")]["RA"] == 2.0
+
+
+def test_failed_lookup_warns(connect):
+    with alta_server(dataproducts=DATAPRODUCTS, fail=10) as server:
+        with pytest.warns(UserWarning, match="ALTA lookup"):
+            alta = connect(alta_connector, host=server.url, cache=None)
+            metadata = alta.fetch_metadata(items(3))
+    assert metadata == {}
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from alta import alta_connector
+from rucio_cli import rucio_connector
+from shopping_client.arrow import connector_schema, records_to_table
+
+
+def rucio_item(**fields):
+    return dict(dict(archive="rucio", scope="user.jdoe", name="a.fits"), **fields)
+
+
+def test_records_follow_the_connector_schema():
+    records = [rucio_item(bytes=10, rse="RSE_A"), rucio_item(bytes=20, owner="jdoe")]
+    table = records_to_table(records, connector_schema(rucio_connector))
+    assert table.schema == connector_schema(rucio_connector)
+    assert table.column("bytes").to_pylist() == [10, 20]
+    assert table.column("rse").to_pylist() == ["RSE_A", None]
+    assert table.column("extra").to_pylist() == [None, '{"owner":"jdoe"}']
+
+
+@pytest.mark.parametrize("value", [2 ** 70, -(2 ** 63) - 1, True, "many", 2.5])
+def test_values_that_do_not_fit_go_to_extra(value):
+    records = [rucio_item(bytes=10), rucio_item(bytes=value)]
+    table = records_to_table(records, connector_schema(rucio_connector))
+    assert table.column("bytes").to_pylist() == [10, None]
+    extra = table.column("extra").to_pylist()
+    assert extra[0] is None
+    assert json.loads(extra[1]) == dict(bytes=value)
+
+
+def test_integral_float_fits_int_column():
+    records = [rucio_item(bytes=10), rucio_item(bytes=20.0)]
+    table = records_to_table(records, connector_schema(rucio_connector))
+    assert table.column("bytes").to_pylist() == [10, 20]
+    assert table.column("extra").to_pylist() == [None, None]
+
+
+def test_boolean_coordinate_goes_to_extra():
+    records = [
+        dict(archive="apertif", PID="dp0", RA=1.5),
+        dict(archive="apertif", PID="dp1", RA=True),
+    ]
+    table = records_to_table(records, connector_schema(alta_connector))
+    assert table.column("RA").to_pylist() == [1.5, None]
+    assert table.column("extra").to_pylist() == [None, '{"RA":true}']
@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+from rucio_cli import rucio_connector
+from rucio_cli.testing import rucio_server
+
+FILES = {
+    ("user.jdoe", "a.fits"): os.urandom(5000),
+    ("user.jdoe", "b.fits"): os.urandom(7000),
+}
+
+
+def items(files=FILES):
+    return [dict(archive="rucio", scope=scope, name=name) for scope, name in files]
+
+
+def check_downloaded(paths, directory, files=FILES):
+    assert sorted(paths) == sorted(f"{scope}:{name}" for scope, name in files)
+    for (scope, name), data in files.items():
+        path = paths[f"{scope}:{name}"]
+        assert path == os.path.join(str(directory), scope, name)
+        with open(path, "rb") as f:
+            assert f.read() == data
+
+
+def storage_requests(server, rse):
+    return [path for method, path in server.requests if path.startswith(f"/rse/{rse}/")]
+
+
+def test_download(tmp_path, connect):
+    with rucio_server(FILES) as server:
+        rucio = connect(rucio_connector, host=server.url)
+        paths, errors = rucio.download(items(), str(tmp_path))
+    assert errors == {}
+    check_downloaded(paths, tmp_path)
+    assert [method for method, _ in server.requests].count("POST") == 1
+    assert storage_requests(server, "RSE_B") == []
+
+
+@pytest.mark.parametrize("fault", ["corrupt", "unavailable"])
+def test_download_fails_over(tmp_path, fault, connect):
+    with rucio_server(FILES, **{fault: ["RSE_A"]}) as server:
+        rucio = connect(rucio_connector, host=server.url)
+        paths, errors = rucio.download(items(), str(tmp_path))
+    assert errors == {}
+    check_downloaded(paths, tmp_path)
+    assert len(storage_requests(server, "RSE_B")) == len(FILES)
+
+
+def test_download_resumes_dropped_transfer(tmp_path, connect):
+    with rucio_server(FILES, drop_after=1000) as server:
+        paths, errors = connect(rucio_connector, host=server.url).download(
+            items(), str(tmp_path), max_attempts=2
+        )
+    assert errors == {}
+    check_downloaded(paths, tmp_path)
+    ranges = [headers.get("Range") for headers in server.request_headers]
+    assert ranges.count("bytes=1000-") == len(FILES)
+    assert all(
+        headers.get("Accept-Encoding") == "identity"
+        for (method, _), headers in zip(server.requests, server.request_headers)
+        if method == "GET"
+    )
+    assert storage_requests(server, "RSE_B") == []
+
+
+def test_download_reports_files_without_good_replica(tmp_path, connect):
+    with rucio_server(FILES, corrupt=["RSE_A", "RSE_B"]) as server:
+        rucio = connect(rucio_connector, host=server.url)
+        paths, errors = rucio.download(items(), str(tmp_path))
+    assert paths == {}
+    assert sorted(errors) == sorted(f"{scope}:{name}" for scope, name in FILES)
+    assert all(isinstance(e, RuntimeError) for e in errors.values())
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names]
+
+
+def test_token_is_not_sent_to_storage(tmp_path, connect):
+    with rucio_server(FILES) as server:
+        rucio = connect(rucio_connector, host=server.url, token=lambda: "secret")
+        paths, errors = rucio.download(
+            items(), str(tmp_path), storage_headers={"Authorization": "Bearer storage"}
+        )
+    assert errors == {}
+    for (method, _), headers in zip(server.requests, server.request_headers):
+        if method == "POST":
+            assert headers.get("X-Rucio-Auth-Token") == "secret"
+            assert "Authorization" not in headers
+        else:
+            assert "X-Rucio-Auth-Token" not in headers
+            assert headers.get("Authorization") == "Bearer storage"
+
+
+@pytest.mark.parametrize("name", ["../../escaped.fits", "/tmp/escaped.fits"])
+def test_download_stays_in_directory(tmp_path, name, connect):
+    files = {("user.jdoe", name): b"data"}
+    directory = tmp_path / "data"
+    with rucio_server(files) as server:
+        rucio = connect(rucio_connector, host=server.url)
+        paths, errors = rucio.download(items(files), str(directory))
+    assert paths == {}
+    assert isinstance(errors[f"user.jdoe:{name}"], RuntimeError)
+    assert not os.path.exists(tmp_path / "escaped.fits")
+    assert not [path for _, path in server.requests if path.startswith("/rse/")]
@@ -0,0 +1,108 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+import requests
+
+from samp import samp_connector
+from samp.testing import samp_hub
+
+TABLE = pd.DataFrame(dict(name=["a", "b", "c"], ra=[1.0, 2.0, 3.0], n=[1, 2, 3]))
+
+
+def check_votable(content, table):
+    # Tables are sent as BINARY2, which only astropy reads
+    assert b"<BINARY2>" in content
+    votable = pytest.importorskip("astropy.io.votable")
+    frame = votable.parse_single_table(io.BytesIO(content)).to_table().to_pandas()
+    assert frame["ra"].tolist() == table["ra"].tolist()
+    assert frame["n"].tolist() == table["n"].tolist()
+
+
+@pytest.fixture
+def connector(tmp_path, connect):
+    def create(**kwargs):
+        return connect(
+            samp_connector,
+            lockfile=str(tmp_path / "samp"),
+            directory=str(tmp_path / "tables"),
+            **kwargs,
+        )
+
+    return create
+
+
+def test_send_table(tmp_path, connector):
+    with samp_hub(str(tmp_path / "samp")) as hub:
+        topcat = hub.add_receiver("topcat", ["table.load.*"])
+        aladin = hub.add_receiver("aladin", ["image.load.fits"])
+        samp = connector()
+        assert samp.send_table(TABLE, name="basket") == [topcat]
+        assert samp.send_table(TABLE) == [topcat]
+    assert hub.received[aladin] == []
+    first, second = hub.received[topcat]
+    assert first["samp.mtype"] == "table.load.votable"
+    assert first["samp.params"]["name"] == "basket"
+    # The same table is exported once and sent by reference
+    assert second["samp.params"]["url"] == first["samp.params"]["url"]
+    assert len(os.listdir(tmp_path / "tables")) == 1
+
+    response = requests.get(first["samp.params"]["url"])
+    response.raise_for_status()
+    check_votable(response.content, TABLE)
+
+
+def test_send_table_without_hub(connector):
+    with pytest.raises(RuntimeError, match="No SAMP hub found"):
+        connector().send_table(TABLE)
+
+
+def test_send_table_to_unsubscribed_client(tmp_path, connector):
+    with samp_hub(str(tmp_path / "samp")) as hub:
+        aladin = hub.add_receiver("aladin", ["image.load.fits"])
+        with pytest.raises(RuntimeError, match="SAMP hub refused"):
+            connector().send_table(TABLE, recipient=aladin)
+    assert hub.messages == []
+
+
+def test_send_table_after_hub_restart(tmp_path, connector):
+    samp = connector()
+    with samp_hub(str(tmp_path / "samp")) as hub:
+        hub.add_receiver("topcat", ["table.load.votable"])
+        samp.send_table(TABLE)
+    with pytest.raises(RuntimeError, match="Lost the connection"):
+        samp.send_table(TABLE)
+    with samp_hub(str(tmp_path / "samp")) as hub:
+        topcat = hub.add_receiver("topcat", ["table.load.votable"])
+        assert samp.send_table(TABLE) == [topcat]
+
+
+def test_oversized_table_is_kept(tmp_path, connector):
+    with samp_hub(str(tmp_path / "samp")) as hub:
+        topcat = hub.add_receiver("topcat", ["table.load.votable"])
+        samp = connector(max_cache_size=1)
+        with pytest.warns(UserWarning, match="exceeds max_cache_size"):
+            samp.send_table(TABLE.head(1))
+        with pytest.warns(UserWarning, match="exceeds max_cache_size"):
+            samp.send_table(TABLE)
+    old, new = (message["samp.params"]["url"] for message in hub.received[topcat])
+    assert requests.get(old).status_code == 404
+    response = requests.get(new)
+    assert response.status_code == 200
+    check_votable(response.content, TABLE)
+
+
+def test_only_sent_tables_are_served(tmp_path, connector):
+    with samp_hub(str(tmp_path / "samp")) as hub:
+        topcat = hub.add_receiver("topcat", ["table.load.votable"])
+        connector().send_table(TABLE)
+    url = hub.received[topcat][0]["samp.params"]["url"]
+    assert requests.get(url).status_code == 200
+    (tmp_path / "tables" / "other.vot").write_bytes(b"<VOTABLE/>")
+    prefix, _, name = url.rpartition("/")
+    root = prefix.rpartition("/")[0]
+    assert requests.get(prefix + "/").status_code == 404
+    assert requests.get(prefix + "/other.vot").status_code == 404
+    assert requests.get(root + "/").status_code == 404
+    assert requests.get(f"{root}/{name}").status_code == 404
@@ -0,0 +1,196 @@
+import asyncio
+import json
+
+import pandas as pd
+import pytest
+import requests
+
+from shopping_client import basket_cache, basket_sync, get_connector, shopping_client
+from shopping_client.compression import ACCEPT_ENCODING
+from shopping_client.testing import user_profile_server
+
+
+@pytest.fixture
+def client(connect):
+    def create(server, user="jdoe", token=None, **kwargs):
+        token = token or server.issue_token(user)
+        return connect(shopping_client, token=token, host=server.url, **kwargs)
+
+    return create
+
+
+def item_ids(basket):
+    return [item["id"] for item in basket]
+
+
+def test_get_basket_follows_pages(client):
+    with user_profile_server(basket_size=250, page_size=100) as server:
+        basket = client(server).get_basket()
+    assert item_ids(basket) == list(range(250))
+    assert json.loads(basket[0]["item_data"])["name"] == "jdoe-item-0"
+    assert server.statuses == {200: 3}
+
+
+def test_cached_basket_is_revalidated(tmp_path, client):
+    cache = basket_cache(str(tmp_path))
+    with user_profile_server(basket_size=250, page_size=100) as server:
+        first = client(server, cache=cache).get_basket()
+        second = client(server, cache=cache).get_basket()
+    assert second == first
+    assert server.statuses == {200: 3, 304: 3}
+
+
+def test_expired_token_is_rejected(client):
+    with user_profile_server() as server:
+        token = server.issue_token("jdoe", lifetime=-1)
+        sc = client(server, token=token, client_validate_token=False)
+        with pytest.raises(requests.HTTPError) as error:
+            list(sc.iter_basket())
+        with pytest.warns(UserWarning, match="is your key valid"):
+            assert sc.get_basket() is None
+    assert error.value.response.status_code == 401
+    assert server.statuses == {401: 2}
+
+
+def test_token_from_jupyterhub(monkeypatch, client):
+    with user_profile_server(basket_size=10) as server:
+        monkeypatch.setenv("JUPYTERHUB_API_URL", server.hub_api_url)
+        monkeypatch.setenv("JUPYTERHUB_API_TOKEN", "jdoe")
+        expired = server.issue_token("jdoe", lifetime=-1)
+        with client(server, token=expired) as sc:
+            assert item_ids(sc.get_basket()) == list(range(10))
+    assert server.tokens_issued == 2
+
+
+def test_unavailable_pages_are_retried(client):
+    with user_profile_server(basket_size=500, page_size=50, error_rate=0.3) as server:
+        basket = client(server).get_basket()
+    assert item_ids(basket) == list(range(500))
+    assert server.statuses[503] > 0
+    assert server.statuses[200] == 10
+
+
+
+class samp_items:
+    # Connector written against the original contract, without
+    # `return_loaded` or `loads_basket_items`
+    name = "samp_items"
+    archive = "samp"
+
+    def validate_basket_item(self, item):
+        return json.loads(item["item_data"])["archive"] == self.archive
+
+    def basket_item_to_pandas(self, item):
+        return pd.Series(json.loads(item["item_data"]))
+
+
+def test_basket_conversion_with_plain_connector(client):
+    with user_profile_server(basket_size=20) as server:
+        sc = client(server, connectors=["apertif", samp_items()])
+        frames = sc.get_basket(convert_to_pandas=True)
+    assert list(frames["alta"]["id"]) == [0, 5, 10, 15]
+    assert list(frames["samp_items"]["id"]) == [3, 8, 13, 18]
+    assert frames["samp_items"]["ra"].dtype == float
+
+
+class basket_source:
+    # Stands in for the client of a `basket_sync`
+    def __init__(self, connectors, items):
+        self.connectors = connectors
+        self.items = items
+        self.basket = None
+
+    def iter_basket(self):
+        return iter(list(self.items))
+
+
+def apertif_item(i, **data):
+    data = dict(dict(archive="apertif", PID=f"dp{i}", RA=float(i)), **data)
+    return dict(id=i, item_data=json.dumps(data))
+
+
+def test_sync_applies_deltas_to_frames():
+    source = basket_source([get_connector("apertif")()], [apertif_item(i) for i in range(5)])
+    sync = basket_sync(source)
+    assert len(sync.sync().added) == 5
+    first = sync.frames["alta"]
+    assert first.index.tolist() == ["0", "1", "2", "3", "4"]
+
+    source.items = [apertif_item(i) for i in (0, 1, 3, 4, 5)]
+    source.items[1] = apertif_item(1, RA=10.0)
+    delta = sync.sync()
+    assert (len(delta.added), len(delta.removed), len(delta.changed)) == (1, 1, 1)
+    frame = sync.frames["alta"]
+    assert frame.index.tolist() == ["0", "1", "3", "4", "5"]
+    assert frame["RA"].tolist() == [0.0, 10.0, 3.0, 4.0, 5.0]
+    assert frame["RA"].dtype == float
+    assert isinstance(frame["archive"].dtype, pd.CategoricalDtype)
+    assert not sync.sync()
+    assert sync.frames["alta"] is frame
+
+    # Rows of changed items are overwritten without rebuilding the frame
+    source.items[2] = apertif_item(3, RA=30.0)
+    assert len(sync.sync().changed) == 1
+    assert sync.frames["alta"] is frame
+    assert frame["RA"].tolist() == [0.0, 10.0, 30.0, 4.0, 5.0]
+
+
+def test_async_fetch_is_not_held_up_by_slow_consumer():
+    pytest.importorskip("aiohttp")
+    from shopping_client import async_shopping_client
+
+    async def fetch(server):
+        semaphore = asyncio.Semaphore(1)
+        clients = [
+            async_shopping_client(
+                token=server.issue_token(user), host=server.url, semaphore=semaphore
+            )
+            for user in ("jdoe", "asmith")
+        ]
+        other_done = asyncio.Event()
+
+        async def slow_consumer():
+            ids = []
+            async for item in clients[0].iter_basket():
+                ids.append(item["id"])
+                await other_done.wait()
+            return ids
+
+        async def other():
+            basket = await clients[1].get_basket()
+            other_done.set()
+            return basket
+
+        try:
+            results = await asyncio.wait_for(asyncio.gather(slow_consumer(), other()), 10)
+            # No requests session is needed without the JupyterHub token source
+            assert all(async_client._session is None for async_client in clients)
+            return results
+        finally:
+            for async_client in clients:
+                await async_client.close()
+
+    with user_profile_server(basket_size=30, page_size=10) as server:
+        ids, basket = asyncio.run(fetch(server))
+    assert ids == list(range(30))
+    assert item_ids(basket) == list(range(30))
+
+
+def test_sync_and_async_clients_accept_compressed_pages(client):
+    pytest.importorskip("aiohttp")
+    from shopping_client import async_shopping_client
+
+    async def fetch(server):
+        async_client = async_shopping_client(token=server.issue_token("jdoe"), host=server.url)
+        try:
+            return await async_client.get_basket()
+        finally:
+            await async_client.close()
+
+    with user_profile_server(basket_size=30, page_size=10, compress=True) as server:
+        basket = client(server).get_basket()
+        async_basket = asyncio.run(fetch(server))
+    assert item_ids(basket) == item_ids(async_basket) == list(range(30))
+    assert server.encodings == {"gzip": 6}
+    # Both clients advertise the codings urllib3 can decode
+    assert server.accept_encodings == {ACCEPT_ENCODING: 6}
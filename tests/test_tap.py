@@ -0,0 +1,109 @@
+import io
+
+import pandas as pd
+import pytest
+
+from astron_vo import astron_vo_connector
+from astron_vo.testing import tap_server
+from shopping_client.votable import read_votable
+
+OBSCORE = pd.DataFrame(
+    dict(
+        obs_id=[f"obs-{i}" for i in range(10)],
+        s_ra=[10.0 * i for i in range(10)],
+        s_dec=[0.0] * 10,
+        calib_level=list(range(10)),
+    )
+)
+
+
+def test_run_query(connect):
+    with tap_server({"ivoa.obscore": OBSCORE}) as server:
+        vo = connect(astron_vo_connector, service=server.url, poll_interval=0.01)
+        result = vo.run_query("SELECT TOP 3 * FROM ivoa.obscore")
+    assert result["obs_id"].tolist() == ["obs-0", "obs-1", "obs-2"]
+    assert result["s_ra"].tolist() == [0.0, 10.0, 20.0]
+    # The job is deleted once the result has been read
+    assert server.jobs == {}
+
+
+@pytest.mark.parametrize("run_on_create", [True, False])
+def test_pending_job_is_started(run_on_create, connect):
+    with tap_server({"ivoa.obscore": OBSCORE}, run_on_create=run_on_create) as server:
+        vo = connect(
+            astron_vo_connector, service=server.url, poll_interval=0.01, job_timeout=5
+        )
+        result = vo.run_query("SELECT TOP 0 * FROM ivoa.obscore")
+    assert len(result) == 0
+    assert list(result.columns) == list(OBSCORE.columns)
+
+
+def test_votable_without_table():
+    document = (
+        b'<VOTABLE version="1.3"><RESOURCE type="results">'
+        b'<INFO name="QUERY_STATUS" value="OK"/></RESOURCE></VOTABLE>'
+    )
+    assert read_votable(io.BytesIO(document)).empty
+
+
+def test_iter_query_chunks(connect):
+    with tap_server({"ivoa.obscore": OBSCORE}) as server:
+        vo = connect(
+            astron_vo_connector, service=server.url, poll_interval=0.01, chunk_size=4
+        )
+        chunks = list(vo.iter_query("SELECT * FROM ivoa.obscore"))
+        exact = list(vo.iter_query("SELECT TOP 8 * FROM ivoa.obscore"))
+        empty = list(vo.iter_query("SELECT TOP 0 * FROM ivoa.obscore"))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert pd.concat(chunks, ignore_index=True)["calib_level"].tolist() == list(range(10))
+    assert [len(chunk) for chunk in exact] == [4, 4]
+    assert [len(chunk) for chunk in empty] == [0]
+    assert list(empty[0].columns) == list(OBSCORE.columns)
+
+
+@pytest.mark.parametrize(
+    "query, message",
+    [
+        ("SELECT * FROM ivoa.obscore WHERE ERROR", "Query failed on request"),
+        ("SELECT * FROM ivoa.missing", "Table ivoa.missing does not exist"),
+    ],
+)
+def test_failed_job(query, message, connect):
+    with tap_server({"ivoa.obscore": OBSCORE}) as server:
+        with pytest.raises(RuntimeError, match=message):
+            vo = connect(astron_vo_connector, service=server.url, poll_interval=0.01)
+            vo.run_query(query)
+    assert server.jobs == {}
+
+
+def test_job_timeout(connect):
+    with tap_server({"ivoa.obscore": OBSCORE}, executing_polls=10 ** 6) as server:
+        with pytest.raises(RuntimeError):
+            vo = connect(
+                astron_vo_connector, service=server.url, poll_interval=0.01, job_timeout=0.1
+            )
+            vo.run_query("SELECT * FROM ivoa.obscore")
+    assert server.jobs == {}
+
+
+def test_run_queries_combines_cone_searches(connect):
+    items = [
+        dict(archive="astron_vo", s_ra=0.0, s_dec=0.0, radius=1.0),
+        dict(archive="astron_vo", s_ra=20.0, s_dec=0.0, radius=10.5),
+        dict(archive="astron_vo", query="SELECT TOP 1 * FROM ivoa.obscore"),
+        dict(archive="astron_vo", query="SELECT * FROM ivoa.obscore WHERE ERROR"),
+        dict(archive="astron_vo", name="neither a query nor a position"),
+    ]
+    with tap_server({"ivoa.obscore": OBSCORE}) as server:
+        vo = connect(astron_vo_connector, service=server.url, poll_interval=0.01)
+        results, errors = vo.run_queries(items)
+    assert sorted(results) == [0, 1, 2]
+    assert sorted(errors) == [3, 4]
+    assert isinstance(errors[3], RuntimeError)
+    assert isinstance(errors[4], ValueError)
+    assert results[0]["obs_id"].tolist() == ["obs-0"]
+    assert results[1]["obs_id"].tolist() == ["obs-1", "obs-2", "obs-3"]
+    assert len(results[2]) == 1
+    # One job for both cone searches and one per query
+    assert len(server.queries) == 3
+    assert sum("TAP_UPLOAD" in query for query in server.queries) == 1
@@ -0,0 +1,212 @@
+import bz2
+import gzip
+import json
+import sys
+import time
+import warnings
+
+import pandas as pd
+import pytest
+
+from shopping_client.basket_item import basket_item
+from zooniverse import zooniverse
+from zooniverse.testing import panoptes_server
+
+zooniverse_module = sys.modules[zooniverse.__module__]
+
+ITEM = dict(
+    item_data=json.dumps(
+        dict(archive="zooniverse", catalog="project", project_id=1, category="subjects")
+    )
+)
+
+
+def export_csv(n, offset=0):
+    frame = pd.DataFrame(
+        dict(
+            subject_id=range(offset, offset + n),
+            metadata=[json.dumps(dict(session=f"s{i % 3}", size=i)) for i in range(n)],
+            locations=[json.dumps({"0": f"https://example.org/{i}.png"}) for i in range(n)],
+        )
+    )
+    return frame.to_csv(index=False).encode()
+
+
+@pytest.fixture
+def panoptes(monkeypatch):
+    def start(**kwargs):
+        server = panoptes_server(**kwargs).start()
+        servers.append(server)
+        monkeypatch.setattr(zooniverse_module, "Panoptes", server.Panoptes)
+        monkeypatch.setattr(zooniverse, "entity_types", server.entity_types)
+        return server
+
+    servers = []
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def connector(connect):
+    def create(**kwargs):
+        return connect(zooniverse, username="jdoe", password="secret", **kwargs)
+
+    return create
+
+
+def test_lru_ttl_cache(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = zooniverse_module._lru_ttl_cache(maxsize=2, ttl=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    # "b" is now the least recently used entry
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    now[0] = 11.0
+    assert cache.get("a") is None
+
+
+def test_lookups_are_cached_until_they_expire(monkeypatch, panoptes, connector):
+    now = [0.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    server = panoptes()
+    server.add_export("project", 1, "subjects", export_csv(10))
+    zc = connector(cache_ttl=60)
+    assert len(zc.retrieve(ITEM)) == 10
+    assert len(zc.retrieve(ITEM)) == 10
+    assert server.calls == {"find": 1, "describe_export": 1}
+    now[0] = 61.0
+    zc.retrieve(ITEM)
+    assert server.calls == {"find": 2, "describe_export": 2}
+
+
+def test_chunked_retrieve_pushes_down_rows_and_columns(panoptes, connector):
+    server = panoptes()
+    server.add_export("project", 1, "subjects", export_csv(100))
+    data = connector().retrieve(
+        ITEM,
+        chunked_retrieve=True,
+        chunk_size=7,
+        skiprows=5,
+        nrows=10,
+        usecols=["subject_id", "metadata"],
+        where=lambda chunk: chunk["subject_id"] % 2 == 0,
+    )
+    assert data["subject_id"].tolist() == list(range(6, 26, 2))
+    assert list(data.columns) == ["subject_id", "metadata"]
+    assert data["metadata"][0] == dict(session="s0", size=6)
+
+
+def test_iter_retrieve_stops_after_nrows(panoptes, connector):
+    server = panoptes()
+    server.add_export("project", 1, "subjects", export_csv(100))
+    chunks = list(connector().iter_retrieve(ITEM, chunk_size=4, nrows=10))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert pd.concat(chunks)["subject_id"].tolist() == list(range(10))
+
+
+@pytest.mark.parametrize("compress", [gzip.compress, bz2.compress])
+def test_compressed_export_is_sniffed(tmp_path, panoptes, connector, compress):
+    server = panoptes()
+    server.add_export("project", 1, "subjects", compress(export_csv(50)))
+    zc = connector()
+    data = zc.retrieve(ITEM)
+    assert data["subject_id"].tolist() == list(range(50))
+    assert data["locations"][1] == {"0": "https://example.org/1.png"}
+    chunks = list(zc.iter_retrieve(ITEM, chunk_size=20))
+    assert [len(chunk) for chunk in chunks] == [20, 20, 10]
+    downloaded = zc.retrieve(ITEM, download_to=str(tmp_path / "subjects.csv"))
+    assert downloaded["metadata"].tolist() == data["metadata"].tolist()
+
+
+def test_json_column_modes(panoptes, connector):
+    server = panoptes()
+    server.add_export("project", 1, "subjects", export_csv(30))
+    zc = connector()
+    eager = zc.retrieve(ITEM)
+    batch = zc.retrieve(ITEM, json_columns="batch")
+    assert batch["metadata"].tolist() == eager["metadata"].tolist()
+    assert batch["locations"].tolist() == eager["locations"].tolist()
+
+    lazy = zc.retrieve(ITEM, json_columns="lazy", extract={"metadata": ["size"]})
+    assert isinstance(lazy["metadata"][0], str)
+    assert lazy["metadata"].json.get("session").tolist() == [f"s{i % 3}" for i in range(30)]
+    assert lazy["metadata.size"].dtype == "int64"
+    assert lazy["metadata.size"].tolist() == list(range(30))
+
+
+def test_export_cache_is_hit_and_invalidated(tmp_path, panoptes, connector):
+    pytest.importorskip("pyarrow")
+    from zooniverse.export_cache import export_cache
+
+    cache = export_cache(str(tmp_path))
+    server = panoptes()
+    server.add_export("project", 1, "subjects", export_csv(20))
+    first = connector(export_cache=cache).retrieve(ITEM)
+    second = connector(export_cache=cache).retrieve(ITEM, usecols=["subject_id", "metadata"])
+    assert len(server.requests) == 1
+    assert list(second.columns) == ["subject_id", "metadata"]
+    assert second["metadata"].tolist() == first["metadata"].tolist()
+
+    # A regenerated export has a new timestamp, so the cached one is not used
+    server.add_export("project", 1, "subjects", export_csv(5, offset=100))
+    third = connector(export_cache=cache).retrieve(ITEM)
+    assert len(server.requests) == 2
+    assert third["subject_id"].tolist() == list(range(100, 105))
+
+
+def test_download_resumes_partial_file(tmp_path, panoptes, connector):
+    data = export_csv(100)
+    server = panoptes()
+    server.add_export("project", 1, "subjects", data)
+    path = str(tmp_path / "subjects.csv")
+    with open(path + ".part", "wb") as part_file:
+        part_file.write(data[:100])
+    assert connector().download(ITEM, path) == path
+    with open(path, "rb") as downloaded:
+        assert downloaded.read() == data
+    assert server.requests == [("/exports/project/1/subjects", "bytes=100-")]
+
+
+def test_retrieve_many_uses_the_logged_in_client(panoptes, connector):
+    server = panoptes(private=True)
+    items = []
+    for project_id in range(1, 7):
+        data = export_csv(5, offset=10 * project_id)
+        server.add_export("project", project_id, "subjects", data)
+        items.append(
+            dict(
+                item_data=repr(
+                    dict(
+                        archive="zooniverse",
+                        catalog="project",
+                        project_id=project_id,
+                        category="subjects",
+                    )
+                )
+            )
+        )
+    zc = connector(connect=False)
+    assert all(zc.validate_basket_item(item) for item in items)
+    assert all(basket_item(item).archive == "zooniverse" for item in items)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        results, errors = zc.retrieve_many(items, max_workers=3)
+    assert errors == {}
+    assert [results[i]["subject_id"].iloc[0] for i in range(6)] == list(range(10, 70, 10))
+    assert server.calls["find"] == 6
+
+
+def test_download_to_applies_where(tmp_path, panoptes, connector):
+    server = panoptes()
+    server.add_export("project", 1, "subjects", export_csv(20))
+    zc = connector()
+    path = str(tmp_path / "subjects.csv")
+    data = zc.retrieve(ITEM, download_to=path, where=lambda d: d["subject_id"] < 3)
+    assert data["subject_id"].tolist() == [0, 1, 2]
+    chunks = zc.read_download(ITEM, path, chunk_size=8, where=lambda d: d["subject_id"] % 5 == 0)
+    assert [chunk["subject_id"].tolist() for chunk in chunks] == [[0, 5], [10, 15], []]
@@ -1 +1,11 @@
 from .zooniverse import zooniverse
+
+
+def __getattr__(name):
+    # The export cache pulls in pyarrow; import it on first use only.
+    if name == "export_cache":
+        from .export_cache import export_cache
+
+        globals()[name] = export_cache
+        return export_cache
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import tempfile
+from typing import Optional, Sequence
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - optional dependency
+    feather = None
+
+from shopping_client.cache import (
+    cache_entries,
+    default_cache_dir,
+    evict_lru,
+    remove_file,
+)
+
+
+class export_cache:
+    """Local cache of parsed Zooniverse exports in the Arrow IPC (Feather v2)
+    format.
+
+    Entries are addressed by the exported entity, the export category and
+    the timestamp of the export, so a regenerated export never hits a stale
+    entry. Files are stored uncompressed so that they can be memory-mapped,
+    and only the requested columns are read back.
+    """
+
+    suffix = ".arrow"
+
+    def __init__(
+        self, directory: Optional[str] = None, max_size: Optional[int] = 4 * 1024 ** 3
+    ):
+        """Constructor.
+
+        Parameters
+        ----------
+        directory : str
+            Directory holding the cache files. Defaults to
+            `$XDG_CACHE_HOME/esap-userprofile-client/zooniverse-exports`.
+        max_size : int
+            Upper bound in bytes for the total size of the cache. When
+            exceeded, the least recently used exports are evicted. `None`
+            disables eviction.
+
+        """
+        if feather is None:
+            raise ImportError(
+                "export_cache requires pyarrow; install it with `pip install pyarrow`"
+            )
+        self.directory = directory or default_cache_dir("zooniverse-exports")
+        self.max_size = max_size
+
+    @staticmethod
+    def key(catalog: str, entity_id: int, category: str, updated_at: str) -> str:
+        """Content address of an export."""
+        return hashlib.sha256(
+            f"{catalog}\0{entity_id}\0{category}\0{updated_at}".encode()
+        ).hexdigest()
+
+    def load(
+        self, key: str, columns: Optional[Sequence[str]] = None
+    ) -> Optional[pd.DataFrame]:
+        """Read a cached export, or return `None` on a cache miss.
+
+        Parameters
+        ----------
+        key : str
+            Content address from `key`.
+        columns : Sequence[str]
+            Columns to read; all columns if `None`.
+
+        """
+        path = self._path(key)
+        try:
+            table = feather.read_table(
+                path, columns=list(columns) if columns is not None else None,
+                memory_map=True,
+            )
+        except FileNotFoundError:
+            return None
+        # Refresh the access time used for LRU eviction.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return table.to_pandas()
+
+    def store(self, key: str, frame: pd.DataFrame):
+        """Write a parsed export to the cache."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            feather.write_feather(
+                frame.reset_index(drop=True), tmp_path, compression="uncompressed"
+            )
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            remove_file(tmp_path)
+            raise
+        evict_lru(self.directory, self.suffix, self.max_size)
+
+    def clear(self):
+        """Remove all cached exports."""
+        for path, _, _ in cache_entries(self.directory, self.suffix):
+            remove_file(path)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
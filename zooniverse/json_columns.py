@@ -0,0 +1,123 @@
+import json
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+JSON_MODES = ("eager", "batch", "lazy", "raw")
+
+
+def _loads(text):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def batch_loads(column: pd.Series) -> pd.Series:
+    """Decode a column of JSON strings with a single call to the JSON parser.
+
+    The cells are joined into one JSON array, which is much faster than
+    decoding each cell separately. `orjson` is used if it is installed.
+    Missing cells become `None`; cells that are not strings are kept as they
+    are.
+
+    Returns
+    -------
+    pd.Series
+        `object` column of decoded values with the index of `column`.
+    """
+    values = column.to_numpy(dtype=object)
+    is_str = np.fromiter((isinstance(v, str) for v in values), bool, len(values))
+    missing = pd.isna(values)
+    if is_str.all():
+        decoded = _loads("[" + ",".join(values) + "]")
+    elif (is_str | missing).all():
+        decoded = _loads("[" + ",".join(np.where(missing, "null", values)) + "]")
+    else:
+        decoded = [_loads(v) if isinstance(v, str) else v for v in values]
+    return pd.Series(decoded, index=column.index, dtype=object, name=column.name)
+
+
+def extract_keys(
+    data: pd.DataFrame, column: str, decoded: Iterable, keys: Iterable[str]
+) -> pd.DataFrame:
+    """Add typed columns named `<column>.<key>` holding the values of `keys`
+    from the decoded JSON objects of `column`. Cells that are not JSON
+    objects or lack a key give missing values."""
+    keys = list(keys)
+    records = [value if isinstance(value, dict) else {} for value in decoded]
+    extracted = pd.DataFrame.from_records(records, columns=keys).infer_objects()
+    for key in keys:
+        data[f"{column}.{key}"] = extracted[key].to_numpy()
+    return data
+
+
+def decode_columns(
+    data: pd.DataFrame,
+    columns: Iterable[str],
+    mode: str = "batch",
+    extract: Optional[dict] = None,
+) -> pd.DataFrame:
+    """Decode the JSON `columns` of `data` according to `mode`.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Parsed export with undecoded (string) JSON columns.
+    columns : Iterable[str]
+        Names of the JSON columns; absent columns are ignored.
+    mode : str
+        `"eager"` or `"batch"` replace the strings with decoded values,
+        `"lazy"` and `"raw"` keep the strings; use the `json` Series accessor
+        to decode a lazy column on access.
+    extract : dict
+        Mapping of column name to JSON object keys that are extracted into
+        typed columns `<column>.<key>`, whatever the `mode`.
+
+    """
+    if mode not in JSON_MODES:
+        raise ValueError(f"Unknown JSON decoding mode {mode!r}; use one of {JSON_MODES}")
+    extract = extract or {}
+    for column in columns:
+        if column not in data.columns:
+            continue
+        keys = extract.get(column)
+        if mode in ("lazy", "raw") and not keys:
+            continue
+        decoded = batch_loads(data[column])
+        if keys:
+            extract_keys(data, column, decoded, keys)
+        if mode in ("eager", "batch"):
+            data[column] = decoded
+    return data
+
+
+@pd.api.extensions.register_series_accessor("json")
+class json_accessor:
+    """Lazy decoding of a column of JSON strings, e.g.
+    `data["metadata"].json.get("session")`. The column is decoded once, on
+    first access."""
+
+    def __init__(self, column: pd.Series):
+        self._column = column
+        self._decoded = None
+
+    def loads(self) -> pd.Series:
+        """All cells decoded."""
+        if self._decoded is None:
+            self._decoded = batch_loads(self._column)
+        return self._decoded
+
+    def get(self, key: str, default=None) -> pd.Series:
+        """The value of `key` in each decoded JSON object, with an inferred
+        dtype."""
+        values = [
+            value.get(key, default) if isinstance(value, dict) else default
+            for value in self.loads()
+        ]
+        return pd.Series(
+            values, index=self._column.index, name=f"{self._column.name}.{key}"
+        ).infer_objects()
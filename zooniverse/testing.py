@@ -0,0 +1,200 @@
+"""Local stand-in for the Zooniverse Panoptes API and its export storage.
+
+`panoptes_server` serves export files over plain HTTP with Range support,
+and provides stand-ins for the `Panoptes` client and the `Project` and
+`Workflow` entities of `panoptes_client`, which describe, generate and wait
+for those exports. Like `panoptes_client`, the connected client is kept in
+thread-local storage. Tests replace the `panoptes_client` classes used by
+the connector with the stand-ins, e.g.
+
+    with panoptes_server() as server:
+        server.add_export("project", 1, "subjects", b"subject_id,metadata\\n...")
+        monkeypatch.setattr(zooniverse.zooniverse, "Panoptes", server.Panoptes)
+        monkeypatch.setattr(zooniverse.zooniverse.zooniverse, "entity_types", server.entity_types)
+        data = zooniverse("jdoe", "secret").retrieve(item)
+"""
+import collections
+import hashlib
+import threading
+
+from panoptes_client.panoptes import PanoptesAPIException
+
+from shopping_client.stand_in import stand_in_handler, stand_in_server
+
+
+class _panoptes:
+    """Stand-in for `panoptes_client.Panoptes`."""
+
+    _local = None
+
+    def __init__(self, username=None, password=None, **kwargs):
+        self.username = username
+        self.password = password
+        self.logged_in = False
+
+    @classmethod
+    def connect(cls, *args, **kwargs):
+        cls._local.panoptes_client = cls(*args, **kwargs)
+        cls._local.panoptes_client.login()
+        return cls._local.panoptes_client
+
+    @classmethod
+    def client(cls, *args, **kwargs):
+        local_client = getattr(cls._local, "panoptes_client", None)
+        if not local_client:
+            return cls(*args, **kwargs)
+        return local_client
+
+    def login(self):
+        self.logged_in = True
+
+    def __enter__(self):
+        self._local.previous_client = getattr(self._local, "panoptes_client", None)
+        self._local.panoptes_client = self
+        return self
+
+    def __exit__(self, *exc):
+        self._local.panoptes_client = self._local.previous_client
+
+
+class _entity:
+    """Stand-in for a `panoptes_client` entity with exports."""
+
+    server = None
+    catalog = None
+
+    def __init__(self, entity_id):
+        self.id = entity_id
+
+    @classmethod
+    def find(cls, entity_id):
+        cls.server.calls["find"] += 1
+        cls.server.check_access()
+        return cls(int(entity_id))
+
+    def describe_export(self, category):
+        self.server.calls["describe_export"] += 1
+        self.server.check_access()
+        export = self.server.exports.get((self.catalog, self.id, category))
+        if export is None:
+            raise PanoptesAPIException(f"No {category} export of {self.catalog} {self.id}")
+        return dict(
+            media=[
+                dict(
+                    src=self.server.export_url(self.catalog, self.id, category),
+                    updated_at=export["updated_at"],
+                )
+            ]
+        )
+
+    def generate_export(self, category):
+        self.server.calls["generate_export"] += 1
+        self.server.check_access()
+
+    def wait_export(self, category):
+        return self.describe_export(category)
+
+
+class panoptes_server(stand_in_server):
+    """Zooniverse export storage on `127.0.0.1`, with `Panoptes` and entity
+    stand-ins bound to it.
+
+    Attributes
+    ----------
+    Panoptes : type
+        Stand-in for `panoptes_client.Panoptes`.
+    entity_types : dict
+        Stand-ins for `Project` and `Workflow`, by catalog name, as in
+        `zooniverse.entity_types`.
+    calls : collections.Counter
+        Number of calls of `find`, `describe_export` and `generate_export`.
+    requests : list
+        Path and `Range` header of every export request received.
+    bytes_sent : int
+        Number of export bytes written to the network.
+    """
+
+    def __init__(self, private: bool = False, block_size: int = 16 * 1024):
+        """Constructor.
+
+        Parameters
+        ----------
+        private : bool
+            If `True`, entities and exports can only be looked up with a
+            logged-in client, as for a private project.
+        block_size : int
+            Number of bytes written to the network at a time.
+
+        """
+        self.private = private
+        self.block_size = block_size
+        self.exports = {}
+        self.calls = collections.Counter()
+        self.requests = []
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self.Panoptes = type("Panoptes", (_panoptes,), {"_local": threading.local()})
+        self.entity_types = {
+            catalog: type(catalog.title(), (_entity,), {"server": self, "catalog": catalog})
+            for catalog in ("project", "workflow")
+        }
+        super().__init__(_handler)
+
+    def add_export(
+        self, catalog: str, entity_id: int, category: str, data: bytes, updated_at: str = None
+    ):
+        """Serve `data` as the `category` export of an entity, replacing any
+        previous export. `updated_at` defaults to a digest of `data`."""
+        if updated_at is None:
+            updated_at = hashlib.md5(data).hexdigest()
+        self.exports[(catalog, entity_id, category)] = dict(
+            data=data, updated_at=updated_at
+        )
+
+    def export_url(self, catalog: str, entity_id: int, category: str) -> str:
+        """URL of the export file of an entity."""
+        return f"{self.url}exports/{catalog}/{entity_id}/{category}"
+
+    def check_access(self):
+        """Raise `PanoptesAPIException` if the client of the calling thread
+        may not see the exports."""
+        if self.private and not self.Panoptes.client().logged_in:
+            raise PanoptesAPIException("Could not find project")
+
+
+class _handler(stand_in_handler):
+    def do_GET(self):
+        server = self.stand_in
+        server.requests.append((self.path, self.headers.get("Range")))
+        parts = self.path.lstrip("/").split("/")
+        export = None
+        if len(parts) == 4 and parts[0] == "exports" and parts[2].isdigit():
+            export = server.exports.get((parts[1], int(parts[2]), parts[3]))
+        if export is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        data = export["data"]
+        etag = f'"{export["updated_at"]}"'
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") in (None, etag):
+            start = int(range_header.split("=")[1].split("-")[0])
+        body = data[start:]
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        try:
+            for offset in range(0, len(body), server.block_size):
+                block = body[offset : offset + server.block_size]
+                self.wfile.write(block)
+                with server._lock:
+                    server.bytes_sent += len(block)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
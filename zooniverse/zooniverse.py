@@ -2,26 +2,104 @@ import requests
 import json
 import io
 import getpass
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 
-from typing import Union, Optional
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Tuple, Union, Optional
 from warnings import warn
 
 from panoptes_client import Panoptes, Project, Workflow
 from panoptes_client.panoptes import PanoptesAPIException
 
+from shopping_client.basket_item import basket_item, load_item_data
+from shopping_client.compression import decompressing_stream, file_compression
+from shopping_client.download import ProgressCallback, download_file
+from shopping_client.instrumentation import count_cache, received_bytes, span
+from shopping_client.session import DEFAULT_TIMEOUT, default_session
+
+from .json_columns import decode_columns, extract_keys
+
+if TYPE_CHECKING:  # export_cache imports pyarrow, so only import it for type checkers
+    from .export_cache import export_cache
+
+logger = logging.getLogger(__name__)
+
+
+class _lru_ttl_cache:
+    """Thread-safe mapping that keeps at most `maxsize` entries, evicting the
+    least recently used, and forgets entries older than `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 128, ttl: Optional[float] = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                stored_at, value = self._entries[key]
+            except KeyError:
+                return default
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
 
 class zooniverse:
 
     name = "zooniverse"
     archive = "zooniverse"
+
+    # `validate_basket_item(item, return_loaded=True)` returns the decoded
+    # item data, see `shopping_client.frames.basket_record`
+    loads_basket_items = True
+
+    # Typed columns of Arrow exports, see `shopping_client.arrow`
+    arrow_fields = (
+        ("project_id", "int64"),
+        ("workflow_id", "int64"),
+        ("category", "category"),
+    )
+
     entity_types = {"workflow": Workflow, "project": Project}
     category_converters = {
         "subjects": dict(metadata=json.loads, locations=json.loads),
         "classifications": dict(metadata=json.loads, annotations=json.loads),
     }
 
-    def __init__(self, username: str, password: str = None):
+    def __init__(
+        self,
+        username: str,
+        password: str = None,
+        session: Optional[requests.Session] = None,
+        timeout: Union[float, tuple, None] = DEFAULT_TIMEOUT,
+        cache_size: int = 128,
+        cache_ttl: Optional[float] = 300.0,
+        export_cache: Optional["export_cache"] = None,
+        connect: bool = True,
+    ):
         """Constructor.
 
         Parameters
@@ -30,19 +108,52 @@ class zooniverse:
             Zooniverse (panoptes) account username.
         password : str
             Zooniverse (panoptes) account password.
+        session : requests.Session
+            Session used to download exports. Defaults to the pooled session
+            shared with `shopping_client`.
+        timeout : Union[float, tuple, None]
+            Timeout in seconds for export downloads, either a single value or
+            a `(connect, read)` tuple.
+        cache_size : int
+            Maximum number of resolved Panoptes entities and export
+            descriptions kept in memory.
+        cache_ttl : float
+            Time in seconds after which cached entities and export descriptions
+            are looked up again. `None` keeps them until evicted.
+        export_cache : export_cache
+            Optional local cache of parsed exports. When given, `retrieve`
+            reads an export that has not changed since it was last downloaded
+            from disk instead of downloading and parsing it again.
+        connect : bool
+            If `False`, the Panoptes login (and the password prompt) is
+            deferred until an export is first looked up, so that items can be
+            validated and exports parsed without network access.
         """
         self.username = username
         self.password = password
-        if self.password is None:
-            self.password = getpass.getpass()
+        self.session = session if session is not None else default_session()
+        self.timeout = timeout
+        self._entities = _lru_ttl_cache(cache_size, cache_ttl)
+        self._export_descriptions = _lru_ttl_cache(cache_size, cache_ttl)
+        self.export_cache = export_cache
+        self.panoptes = None
+        self._connect_lock = threading.Lock()
+        if connect:
+            self._connect()
 
-        self.panoptes = Panoptes.connect(username=self.username, password=self.password)
+    def _connect(self):
+        with self._connect_lock:
+            if self.panoptes is None:
+                if self.password is None:
+                    self.password = getpass.getpass()
+                self.panoptes = Panoptes.connect(
+                    username=self.username, password=self.password
+                )
 
     def is_available(self, item: Union[dict, pd.Series], verbose: bool = False):
+        item = self._as_item(item)
         try:
-            description = self._get_entity(item).describe_export(
-                self._get_item_entry(item, "category")
-            )
+            description = self._describe_export(item)
             if verbose:
                 print(description)
             return True
@@ -72,18 +183,17 @@ class zooniverse:
             Description of returned object.
 
         """
-        print("Generating requested export...")
-        if wait:
-            print("\t\tWaiting for generation to complete...")
-        else:
-            print("\t\tNot waiting for generation to complete...")
-        response = self._get_entity(item).get_export(
-            self._get_item_entry(item, "category"), generate=True, wait=wait
+        item = self._as_item(item)
+        logger.info(
+            "Generating requested export, %s for generation to complete",
+            "waiting" if wait else "not waiting",
         )
+        response = self._get_export(item, generate=True, wait=wait)
         if response.ok and wait:
             return response
-        else:
-            return None
+        # The body is not read, so release the connection to the pool
+        response.close()
+        return None
 
     def retrieve(
         self,
@@ -93,8 +203,12 @@ class zooniverse:
         convert_to_pandas: bool = True,
         chunked_retrieve: bool = False,
         chunk_size: int = int(1e5),
+        json_columns: str = "eager",
+        extract: Optional[dict] = None,
+        download_to: Optional[str] = None,
+        where: Optional[Callable[[pd.DataFrame], pd.Series]] = None,
         **read_csv_args,
-    ) -> Union[requests.Response, pd.DataFrame, None]:
+    ) -> Union[requests.Response, pd.DataFrame, str, None]:
         """Retrieve data specified by an item from the shopping basket from the
         Zooniverse panoptes database. Optionally (re)generate the requested
         data.
@@ -113,114 +227,612 @@ class zooniverse:
             requested item has been generated. If `generate` is `False`, `wait`
             has no effect.
         convert_to_pandas : bool
-            If `True` the retrieved data are parsed into a pd.DataFrame.
+            If `True` the retrieved data are parsed into a pd.DataFrame,
+            straight from the network stream. Exports stored compressed
+            (gzip, bz2 or zstd) are decompressed on the fly.
         chunked_retrieve : bool
             If `True` read the requested data objects in chunks to avoid
             exhausting memory.
         chunk_size : int
             The number of lines of returned data in each chunk if
             `chunked_retrieve` is `True`.
+        json_columns : str
+            How the JSON columns of the export (`metadata`, `locations`,
+            `annotations`) are decoded: `"eager"` decodes each cell while
+            parsing, `"batch"` decodes each column with a single parser call
+            after parsing (much faster), `"lazy"` keeps the JSON strings and
+            decodes a column on first access through the `json` Series
+            accessor (e.g. `data["metadata"].json.get("session")`), and
+            `"raw"` keeps the strings.
+        extract : dict
+            Mapping of JSON column name to a list of keys that are extracted
+            into typed columns named `<column>.<key>`.
+        download_to : str
+            If given, the export is first downloaded to this path with
+            `download()` (resuming a previous partial download) and then
+            parsed from the local file. If `convert_to_pandas` is `False`
+            the path is returned instead of the response.
+        where : Callable[[pd.DataFrame], pd.Series]
+            Row predicate returning a boolean mask for a parsed frame. With
+            `chunked_retrieve` it is applied to every chunk as it is parsed,
+            and `nrows` counts the selected rows.
         **read_csv_args : type
             Extra arguments passed to `pd.read_csv()` when parsing the retrieved
-            data.
+            data. If an `export_cache` is configured and the only extra
+            argument is `usecols` with a list of column names, the export is
+            served from the cache and only those columns are read. With
+            `chunked_retrieve`, `nrows`, `skiprows` and `usecols` are pushed
+            down into the streaming parser: skipped rows and unused columns
+            are never converted, and the download stops as soon as `nrows`
+            rows have been read.
 
         Returns
         -------
         type
-            Union[requests.Response, pd.DataFrame]
+            Union[requests.Response, pd.DataFrame, str]
 
         """
-        if self.is_available(item) and not generate:
-            response = self._get_entity(item).get_export(
-                self._get_item_entry(item, "category"), generate=False, wait=wait
+        item = self._as_item(item)
+        if download_to is not None:
+            path = self.download(item, download_to, generate=generate, wait=wait)
+            if path is None or not convert_to_pandas:
+                return path
+            return self.read_download(
+                item,
+                path,
+                json_columns=json_columns,
+                extract=extract,
+                where=where,
+                **read_csv_args,
             )
-        else:
-            if not generate:
-                warn(
-                    "Requested resource is not available and you have specified generate==False"
-                )
-                return None
-            else:
-                print("Generating requested export...")
-                response = self.generate(item, wait)
+
+        if (
+            convert_to_pandas
+            and not chunked_retrieve
+            and not generate
+            and self.export_cache is not None
+            and set(read_csv_args) <= {"usecols"}
+        ):
+            data = self._cached_retrieve(
+                item, read_csv_args.get("usecols"), json_columns, extract
+            )
+            if data is not None:
+                return data[where(data)] if where is not None else data
+
+        response = self._export_response(item, generate, wait)
         if response is None:
-            warn("No data immediately available. Returning NoneType")
             return None
         if response.ok:
             if convert_to_pandas:
-                return (
-                    self._chunked_content(
-                        item, response, chunk_size=chunk_size, **read_csv_args
+                if chunked_retrieve:
+                    return self._chunked_content(
+                        item,
+                        response,
+                        chunk_size=chunk_size,
+                        json_columns=json_columns,
+                        extract=extract,
+                        where=where,
+                        **read_csv_args,
                     )
-                    if chunked_retrieve
-                    else pd.read_csv(
-                        io.BytesIO(response.content),
-                        converters=zooniverse.category_converters[
-                            self._get_item_entry(item, "category")
-                        ],
+                category = self._get_item_entry(item, "category")
+                with span("csv_parse", category=category), response, received_bytes(
+                    response, "export"
+                ):
+                    data = pd.read_csv(
+                        self._response_stream(response),
+                        **self._read_csv_args(item, json_columns, read_csv_args),
                     )
-                )
+                data = self._decode_json(item, data, json_columns, extract)
+                return data[where(data)] if where is not None else data
             else:
                 return response
         else:
             return None
 
-    def _chunked_content(
+    def retrieve_many(
+        self,
+        items: Union[pd.DataFrame, Iterable[Union[dict, pd.Series]]],
+        max_workers: int = 4,
+        **retrieve_args,
+    ) -> Tuple[dict, dict]:
+        """Retrieve the data for several items from the shopping basket
+        concurrently.
+
+        Entity lookup, export download and parsing of different items overlap
+        on a bounded pool of worker threads.
+
+        Parameters
+        ----------
+        items : Union[pd.DataFrame, Iterable[Union[dict, pd.Series]]]
+            Either a DataFrame of basket items, such as
+            `shopping_client.get_basket(convert_to_pandas=True)["zooniverse"]`,
+            or an iterable of single items.
+        max_workers : int
+            Maximum number of items retrieved at the same time. The HTTP
+            session's connection pool should be at least this large.
+        **retrieve_args : type
+            Arguments passed to `retrieve()` for each item.
+
+        Returns
+        -------
+        Tuple[dict, dict]
+            `(results, errors)`: the value returned by `retrieve()` and the
+            exception raised, keyed by the DataFrame index label or by the
+            position of the item in the iterable.
+
+        """
+        if isinstance(items, pd.DataFrame):
+            labelled = list(items.iterrows())
+        else:
+            labelled = list(enumerate(items))
+
+        # panoptes_client keeps the connected client in thread-local
+        # storage, so log in here and make the workers use that client.
+        self._connect()
+
+        def retrieve(item):
+            with self.panoptes:
+                return self.retrieve(item, **retrieve_args)
+
+        results, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                label: executor.submit(retrieve, item) for label, item in labelled
+            }
+            for label, future in futures.items():
+                try:
+                    results[label] = future.result()
+                except Exception as e:
+                    errors[label] = e
+        return results, errors
+
+    def download(
+        self,
+        item: Union[dict, pd.Series],
+        path: str,
+        generate: bool = False,
+        wait: bool = False,
+        resume: bool = True,
+        chunk_size: int = 1 << 20,
+        progress: Optional[ProgressCallback] = None,
+        checksum: Optional[str] = None,
+    ) -> Optional[str]:
+        """Download the export specified by an item from the shopping basket
+        to a local file.
+
+        The export is streamed to disk in large blocks. An interrupted
+        transfer is resumed with HTTP Range requests, by this call and by
+        later calls with the same `path`. The size of the file, and its
+        checksum where one is known, are verified before it is moved into
+        place.
+
+        Parameters
+        ----------
+        item : Union[dict, pd.Series]
+            A single item from a retrieved shopping basket - either a raw `dict`
+            or a converted `pd.Series`.
+        path : str
+            Destination path.
+        generate : bool
+            If `True` (re)generate the requested data item first; see
+            `retrieve`.
+        wait : bool
+            If `True` block until the requested item has been generated.
+        resume : bool
+            If `False`, discard a previous partial download.
+        chunk_size : int
+            Number of bytes read and written at a time.
+        progress : Callable[[int, Optional[int]], None]
+            Called with the number of bytes downloaded so far and the total
+            size, if known.
+        checksum : str
+            Expected checksum as `"<algorithm>:<hexdigest>"`.
+
+        Returns
+        -------
+        Optional[str]
+            `path`, or `None` if the export is not available.
+
+        """
+        item = self._as_item(item)
+        if not generate and not self.is_available(item):
+            warn(
+                "Requested resource is not available and you have specified generate==False"
+            )
+            return None
+        media = self._export_media(item, generate=generate, wait=wait)
+        return download_file(
+            media["src"],
+            path,
+            session=self.session,
+            resume=resume,
+            chunk_size=chunk_size,
+            progress=progress,
+            checksum=checksum,
+            timeout=self.timeout,
+        )
+
+    def read_download(
+        self,
+        item: Union[dict, pd.Series],
+        path: str,
+        chunk_size: Optional[int] = None,
+        memory_map: bool = True,
+        json_columns: str = "eager",
+        extract: Optional[dict] = None,
+        where: Optional[Callable[[pd.DataFrame], pd.Series]] = None,
+        **read_csv_args,
+    ) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+        """Parse an export downloaded with `download()`.
+
+        Parameters
+        ----------
+        item : Union[dict, pd.Series]
+            The basket item the export was downloaded for.
+        path : str
+            Path of the downloaded export.
+        chunk_size : int
+            If given, return an iterator of DataFrame chunks of this many rows.
+        memory_map : bool
+            If `True`, parse from a memory-mapped view of the file.
+        json_columns : str
+            How JSON columns are decoded; see `retrieve`.
+        extract : dict
+            JSON object keys to extract into typed columns; see `retrieve`.
+        where : Callable[[pd.DataFrame], pd.Series]
+            Row predicate returning a boolean mask for a parsed frame or
+            chunk; only the selected rows are returned.
+        **read_csv_args : type
+            Extra arguments passed to `pd.read_csv()`.
+
+        Returns
+        -------
+        Union[pd.DataFrame, Iterator[pd.DataFrame]]
+
+        """
+        item = self._as_item(item)
+        read_csv_args = self._read_csv_args(item, json_columns, read_csv_args)
+        # The file holds the bytes as sent, which may be compressed whatever
+        # its name
+        read_csv_args.setdefault("compression", file_compression(path))
+        if chunk_size is None:
+            data = pd.read_csv(path, memory_map=memory_map, **read_csv_args)
+            data = self._decode_json(item, data, json_columns, extract)
+            return data[where(data)] if where is not None else data
+
+        def chunks():
+            with pd.read_csv(
+                path, memory_map=memory_map, chunksize=chunk_size, **read_csv_args
+            ) as reader:
+                for chunk in reader:
+                    chunk = self._decode_json(item, chunk, json_columns, extract)
+                    yield chunk[where(chunk)] if where is not None else chunk
+
+        return chunks()
+
+    def iter_retrieve(
+        self,
+        item: Union[dict, pd.Series],
+        generate: bool = False,
+        wait: bool = False,
+        chunk_size: int = int(1e5),
+        buffer_size: int = 1 << 20,
+        json_columns: str = "eager",
+        extract: Optional[dict] = None,
+        where: Optional[Callable[[pd.DataFrame], pd.Series]] = None,
+        **read_csv_args,
+    ) -> Iterator[pd.DataFrame]:
+        """Stream the data specified by an item from the shopping basket as
+        a sequence of `pd.DataFrame` chunks.
+
+        The export is parsed directly from the network stream using large
+        reads, so memory use is bounded by the size of one chunk no matter
+        how large the export is. Compressed exports are decompressed
+        incrementally.
+
+        Parameters
+        ----------
+        item : Union[dict, pd.Series]
+            A single item from a retrieved shopping basket - either a raw `dict`
+            or a converted `pd.Series`.
+        generate : bool
+            If `True` (re)generate the requested data item first; see
+            `retrieve`.
+        wait : bool
+            If `True` block until the requested item has been generated.
+        chunk_size : int
+            The number of rows in each chunk.
+        buffer_size : int
+            Number of bytes read from the network at a time.
+        json_columns : str
+            How the JSON columns of the export (`metadata`, `locations`,
+            `annotations`) are decoded: `"eager"` decodes each cell while
+            parsing, `"batch"` decodes each column with a single parser call
+            after parsing (much faster), `"lazy"` keeps the JSON strings and
+            decodes a column on first access through the `json` Series
+            accessor (e.g. `data["metadata"].json.get("session")`), and
+            `"raw"` keeps the strings.
+        extract : dict
+            Mapping of JSON column name to a list of keys that are extracted
+            into typed columns named `<column>.<key>`.
+        where : Callable[[pd.DataFrame], pd.Series]
+            Row predicate returning a boolean mask for a chunk; only the
+            selected rows are yielded.
+        **read_csv_args : type
+            Extra arguments passed to `pd.read_csv()` when parsing the retrieved
+            data. `usecols` restricts the columns that are converted;
+            `skiprows` given as an integer skips that many data rows after
+            the header without converting them; `nrows` limits the number of
+            (selected) rows, and the download is stopped as soon as they have
+            been read. Closing the iterator early also stops the download.
+
+        Returns
+        -------
+        Iterator[pd.DataFrame]
+            Chunks with identical columns. Each column keeps the dtype it had
+            in the first chunk wherever the values allow it; pass `dtype` to
+            pin the dtypes explicitly.
+
+        """
+        item = self._as_item(item)
+        response = self._export_response(item, generate, wait)
+        if response is None or not response.ok:
+            return
+        yield from self._iter_chunks(
+            item,
+            response,
+            chunk_size,
+            buffer_size,
+            json_columns=json_columns,
+            extract=extract,
+            where=where,
+            **read_csv_args,
+        )
+
+    def _iter_chunks(
         self,
         item: Union[dict, pd.Series],
         response: requests.Response,
         chunk_size: int = int(1e5),
+        buffer_size: int = 1 << 20,
+        json_columns: str = "eager",
+        extract: Optional[dict] = None,
+        where: Optional[Callable[[pd.DataFrame], pd.Series]] = None,
         **read_csv_args,
-    ):
-        response_iterator = response.iter_lines(1)
-        chunk_frames = []
-        nrows = read_csv_args.pop("nrows", None)
-        skiprows = read_csv_args.pop("skiprows", 0)
-        _ = read_csv_args.pop("header", None)
-        names = read_csv_args.pop("names", None)
-        while True:
-            chunk = b"\n".join(
-                [line for _, line in zip(range(chunk_size), response_iterator) if line]
+    ) -> Iterator[pd.DataFrame]:
+        read_csv_args = self._read_csv_args(item, json_columns, read_csv_args)
+        skiprows = read_csv_args.get("skiprows")
+        if isinstance(skiprows, int) and read_csv_args.get("header", "infer") is not None:
+            # Skip data rows in the tokenizer, without converting them, but
+            # keep the header line
+            read_csv_args["skiprows"] = range(1, skiprows + 1) if skiprows else None
+        remaining = read_csv_args.pop("nrows", None)
+        if where is None and remaining is not None:
+            # pandas stops reading from the stream once `nrows` are parsed
+            read_csv_args["nrows"] = remaining
+            chunk_size = max(1, min(chunk_size, remaining))
+        dtypes = None
+        category = self._get_item_entry(item, "category")
+        # Leaving the block closes the response, so that the rest of the
+        # export is never downloaded once the requested rows are read. The
+        # stream is opened after `received_bytes`, as it reads ahead.
+        with span("csv_parse", category=category), response, received_bytes(
+            response, "export"
+        ), pd.read_csv(
+            self._response_stream(response, buffer_size), chunksize=chunk_size, **read_csv_args
+        ) as reader:
+            for chunk in reader:
+                if remaining == 0:
+                    return
+                chunk = self._decode_json(item, chunk, json_columns, extract)
+                if where is not None:
+                    chunk = chunk[where(chunk)]
+                if remaining is not None:
+                    chunk = chunk.iloc[:remaining]
+                    remaining -= len(chunk)
+                if dtypes is None:
+                    dtypes = chunk.dtypes
+                else:
+                    chunk = self._conform_dtypes(chunk, dtypes)
+                yield chunk
+                if remaining == 0:
+                    return
+
+    @staticmethod
+    def _response_stream(response, buffer_size=1 << 20):
+        # Buffered file-like view of the response body for pd.read_csv.
+        # Content-Encoding is undone by urllib3; exports stored compressed
+        # (gzip, bz2 or zstd) are detected from their magic bytes and
+        # decompressed as they are read.
+        response.raw.decode_content = True
+        # Keep the raw stream "open" at EOF so that buffered data can be read
+        response.raw.auto_close = False
+        return decompressing_stream(
+            io.BufferedReader(response.raw, buffer_size=buffer_size)
+        )
+
+    def _read_csv_args(self, item, json_columns, read_csv_args):
+        # Per-cell JSON converters are only used for eager decoding
+        if json_columns == "eager":
+            read_csv_args = dict(read_csv_args)
+            read_csv_args.setdefault(
+                "converters",
+                zooniverse.category_converters[self._get_item_entry(item, "category")],
             )
-            if len(chunk) == 0 or (
-                nrows is not None
-                and len(chunk_frames) * chunk_size - 1 > nrows + skiprows
+        return read_csv_args
+
+    def _decode_json(self, item, data, json_columns, extract, parsed_raw=False):
+        # Decodes and extracts the JSON columns of a parsed export; with eager
+        # decoding the columns have already been decoded by the converters
+        # unless `parsed_raw` is set.
+        columns = zooniverse.category_converters[self._get_item_entry(item, "category")]
+        if json_columns == "eager" and not parsed_raw:
+            for column, keys in (extract or {}).items():
+                if column in data.columns:
+                    extract_keys(data, column, data[column], keys)
+            return data
+        mode = "batch" if json_columns == "eager" else json_columns
+        return decode_columns(data, columns, mode, extract)
+
+    def _cached_retrieve(self, item, usecols=None, json_columns="eager", extract=None):
+        # Serve the export of `item` from the export cache, downloading and
+        # caching it first on a miss. Returns `None` if the export cannot be
+        # cached, so that the caller falls back to a plain retrieve.
+        if usecols is not None and not all(isinstance(c, str) for c in usecols):
+            return None
+        try:
+            media = self._describe_export(item)["media"][0]
+        except (PanoptesAPIException, KeyError, IndexError):
+            return None
+        updated_at = media.get("updated_at")
+        if updated_at is None:
+            return None
+
+        catalog, entity_id, category = self._cache_key(item)
+        key = self.export_cache.key(catalog, entity_id, category, updated_at)
+        data = self.export_cache.load(key, columns=usecols)
+        count_cache("export", data is not None)
+        if data is None:
+            response = self._get_export(item)
+            if not response.ok:
+                return None
+            with span("csv_parse", category=category), response, received_bytes(
+                response, "export"
             ):
-                # response_iterator exhausted
-                print("All data received.")
-                break
-            chunk_frames.append(
-                pd.read_csv(
-                    io.BytesIO(chunk),
-                    converters=zooniverse.category_converters[
-                        self._get_item_entry(item, "category")
-                    ],
-                    header=None if len(chunk_frames) else 0,
-                    names=chunk_frames[0].columns
-                    if len(chunk_frames)
-                    else names
-                    if names is not None
-                    else None,
-                    **read_csv_args,
+                # Cache the undecoded CSV columns; JSON is decoded on read.
+                data = pd.read_csv(self._response_stream(response))
+            self.export_cache.store(key, data)
+            if usecols is not None:
+                data = data[list(usecols)]
+        return self._decode_json(item, data, json_columns, extract, parsed_raw=True)
+
+    @staticmethod
+    def _conform_dtypes(chunk, dtypes):
+        # Cast the columns of a chunk to the dtypes of the first chunk, where
+        # that is possible without losing values (e.g. not int <- NaN).
+        for column, dtype in dtypes.items():
+            if chunk[column].dtype == dtype:
+                continue
+            try:
+                chunk[column] = chunk[column].astype(dtype)
+            except (TypeError, ValueError):
+                warn(
+                    f"Column {column} cannot be cast to {dtype} in all chunks; "
+                    "pass `dtype` to fix its type"
                 )
+        return chunk
+
+    def _chunked_content(
+        self,
+        item: Union[dict, pd.Series],
+        response: requests.Response,
+        chunk_size: int = int(1e5),
+        json_columns: str = "eager",
+        extract: Optional[dict] = None,
+        where: Optional[Callable[[pd.DataFrame], pd.Series]] = None,
+        **read_csv_args,
+    ):
+        _ = read_csv_args.pop("header", None)
+        if read_csv_args.get("names") is not None:
+            # `names` replaces the header line of the export
+            read_csv_args["header"] = 0
+        chunk_frames = list(
+            self._iter_chunks(
+                item,
+                response,
+                chunk_size,
+                json_columns=json_columns,
+                extract=extract,
+                where=where,
+                **read_csv_args,
             )
-        end = (skiprows + nrows) if nrows is not None else None
-        return (
-            pd.concat(chunk_frames, axis=0, ignore_index=True)
-            .iloc[slice(skiprows, end)]
-            .reset_index(drop=True)
         )
+        logger.info("All data received.")
+        if not chunk_frames:
+            return pd.DataFrame()
+        return pd.concat(chunk_frames, axis=0, ignore_index=True)
+
+    def _export_response(self, item, generate, wait):
+        # Returns the response for the export of `item`, or `None` with a
+        # warning if it is not available.
+        if self.is_available(item) and not generate:
+            response = self._get_export(item, generate=False, wait=wait)
+        else:
+            if not generate:
+                warn(
+                    "Requested resource is not available and you have specified generate==False"
+                )
+                return None
+            else:
+                response = self.generate(item, wait)
+        if response is None:
+            warn("No data immediately available. Returning NoneType")
+            return None
+        return response
+
+    def _get_export(self, item, generate=False, wait=False):
+        # Equivalent to `Exportable.get_export`, but reuses cached entities and
+        # export descriptions, and downloads through our own pooled session
+        # instead of a fresh connection per export.
+        url = self._export_media(item, generate, wait)["src"]
+        with span("export_download") as labels:
+            response = self.session.get(url, stream=True, timeout=self.timeout)
+            labels["status"] = response.status_code
+        return response
+
+    def _export_media(self, item, generate=False, wait=False):
+        # Media description (URL, timestamps) of the export of `item`,
+        # optionally (re)generating it first.
+        entity = self._get_entity(item)
+        category = self._get_item_entry(item, "category")
+        if generate:
+            entity.generate_export(category)
+        if generate or wait:
+            export = entity.wait_export(category)
+            self._export_descriptions.put(self._cache_key(item), export)
+        else:
+            export = self._describe_export(item)
+        return export["media"][0]
+
+    def _describe_export(self, item):
+        key = self._cache_key(item)
+        description = self._export_descriptions.get(key)
+        count_cache("panoptes_export", description is not None)
+        if description is None:
+            entity = self._get_entity(item)
+            with span("panoptes_lookup", kind="export"):
+                description = entity.describe_export(key[2])
+            self._export_descriptions.put(key, description)
+        return description
 
     def _get_entity(self, item):
-        entity = zooniverse.entity_types[self._get_item_entry(item, "catalog")].find(
-            int(self._get_item_entry(item, self._catalogue_to_id_string(item)))
-        )
+        catalog, entity_id, _ = key = self._cache_key(item)
+        entity = self._entities.get(key[:2])
+        count_cache("panoptes_entity", entity is not None)
+        if entity is None:
+            self._connect()
+            with span("panoptes_lookup", kind="entity"):
+                entity = zooniverse.entity_types[catalog].find(entity_id)
+            self._entities.put(key[:2], entity)
         return entity
 
+    def _cache_key(self, item):
+        return (
+            self._get_item_entry(item, "catalog"),
+            int(self._get_item_entry(item, self._catalogue_to_id_string(item))),
+            self._get_item_entry(item, "category"),
+        )
+
+    def _as_item(self, item):
+        # Decode the `item_data` of a raw basket item once, so that repeated
+        # field lookups don't parse it again.
+        if isinstance(item, dict) and not isinstance(item, basket_item):
+            return basket_item.with_data(item, load_item_data(item))
+        return item
+
     def _get_item_entry(self, item, entry):
-        if type(item) == dict:
-            print(item)
-            item = json.loads(item["item_data"].replace("'", '"'))
+        if isinstance(item, dict):
+            item = self._as_item(item).data
         return item.get(entry, None)
 
     def _catalogue_to_id_string(self, item):
@@ -251,7 +863,7 @@ class zooniverse:
         if validate:
             item_data = self.validate_basket_item(basket_item, return_loaded=True)
         else:
-            item_data = json.loads(basket_item["item_data"])
+            item_data = load_item_data(basket_item)
         if item_data:
             return pd.Series(item_data)
         return None
@@ -281,7 +893,7 @@ class zooniverse:
             If validation fails return `None`.
 
         """
-        item_data = json.loads(basket_item["item_data"])
+        item_data = load_item_data(basket_item)
         if "archive" in item_data and item_data["archive"] == "zooniverse":
             if return_loaded:
                 return item_data